@@ -1,53 +1,475 @@
 # analyzer.py
-import torch
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+import os
+import re
+import threading
 import pandas as pd
-import streamlit as st
 import time
-import random
+from typing import Optional
+
+import reporting
+from instrumentation import count, span, timed
+from ratelimit import call_with_retry
+from inference_cache import get_cached_entries, store_labels, text_hash, cache_stats
+from rescoring import pack_scores
 
 MODEL_NAME = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
+MAX_CHARS = 512
+MAX_TOKENS = 512
+DEFAULT_BATCH_SIZE = 16
+
+# Long-text mode: sentence-aware token windows instead of cutting at MAX_CHARS.
+CHUNK_TOKENS = MAX_TOKENS - 2  # room for <s> and </s>
+CHUNK_STRIDE = 64
+MAX_CHUNKS_PER_TEXT = 8
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?।。！？])\s+|\n+")
+
+# "torch" is the reference fp32 model; the others trade a little precision for CPU speed/memory.
+BACKENDS = ("torch", "int8", "onnx", "onnx-int8")
+DEFAULT_BACKEND = os.environ.get("SENTIMENT_BACKEND", "torch")
+MODEL_CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", "model_cache")
+# When set, classification goes to a shared inference_server.py instead of a model loaded in this process
+INFERENCE_SERVER_URL = os.environ.get("INFERENCE_SERVER_URL")
+
+# Small multilingual sample used to sanity-check a non-fp32 backend after export.
+PARITY_SAMPLES = [
+    "Absolutely love these headphones, the bass is amazing!",
+    "Battery died after two days. Total waste of money.",
+    "It's okay, nothing special for the price.",
+    "Sound quality is great but the ear cushions hurt after an hour.",
+    "Producto excelente, llegó rápido y funciona perfecto.",
+    "Qualité sonore décevante, je ne recommande pas.",
+    "बहुत बढ़िया प्रोडक्ट है, पैसा वसूल।",
+    "Der Akku hält ewig, sehr zufrieden.",
+    "Delivery was on time.",
+    "Worst customer service ever, never buying again.",
+]
+
+
+def _onnx_dir(model_name: str, quantized: bool = False) -> str:
+    name = model_name.replace("/", "__")
+    return os.path.join(MODEL_CACHE_DIR, "onnx", name + ("-int8" if quantized else ""))
+
+
+def export_onnx_model(model_name: str = MODEL_NAME, quantized: bool = False) -> str:
+    """
+    One-time export of the model to ONNX (optionally dynamic int8 quantized).
+    Returns the export directory; later calls reuse it.
+    """
+    from transformers import AutoTokenizer
+    try:
+        from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+    except ImportError as e:
+        raise RuntimeError("ONNX backends need `pip install optimum[onnxruntime]`") from e
+
+    out_dir = _onnx_dir(model_name)
+    if not os.path.exists(os.path.join(out_dir, "model.onnx")):
+        model = ORTModelForSequenceClassification.from_pretrained(model_name, export=True)
+        model.save_pretrained(out_dir)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(out_dir)
+    if not quantized:
+        return out_dir
+
+    q_dir = _onnx_dir(model_name, quantized=True)
+    if not os.path.exists(os.path.join(q_dir, "model_quantized.onnx")):
+        quantizer = ORTQuantizer.from_pretrained(out_dir)
+        qconfig = AutoQuantizationConfig.avx2(is_static=False, per_channel=False)
+        quantizer.quantize(save_dir=q_dir, quantization_config=qconfig)
+        AutoTokenizer.from_pretrained(model_name).save_pretrained(q_dir)
+    return q_dir
+
+
+_pipelines = {}
+_pipelines_lock = threading.Lock()
+
+
+def load_pipeline(model_name=MODEL_NAME, backend=DEFAULT_BACKEND):
+    """
+    The pipeline for model_name/backend, built once per process and shared by
+    every caller (Streamlit sessions, batch runs, server, pool workers). The
+    lock also makes concurrent first calls (e.g. warm_pipeline_async) wait for
+    one load instead of starting their own.
+    """
+    with _pipelines_lock:
+        pipe = _pipelines.get((model_name, backend))
+        if pipe is None:
+            pipe = _pipelines[(model_name, backend)] = _build_pipeline(model_name, backend)
+    return pipe
+
+
+def _build_pipeline(model_name: str, backend: str):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {BACKENDS}")
+    # Heavy imports happen here, on first use, so importing this module stays cheap
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, pipeline
+
+    if backend.startswith("onnx"):
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from optimum.pipelines import pipeline as ort_pipeline
+        quantized = backend == "onnx-int8"
+        path = export_onnx_model(model_name, quantized=quantized)
+        model = ORTModelForSequenceClassification.from_pretrained(
+            path, file_name="model_quantized.onnx" if quantized else "model.onnx")
+        tokenizer = AutoTokenizer.from_pretrained(path)
+        return ort_pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None, accelerator="ort")
 
-@st.cache_resource
-def load_pipeline(model_name=MODEL_NAME):
     tokenizer = AutoTokenizer.from_pretrained(model_name)
     model = AutoModelForSequenceClassification.from_pretrained(model_name)
-    device = 0 if torch.cuda.is_available() else -1
+    if backend == "int8":
+        # Dynamic quantization only pays off on CPU, so the int8 model always stays there
+        model.eval()
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        device = -1
+    else:
+        device = 0 if torch.cuda.is_available() else -1
     pipe = pipeline("text-classification", model=model, tokenizer=tokenizer, top_k=None, device=device)
     return pipe
 
 
-def detect_and_return(df: pd.DataFrame, text_col: str = "snippet") -> pd.DataFrame:
-    """Run sentiment model with retry and rate-limit handling."""
-    pipe = load_pipeline()
-    results = []
-    texts = df[text_col].astype(str).tolist()
-    st.info(f"⚡ Running model on {len(texts)} snippets...")
+_warm_threads = {}
+_warm_lock = threading.Lock()
 
-    for i, text in enumerate(texts):
-        if not text.strip():
-            label = "unknown"
-        else:
-            for attempt in range(3):
+
+def warm_pipeline_async(model_name: str = MODEL_NAME, backend: str = DEFAULT_BACKEND) -> Optional[threading.Thread]:
+    """
+    Start loading the model in a background thread (once per model/backend per
+    process) so the UI can render while torch and the weights load.
+    Does nothing when a shared inference server is configured.
+    """
+    if INFERENCE_SERVER_URL:
+        return None
+    with _warm_lock:
+        thread = _warm_threads.get((model_name, backend))
+        if thread is None:
+            def warm():
                 try:
-                    out = pipe(text[:512])
-                    if isinstance(out, list) and isinstance(out[0], dict):
-                        label = out[0]['label']
-                    elif isinstance(out, list) and isinstance(out[0], list):
-                        label = out[0][0]['label']
-                    else:
-                        label = "unknown"
-                    break
+                    load_pipeline(model_name, backend)
+                except Exception as e:
+                    reporting.LogReporter().warning(f"Background model warm-up failed: {e}")
+
+            thread = threading.Thread(target=warm, name=f"warm-{backend}", daemon=True)
+            _warm_threads[(model_name, backend)] = thread
+            thread.start()
+    return thread
+
+
+def _cache_key(model_name: str, backend: str, long_text: bool = False) -> str:
+    """Inference-cache namespace; non-reference backends and long-text mode keep their own labels."""
+    key = model_name if backend == "torch" else f"{model_name}@{backend}"
+    return key + "#long" if long_text else key
+
+
+def _scores(out) -> dict:
+    """Turn a single pipeline result into {label: probability}."""
+    if isinstance(out, list) and out and isinstance(out[0], list):
+        out = out[0]
+    if isinstance(out, dict):
+        out = [out]
+    return {d['label']: float(d['score']) for d in out if isinstance(d, dict) and 'label' in d}
+
+
+def _length_buckets(pipe, texts: list, batch_size: int) -> list:
+    """
+    Group text indices into batches of similar token length, so each batch
+    is padded only up to its own longest member instead of 512 tokens.
+    """
+    with span("model.tokenize"):
+        lengths = [len(ids) for ids in pipe.tokenizer(texts, truncation=True, max_length=MAX_TOKENS)["input_ids"]]
+    order = sorted(range(len(texts)), key=lambda i: lengths[i])
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+def _run_with_retry(pipe, batch: list, batch_size: int):
+    """Run the pipeline on a batch of texts, backing off on rate-limit/capacity errors."""
+    def forward():
+        with span("model.forward"):
+            return pipe(batch, batch_size=batch_size, truncation=True)
+
+    return call_with_retry("model", forward, retries=3, base_delay=5.0,
+                           on_retry=lambda attempt, e, wait: reporting.warning(
+                               f"⏳ Rate limit hit (attempt {attempt}). Waiting {wait:.1f}s..."))
+
+
+def _score_batches(pipe, texts: list, batch_size: int) -> list:
+    """
+    Score non-empty texts in length-bucketed batches.
+    Returns one {label: probability} dict per input text (None on error), in input order.
+    """
+    scores = [{} for _ in texts]
+    if not texts:
+        return scores
+    for bucket in _length_buckets(pipe, texts, batch_size):
+        batch = [texts[i] for i in bucket]
+        try:
+            outs = _run_with_retry(pipe, batch, batch_size)
+        except Exception:
+            # Fall back to one-by-one so a single bad row doesn't fail the whole batch
+            outs = []
+            for text in batch:
+                try:
+                    outs.append(_run_with_retry(pipe, [text], 1)[0])
                 except Exception as e:
-                    if "429" in str(e) or "capacity" in str(e):
-                        wait = random.uniform(5, 10) * (attempt + 1)
-                        st.warning(f"⏳ Rate limit hit (attempt {attempt+1}). Waiting {wait:.1f}s...")
-                        time.sleep(wait)
-                        continue
-                    else:
-                        st.error(f"Error during model run: {e}")
-                        label = "error"
-                        break
-        results.append({"id": int(df.iloc[i].get('id', i)), "emotion": label})
-
-    return pd.DataFrame(results)
+                    reporting.error(f"Error during model run: {e}")
+                    outs.append(None)
+        for i, out in zip(bucket, outs):
+            scores[i] = None if out is None else _scores(out)
+    return scores
+
+
+def _best_label(scores) -> str:
+    if scores is None:
+        return "error"
+    if not scores:
+        return "unknown"
+    return max(scores, key=scores.get)
+
+
+def _classify_batches(pipe, texts: list, batch_size: int) -> list:
+    """
+    Classify non-empty texts in length-bucketed batches.
+    Returns one label per input text, in input order.
+    """
+    return [_best_label(s) for s in _score_batches(pipe, texts, batch_size)]
+
+
+def _chunk_text(tokenizer, text: str, max_tokens: int = CHUNK_TOKENS, stride: int = CHUNK_STRIDE) -> list:
+    """
+    Split a long review into token windows along sentence boundaries.
+    Consecutive chunks share up to `stride` tokens of trailing sentences;
+    sentences longer than a window are cut into overlapping token slices.
+    Returns [(chunk_text, n_tokens)].
+    """
+    sentences = [s.strip() for s in _SENTENCE_SPLIT.split(text) if s and s.strip()]
+    if not sentences:
+        return []
+    with span("model.tokenize"):
+        token_ids = tokenizer(sentences, add_special_tokens=False)["input_ids"]
+
+    chunks, current, current_len = [], [], 0
+
+    def flush():
+        if current:
+            chunks.append((" ".join(s for s, _ in current), current_len))
+
+    for sent, ids in zip(sentences, token_ids):
+        n = len(ids)
+        if n > max_tokens:
+            flush()
+            current, current_len = [], 0
+            step = max(max_tokens - stride, 1)
+            for start in range(0, n, step):
+                window = ids[start:start + max_tokens]
+                chunks.append((tokenizer.decode(window), len(window)))
+                if start + max_tokens >= n:
+                    break
+            continue
+        if current_len + n > max_tokens:
+            flush()
+            overlap, overlap_len = [], 0
+            for s, l in reversed(current):
+                if overlap_len + l > stride:
+                    break
+                overlap.insert(0, (s, l))
+                overlap_len += l
+            # Only keep as much overlap as still fits next to this sentence, or the pipeline would truncate it
+            while overlap and overlap_len + n > max_tokens:
+                overlap_len -= overlap.pop(0)[1]
+            current, current_len = overlap, overlap_len
+        current.append((sent, n))
+        current_len += n
+    flush()
+    return chunks
+
+
+def _limit_chunks(chunks: list, limit: int) -> list:
+    """Keep at most `limit` chunks, spread evenly so the start and end of the review both count."""
+    if len(chunks) <= limit:
+        return chunks
+    if limit == 1:
+        return chunks[:1]
+    step = (len(chunks) - 1) / (limit - 1)
+    return [chunks[round(k * step)] for k in range(limit)]
+
+
+def _score_long(pipe, texts: list, batch_size: int, max_chunks: int = MAX_CHUNKS_PER_TEXT,
+                verbose: bool = True) -> list:
+    """
+    Long-text mode: chunk every text, score all chunks of all texts in shared
+    batches and combine each text's chunk probabilities (weighted by chunk
+    token count) into one {label: probability} dict (None if every chunk
+    failed). Model work is capped at `max_chunks` per text, so a run costs at
+    most max_chunks x texts sequences whatever the page lengths.
+    """
+    owners, chunk_texts, weights = [], [], []
+    for i, text in enumerate(texts):
+        for chunk, n_tokens in _limit_chunks(_chunk_text(pipe.tokenizer, text), max_chunks):
+            owners.append(i)
+            chunk_texts.append(chunk)
+            weights.append(max(n_tokens, 1))
+
+    totals = [{} for _ in texts]
+    norms = [0.0] * len(texts)
+    failed = [False] * len(texts)
+    for owner, weight, scores in zip(owners, weights, _score_batches(pipe, chunk_texts, batch_size)):
+        if scores is None:
+            failed[owner] = True
+            continue
+        for label, p in scores.items():
+            totals[owner][label] = totals[owner].get(label, 0.0) + p * weight
+        norms[owner] += weight
+
+    combined = []
+    for total, norm, bad in zip(totals, norms, failed):
+        if not norm:
+            combined.append(None if bad else {})
+        else:
+            combined.append({k: v / norm for k, v in total.items()})
+    if verbose:
+        reporting.info(f"🧩 Long-text mode: {len(chunk_texts)} chunks for {len(texts)} reviews (≤{max_chunks} per review)")
+    return combined
+
+
+def _score(pipe, texts: list, batch_size: int, long_text: bool = False, max_chunks: int = MAX_CHUNKS_PER_TEXT,
+           verbose: bool = True) -> list:
+    """One {label: probability} dict per text (None on error, {} for nothing to score)."""
+    if long_text:
+        return _score_long(pipe, texts, batch_size, max_chunks, verbose=verbose)
+    return _score_batches(pipe, texts, batch_size)
+
+
+def _plan_rows(df: pd.DataFrame, text_col: str, cache_key: str, use_cache: bool, max_chars: int = MAX_CHARS,
+               verbose: bool = True):
+    """
+    Split rows into labels we already know (empty text or cache hit) and the
+    unique texts that still need the model.
+    Returns (ids, labels, packed scores, {row index: text hash}, {text hash: text}).
+    """
+    texts = df[text_col].astype(str).tolist()
+    ids = [int(v) for v in df['id']] if 'id' in df.columns else list(range(len(texts)))
+
+    labels = ["unknown"] * len(texts)
+    scores = [None] * len(texts)
+    inputs = {i: text[:max_chars] for i, text in enumerate(texts) if text.strip()}
+    hashes = {i: text_hash(text) for i, text in inputs.items()}
+
+    cached = get_cached_entries(cache_key, list(inputs.values())) if use_cache else {}
+    pending = {}  # text hash -> text, so duplicate snippets are only classified once
+    for i, text in inputs.items():
+        if hashes[i] in cached:
+            labels[i], scores[i] = cached[hashes[i]]
+        else:
+            pending.setdefault(hashes[i], text)
+
+    if use_cache and inputs and verbose:
+        served = sum(1 for h in hashes.values() if h in cached)
+        stats = cache_stats()
+        reporting.info(f"🗃️ Inference cache: {served} of {len(inputs)} snippets served from cache "
+                f"(hit rate {stats['hit_rate']:.0%}, {stats['size']} entries)")
+    return ids, labels, scores, hashes, pending
+
+
+def _remember(cache_key: str, pending: dict, new_labels: dict, new_scores: Optional[dict] = None):
+    """Store freshly computed labels ({text hash: label}) and packed scores in the inference cache."""
+    keep = {h: label for h, label in new_labels.items() if label not in ("unknown", "error")}
+    store_labels(cache_key, {pending[h]: label for h, label in keep.items()},
+                 {pending[h]: (new_scores or {}).get(h) for h in keep})
+
+
+@timed("model.detect_and_return")
+def detect_and_return(df: pd.DataFrame, text_col: str = "snippet", batch_size: int = DEFAULT_BATCH_SIZE,
+                      use_cache: bool = True, backend: str = DEFAULT_BACKEND,
+                      long_text: bool = False, max_chunks: int = MAX_CHUNKS_PER_TEXT,
+                      verbose: bool = True, server_url: Optional[str] = None) -> pd.DataFrame:
+    """
+    Run sentiment model in length-bucketed batches with retry and rate-limit handling.
+    Texts already classified by this model are served from the inference cache.
+    With long_text=True, texts are classified over sentence-aware token chunks
+    instead of being truncated to MAX_CHARS. verbose=False silences the
+    per-call progress messages (for callers that classify many small batches).
+    With server_url (default: INFERENCE_SERVER_URL) the texts are sent to a
+    shared inference server and no model is loaded in this process.
+    Returns id, emotion and scores (class probabilities packed by
+    rescoring.pack_scores, None where unavailable) per row.
+    """
+    server_url = server_url or INFERENCE_SERVER_URL
+    cache_key = _cache_key(MODEL_NAME, backend, long_text)
+    ids, labels, scores, hashes, pending = _plan_rows(df, text_col, cache_key, use_cache,
+                                                      max_chars=None if long_text else MAX_CHARS, verbose=verbose)
+
+    if pending:
+        if verbose:
+            where = f"inference server {server_url}" if server_url else f"{backend} model"
+            reporting.info(f"⚡ Running {where} on {len(pending)} snippets (batch size {batch_size})...")
+        start = time.perf_counter()
+        if server_url:
+            from inference_server import classify_remote
+            out = classify_remote(list(pending.values()), backend, long_text, max_chunks, url=server_url)
+        else:
+            pipe = load_pipeline(MODEL_NAME, backend)
+            out = _score(pipe, list(pending.values()), batch_size, long_text, max_chunks, verbose=verbose)
+        new_labels = {h: _best_label(s) for h, s in zip(pending, out)}
+        new_scores = {h: pack_scores(s) for h, s in zip(pending, out)}
+        count("model.texts_classified", len(pending))
+        elapsed = time.perf_counter() - start
+        if verbose:
+            reporting.info(f"📈 Classified {len(pending)} snippets in {elapsed:.1f}s ({len(pending) / max(elapsed, 1e-9):.1f} rows/sec)")
+
+        for i, h in hashes.items():
+            if h in new_labels:
+                labels[i], scores[i] = new_labels[h], new_scores[h]
+        if use_cache:
+            _remember(cache_key, pending, new_labels, new_scores)
+
+    return pd.DataFrame({"id": ids, "emotion": labels, "scores": scores})
+
+
+def check_backend_parity(backend: str, texts: list = None, model_name: str = MODEL_NAME,
+                         batch_size: int = DEFAULT_BATCH_SIZE) -> dict:
+    """
+    Compare a backend's labels (and speed) against the fp32 torch reference.
+    Returns agreement ratio, timings and the texts whose label changed.
+    """
+    texts = [t[:MAX_CHARS] for t in (texts or PARITY_SAMPLES) if t.strip()]
+    timings, labels = {}, {}
+    for name in ("torch", backend):
+        pipe = load_pipeline(model_name, name)
+        start = time.perf_counter()
+        labels[name] = _classify_batches(pipe, texts, batch_size)
+        timings[name] = time.perf_counter() - start
+
+    mismatches = [
+        {"text": t, "torch": a, backend: b}
+        for t, a, b in zip(texts, labels["torch"], labels[backend]) if a != b
+    ]
+    return {
+        "backend": backend,
+        "n": len(texts),
+        "agreement": 1 - len(mismatches) / max(len(texts), 1),
+        "torch_seconds": timings["torch"],
+        "backend_seconds": timings[backend],
+        "mismatches": mismatches,
+    }
+
+
+if __name__ == "__main__":
+    # One-time export + parity check, e.g. `python analyzer.py onnx-int8`
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Prepare and validate a sentiment inference backend")
+    parser.add_argument("backend", choices=[b for b in BACKENDS if b != "torch"])
+    parser.add_argument("--texts", help="optional file with one review per line to check parity on")
+    parser.add_argument("--min-agreement", type=float, default=0.95)
+    args = parser.parse_args()
+
+    if args.backend.startswith("onnx"):
+        print(f"Exported to {export_onnx_model(MODEL_NAME, quantized=args.backend == 'onnx-int8')}")
+    sample = None
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            sample = [line.strip() for line in f if line.strip()]
+    report = check_backend_parity(args.backend, sample)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if report["agreement"] < args.min_agreement:
+        raise SystemExit(f"Label agreement {report['agreement']:.1%} is below {args.min_agreement:.0%}")
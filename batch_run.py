@@ -0,0 +1,109 @@
+# batch_run.py
+"""
+Headless batch runner: precompute reviews and sentiment for many products
+without the Streamlit UI.
+
+    python batch_run.py jobs.csv --job-id nightly
+
+jobs.csv has `product` and `brands` columns (brands separated by ';', empty
+to infer them); a .jsonl file with {"product": ..., "brands": [...]} per line
+works too. Progress is stored per (product, brand) in reviews.db, so rerunning
+with the same --job-id resumes an interrupted job.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+from contextlib import nullcontext
+
+from dotenv import load_dotenv
+
+import instrumentation
+
+
+def read_jobs(path: str) -> list:
+    jobs = []
+    if path.endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    brands = item.get("brands") or []
+                    if isinstance(brands, str):
+                        brands = brands.split(";")
+                    jobs.append((item["product"].strip(), [b.strip() for b in brands if b.strip()]))
+    else:
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                brands = (row.get("brands") or "").split(";")
+                jobs.append((row["product"].strip(), [b.strip() for b in brands if b.strip()]))
+    return [(p, b) for p, b in jobs if p]
+
+
+def main(argv=None):
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Fetch, classify and store reviews for many products")
+    parser.add_argument("jobs", help="CSV (product, brands) or JSONL file")
+    parser.add_argument("--job-id", help="progress key; reuse it to resume (default: jobs file name)")
+    parser.add_argument("--max-snippets", type=int, default=30)
+    parser.add_argument("--fulltext", action="store_true", help="fetch full review pages")
+    parser.add_argument("--batch-size", type=int)
+    parser.add_argument("--backend")
+    parser.add_argument("--workers", type=int, default=1, help="inference processes")
+    parser.add_argument("--streaming", action="store_true", help="overlap fetching and inference per product")
+    parser.add_argument("--refresh-hours", type=float,
+                        help="re-fetch brands whose last fetch is older than this (0 = never; default from RunOptions)")
+    parser.add_argument("--log-file", help="also append progress to this file")
+    parser.add_argument("--metrics-json", help="write span timings and counters to this JSON file")
+    parser.add_argument("--metrics-prom", help="write the same metrics in Prometheus text format")
+    parser.add_argument("--profile", help="run under cProfile and dump stats to this .pstats file")
+    args = parser.parse_args(argv)
+
+    handlers = [logging.StreamHandler(sys.stderr)]
+    if args.log_file:
+        handlers.append(logging.FileHandler(args.log_file, encoding="utf-8"))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s", handlers=handlers)
+
+    import reporting
+    reporting.set_reporter(reporting.LogReporter())
+
+    from db import init_db
+    from pipeline import RunOptions, run_product
+
+    init_db()
+    opts = RunOptions(max_snippets=args.max_snippets, use_fulltext=args.fulltext, workers=args.workers,
+                      streaming=args.streaming)
+    if args.batch_size:
+        opts.batch_size = args.batch_size
+    if args.backend:
+        opts.backend = args.backend
+    if args.refresh_hours is not None:
+        opts.refresh_ttl = args.refresh_hours * 3600 or None
+
+    job_id = args.job_id or os.path.splitext(os.path.basename(args.jobs))[0]
+    jobs = read_jobs(args.jobs)
+    reporting.info(f"Job {job_id}: {len(jobs)} products")
+    failed = 0
+    with instrumentation.profile(args.profile) if args.profile else nullcontext():
+        for n, (product, brands) in enumerate(jobs, 1):
+            reporting.info(f"[{n}/{len(jobs)}] {product} ({', '.join(brands) or 'infer brands'})")
+            try:
+                with instrumentation.span("job.product"):
+                    run_product(product, brands, opts, job_id=job_id)
+            except Exception as e:
+                # Keep going; the failed product stays unfinished and is retried on the next run
+                # (brands whose searches failed without raising are left pending by run_product too)
+                failed += 1
+                reporting.error(f"{product} failed: {e}")
+    reporting.info(f"Job {job_id} finished: {len(jobs) - failed} ok, {failed} failed")
+    if args.metrics_json:
+        instrumentation.write_json(args.metrics_json)
+    if args.metrics_prom:
+        instrumentation.write_prometheus(args.metrics_prom)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# bench_fakes.py
+"""
+Offline stand-ins for the external services, used by bench_pipeline.py:
+SerpAPI, the Mistral client and review pages. Each fake sleeps for a
+configurable latency and can answer with a 429 at a configurable rate, so
+the real retry/backoff and parsing code still runs. A FakePipeline can also
+replace the sentiment model when no weights are available.
+"""
+import json
+import random
+import sys
+import threading
+import time
+import types
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+LANG_TEMPLATES = {
+    "en": ["The {brand} {product} is {adj}. {extra}", "I {verb} my new {brand} {product}, {adj} overall. {extra}"],
+    "es": ["El {product} de {brand} es {adj}. {extra}", "Compré el {brand} {product} y es {adj}. {extra}"],
+    "fr": ["Le {product} {brand} est {adj}. {extra}", "J'ai acheté ce {product} {brand}, vraiment {adj}. {extra}"],
+    "de": ["Der {brand} {product} ist {adj}. {extra}", "Mein neuer {product} von {brand} ist {adj}. {extra}"],
+    "hi": ["{brand} का {product} {adj} है। {extra}", "मैंने {brand} {product} खरीदा, {adj} है। {extra}"],
+}
+ADJECTIVES = {
+    "en": ["excellent", "terrible", "okay", "amazing", "disappointing", "decent"],
+    "es": ["excelente", "terrible", "normal", "increíble", "decepcionante"],
+    "fr": ["excellent", "horrible", "correct", "incroyable", "décevant"],
+    "de": ["ausgezeichnet", "schrecklich", "okay", "großartig", "enttäuschend"],
+    "hi": ["बहुत अच्छा", "बेकार", "ठीक", "शानदार", "निराशाजनक"],
+}
+VERBS = ["love", "hate", "like", "returned", "recommend"]
+EXTRAS = [
+    "Battery lasts about {n} hours.", "Delivery took {n} days.", "Used it for {n} weeks now.",
+    "Paid {n}00 rupees.", "Sound is clear at {n}0% volume.", "",
+]
+BRANDS = ["Sony", "Boat", "Jbl", "Bose", "Sennheiser", "Realme", "Oneplus", "Noise", "Philips", "Skullcandy",
+          "Zebronics", "Boult", "Marshall", "Audio", "Anker", "Mivi"]
+
+
+def make_review(rng: random.Random, brand: str, product: str, long: bool = False) -> str:
+    lang = rng.choice(list(LANG_TEMPLATES))
+    parts = []
+    for _ in range(rng.randint(8, 20) if long else 1):
+        parts.append(rng.choice(LANG_TEMPLATES[lang]).format(
+            brand=brand, product=product, adj=rng.choice(ADJECTIVES[lang]), verb=rng.choice(VERBS),
+            extra=rng.choice(EXTRAS).format(n=rng.randint(1, 40))))
+    return " ".join(parts)
+
+
+def make_corpus(size: int, product: str = "headphones", seed: int = 0, long_fraction: float = 0.1) -> List[dict]:
+    """size synthetic multilingual reviews spread over BRANDS: dicts with brand, title, snippet, link."""
+    rng = random.Random(seed)
+    brands = BRANDS[:max(1, min(len(BRANDS), size // 30 or 1))]
+    corpus = []
+    for i in range(size):
+        brand = brands[i % len(brands)]
+        site = ("amazon.in", "flipkart.com")[i % 2]
+        corpus.append({
+            "brand": brand,
+            "title": f"{brand} {product} review #{i}",
+            "snippet": make_review(rng, brand, product, long=rng.random() < long_fraction),
+            "link": f"https://www.{site}/{brand.lower()}-{product}/review/{seed}-{i}",
+        })
+    return corpus
+
+
+@dataclass
+class Faults:
+    """Latency (seconds, uniform between low and high) and 429 probability for one fake service."""
+    latency: tuple = (0.0, 0.0)
+    rate_429: float = 0.0
+    seed: int = 0
+    calls: int = 0
+    throttled: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+
+    def hit(self) -> bool:
+        """Sleep for one call; True if this call should be answered with a 429."""
+        with self._lock:
+            self.calls += 1
+            delay = self._rng.uniform(*self.latency)
+            throttle = self._rng.random() < self.rate_429
+            if throttle:
+                self.throttled += 1
+        if delay:
+            time.sleep(delay)
+        return throttle
+
+
+class FakeSerp:
+    """Serves corpus reviews as SerpAPI organic results for '<product> <brand> reviews ...' queries."""
+
+    def __init__(self, corpus: List[dict], faults: Faults):
+        self.faults = faults
+        self._by_brand: Dict[str, List[dict]] = {}
+        for r in corpus:
+            self._by_brand.setdefault(r["brand"].lower(), []).append(r)
+        self._offsets: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def results(self, params: dict) -> dict:
+        if self.faults.hit():
+            return {"error": "429 Too Many Requests: fake throttle"}
+        q, num = params.get("q", ""), int(params.get("num", 10))
+        words = q.lower().split()
+        brand = next((b for b in self._by_brand if b in words), None)
+        if brand is None:
+            # brand discovery query: mention every brand a few times
+            pool = [r for rs in self._by_brand.values() for r in rs[:2]]
+            return {"organic_results": [{"title": r["title"], "snippet": r["snippet"], "link": r["link"]}
+                                        for r in pool[:num]]}
+        reviews = self._by_brand[brand]
+        with self._lock:
+            # successive queries for a brand walk through its reviews, as different sites would
+            start = self._offsets.get(q, sum(1 for k in self._offsets if brand in k.lower().split()) * num)
+            self._offsets[q] = start
+        page = [reviews[(start + i) % len(reviews)] for i in range(min(num, len(reviews)))]
+        return {"organic_results": [{"title": r["title"], "snippet": r["snippet"], "link": r["link"]} for r in page]}
+
+    def module(self) -> types.ModuleType:
+        """A stand-in for the `serpapi` package exposing GoogleSearch."""
+        fake = self
+
+        class GoogleSearch:
+            def __init__(self, params):
+                self.params = params
+
+            def get_dict(self):
+                return fake.results(self.params)
+
+        mod = types.ModuleType("serpapi")
+        mod.GoogleSearch = GoogleSearch
+        return mod
+
+
+class FakeMistral:
+    """Mimics `Mistral(...).chat.complete`; calls marked as 429 raise like the SDK does."""
+
+    def __init__(self, faults: Faults, brands=BRANDS):
+        self.faults = faults
+        self.brands = {b.lower() for b in brands}
+        self.chat = self
+
+    def complete(self, model: str, messages: list, **kwargs):
+        if self.faults.hit():
+            raise RuntimeError("Status 429: service tier capacity exceeded")
+        prompt = messages[-1]["content"]
+        if kwargs.get("response_format", {}).get("type") == "json_object":
+            words = json.loads(prompt.rsplit("Words:", 1)[1])
+            content = json.dumps({"brands": [w for w in words if w.lower() in self.brands]})
+        else:
+            word = prompt.split("'")[1] if "'" in prompt else ""
+            content = "yes" if word.lower() in self.brands else "no"
+        message = types.SimpleNamespace(content=content)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(message=message)])
+
+
+class FakePages:
+    """Review pages in the Amazon/Flipkart markup the extractor expects; 429s come back as empty pages."""
+
+    def __init__(self, corpus: List[dict], faults: Faults):
+        self.faults = faults
+        self._by_link = {r["link"]: r for r in corpus}
+
+    def html(self, link: str, bypass_cache: bool = False) -> str:
+        if self.faults.hit():
+            return ""
+        return self.render(link)
+
+    def render(self, link: str) -> str:
+        """The page for link, without latency or faults."""
+        r = self._by_link.get(link)
+        body = (r["snippet"] + " ") * 3 if r else "Page not found"
+        if "amazon." in link:
+            block = f'<div class="a-row review-text-content"><span>{body}</span></div>'
+        else:
+            block = f'<div class="_27M-vq"><div class="t-ZTKy"><div>{body}</div></div></div>'
+        nav = "".join(f'<li><a href="/c/{i}">Category {i}</a></li>' for i in range(40))
+        return (f"<html><head><script>var x = {{}};</script><title>{r['title'] if r else ''}</title></head>"
+                f"<body><ul>{nav}</ul>{block}<footer>Footer text</footer></body></html>")
+
+
+class _FakeTokenizer:
+    def __call__(self, texts, truncation=True, max_length=512, add_special_tokens=True, **kwargs):
+        extra = 2 if add_special_tokens else 0
+        ids = [list(range(min(len(t.split()) + extra, max_length if truncation else 10 ** 9))) for t in texts]
+        return {"input_ids": ids}
+
+    def decode(self, ids):
+        return " ".join("tok" for _ in ids)
+
+
+class FakePipeline:
+    """Sentiment pipeline stand-in: cost grows with batch size x padded length, like the real model."""
+
+    LABELS = ("positive", "neutral", "negative")
+
+    def __init__(self, seconds_per_token: float = 2e-6):
+        self.tokenizer = _FakeTokenizer()
+        self.seconds_per_token = seconds_per_token
+
+    def __call__(self, texts, batch_size=16, truncation=True):
+        lengths = [len(ids) for ids in self.tokenizer(texts)["input_ids"]]
+        for i in range(0, len(texts), batch_size):
+            time.sleep(max(lengths[i:i + batch_size]) * len(lengths[i:i + batch_size]) * self.seconds_per_token)
+        out = []
+        for t in texts:
+            h = hash(t) % 3
+            out.append([{"label": self.LABELS[(h + k) % 3], "score": s} for k, s in enumerate((0.7, 0.2, 0.1))])
+        return out
+
+
+def install(corpus: List[dict], serp: Faults, llm: Faults, pages: Faults, fake_model: bool = False,
+            seconds_per_token: float = 2e-6) -> dict:
+    """
+    Patch the app modules to use the fakes. Returns the fake objects so the
+    caller can read their call/throttle counters.
+    """
+    import analyzer
+    import brand_inference
+    import serpapi_client
+
+    fakes = {"serp": FakeSerp(corpus, serp), "llm": FakeMistral(llm), "pages": FakePages(corpus, pages)}
+    sys.modules["serpapi"] = fakes["serp"].module()
+    serpapi_client.SERPAPI_KEY = serpapi_client.SERPAPI_KEY or "bench"
+    serpapi_client._fetch_page_html = fakes["pages"].html
+    brand_inference.MISTRAL_API_KEY = "bench"
+    brand_inference._client = fakes["llm"]
+    if fake_model:
+        fakes["model"] = FakePipeline(seconds_per_token)
+        analyzer.load_pipeline = lambda *args, **kwargs: fakes["model"]
+    return fakes
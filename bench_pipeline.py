@@ -0,0 +1,273 @@
+# bench_pipeline.py
+"""
+Offline end-to-end benchmark. SerpAPI, Mistral and review pages are replaced
+by the fakes in bench_fakes.py (with configurable latency and 429 injection),
+synthetic multilingual corpora are generated at several sizes, and each
+stage is timed separately:
+
+    brands     brand inference (fake search + fake LLM verification)
+    fetch      SerpAPI searches through the real fan-out/retry code
+    pages      full-text page fetches (fake latency + real extraction)
+    parse      review-text extraction alone, single thread
+    classify   sentiment model (real weights, or --fake-model)
+    db_write   insert_reviews + update_emotions_for_rows
+    aggregate  summary-table counts and per-brand reads
+
+    python bench_pipeline.py --sizes 200 1000 --fake-model --out bench_results/today.json
+    python bench_pipeline.py --fake-model --baseline bench_results/today.json
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+import bench_fakes
+import instrumentation
+import reporting
+
+STAGES = ("brands", "fetch", "pages", "parse", "classify", "db_write", "aggregate")
+DEFAULT_SIZES = (200, 1000)
+RESULTS_DIR = "bench_results"
+DB_CHUNK = 500
+
+
+class _Stage:
+    """Wall time for a stage plus the latency of each individual call inside it."""
+
+    def __init__(self):
+        self.latencies = []
+        self.items = 0
+        self.seconds = 0.0
+
+    def wrap(self, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.latencies.append(time.perf_counter() - start)
+        return timed
+
+    def summary(self) -> dict:
+        lat = sorted(self.latencies)
+        pick = lambda q: lat[min(len(lat) - 1, int(q * len(lat)))] * 1000 if lat else None
+        return {
+            "items": self.items,
+            "seconds": round(self.seconds, 4),
+            "items_per_sec": round(self.items / self.seconds, 2) if self.seconds else None,
+            "calls": len(lat),
+            "p50_ms": pick(0.5),
+            "p95_ms": pick(0.95),
+            "mean_ms": statistics.fmean(lat) * 1000 if lat else None,
+        }
+
+
+@contextmanager
+def _patched(module, name, wrapper):
+    original = getattr(module, name)
+    setattr(module, name, wrapper(original))
+    try:
+        yield
+    finally:
+        setattr(module, name, original)
+
+
+def _timed_stage(stages: dict, name: str):
+    stage = stages.setdefault(name, _Stage())
+
+    @contextmanager
+    def run():
+        start = time.perf_counter()
+        try:
+            yield stage
+        finally:
+            stage.seconds += time.perf_counter() - start
+    return run()
+
+
+def run_size(size: int, args, workdir: str) -> dict:
+    import analyzer
+    import brand_inference
+    import db
+    import serpapi_client
+    import ratelimit
+
+    corpus = bench_fakes.make_corpus(size, args.product, seed=args.seed, long_fraction=args.long_fraction)
+    fakes = bench_fakes.install(
+        corpus,
+        serp=bench_fakes.Faults((args.serp_latency_ms / 1000,) * 2, args.serp_429, seed=args.seed),
+        llm=bench_fakes.Faults((args.llm_latency_ms / 1000,) * 2, args.llm_429, seed=args.seed + 1),
+        pages=bench_fakes.Faults((args.page_latency_ms / 1000,) * 2, args.page_429, seed=args.seed + 2),
+        fake_model=args.fake_model,
+    )
+    # Fresh limiters per size, without the host-wide quota files real runs share
+    ratelimit.configure("serpapi", rate=args.serp_rate, capacity=serpapi_client.SERPAPI_MAX_CONCURRENCY,
+                        host_rate=None)
+    ratelimit.configure("mistral", host_rate=None)
+
+    db.close_conn()
+    db.DB_NAME = os.path.join(workdir, f"reviews-{size}.db")
+    db.init_db()
+    instrumentation.reset()
+    stages = {}
+
+    with _timed_stage(stages, "brands") as st, _patched(brand_inference, "_chat", st.wrap):
+        brands = brand_inference.infer_brands_from_serp(args.product, top_k=len(bench_fakes.BRANDS))
+        st.items = len(brands)
+    brands = brands or sorted({r["brand"] for r in corpus})
+
+    per_brand = max(1, size // len(brands))
+    with _timed_stage(stages, "fetch") as st, _patched(serpapi_client, "serpapi_search", st.wrap):
+        fetched = serpapi_client.get_reviews_for_brands(args.product, brands, max_snippets=per_brand)
+        st.items = sum(len(v) for v in fetched.values())
+
+    links = [r["link"] for r in corpus[:args.max_pages]]
+    with _timed_stage(stages, "pages") as st, \
+            _patched(serpapi_client, "try_fetch_full_text_from_link", st.wrap):
+        full = serpapi_client.fetch_full_texts(links)
+        st.items = sum(1 for t in full.values() if t)
+
+    pages = [(link, fakes["pages"].render(link)) for link in links]
+    with _timed_stage(stages, "parse") as st:
+        extract = st.wrap(serpapi_client.extract_review_text)
+        for link, html in pages:
+            extract(html, link)
+        st.items = len(pages)
+
+    fetched_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    records = [{"brand": r["brand"], "product": args.product, "source": "snippet", "title": r["title"],
+                "snippet": r["snippet"], "link": r["link"], "fetched_at": fetched_at} for r in corpus]
+    df = pd.DataFrame({"id": range(1, len(records) + 1), "snippet": [r["snippet"] for r in records]})
+    with _timed_stage(stages, "classify") as st, _patched(analyzer, "_run_with_retry", st.wrap):
+        labels = analyzer.detect_and_return(df, batch_size=args.batch_size, use_cache=False,
+                                            backend=args.backend, long_text=args.long_text, verbose=False)
+        st.items = len(labels)
+
+    with _timed_stage(stages, "db_write") as st:
+        insert = st.wrap(db.insert_reviews)
+        update = st.wrap(db.update_emotions_for_rows)
+        ids = []
+        for i in range(0, len(records), DB_CHUNK):
+            ids.extend(insert(records[i:i + DB_CHUNK]))
+        labels["id"] = ids
+        for i in range(0, len(labels), DB_CHUNK):
+            update(labels.iloc[i:i + DB_CHUNK])
+        st.items = len(records)
+
+    with _timed_stage(stages, "aggregate") as st:
+        counts = st.wrap(db.fetch_emotion_counts)(brands, args.product)
+        read = st.wrap(db.fetch_reviews)
+        rows = sum(len(read(b, args.product)) for b in brands)
+        st.items = rows
+        assert counts["count"].sum() <= rows
+
+    db.close_conn()
+    return {
+        "stages": {name: stages[name].summary() for name in STAGES if name in stages},
+        "fakes": {name: {"calls": f.faults.calls, "throttled": f.faults.throttled}
+                  for name, f in fakes.items() if hasattr(f, "faults")},
+        "instrumentation": instrumentation.snapshot(),
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """Stages whose throughput fell more than `tolerance` below the baseline: [(size, stage, ratio)]."""
+    regressions = []
+    for size, res in results["sizes"].items():
+        base = baseline.get("sizes", {}).get(size)
+        if not base:
+            continue
+        for stage, stats in res["stages"].items():
+            old = base["stages"].get(stage, {}).get("items_per_sec")
+            new = stats.get("items_per_sec")
+            if not old or new is None:
+                continue
+            ratio = new / old
+            flag = "REGRESSION" if ratio < 1 - tolerance else ""
+            print(f"  {size:>6} {stage:10s} {old:10.1f} -> {new:10.1f} items/s  ({ratio:5.2f}x) {flag}")
+            if flag:
+                regressions.append((size, stage, ratio))
+    return regressions
+
+
+def _print_table(size: int, res: dict):
+    print(f"\nsize {size}")
+    print(f"  {'stage':10s} {'items':>7s} {'seconds':>9s} {'items/s':>10s} {'p50 ms':>9s} {'p95 ms':>9s}")
+    fmt = lambda v, spec: format(v, spec) if v is not None else "-".rjust(len(format(0, spec)))
+    for stage, s in res["stages"].items():
+        print(f"  {stage:10s} {s['items']:7d} {s['seconds']:9.3f} {fmt(s['items_per_sec'], '10.1f')} "
+              f"{fmt(s['p50_ms'], '9.2f')} {fmt(s['p95_ms'], '9.2f')}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline per-stage pipeline benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--product", default="headphones")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--long-fraction", type=float, default=0.1, help="share of multi-paragraph reviews")
+    parser.add_argument("--fake-model", action="store_true", help="replace the sentiment model with a timed fake")
+    parser.add_argument("--backend", default=None)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--long-text", action="store_true", help="classify with sentence-aware chunking")
+    parser.add_argument("--max-pages", type=int, default=200, help="pages fetched/parsed per size")
+    parser.add_argument("--serp-rate", type=float, default=50.0, help="SerpAPI requests/sec allowed by the limiter")
+    parser.add_argument("--serp-latency-ms", type=float, default=50)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--page-latency-ms", type=float, default=30)
+    parser.add_argument("--serp-429", type=float, default=0.0, help="probability a search is throttled")
+    parser.add_argument("--llm-429", type=float, default=0.0)
+    parser.add_argument("--page-429", type=float, default=0.0)
+    parser.add_argument("--out", help=f"results JSON (default {RESULTS_DIR}/bench-<timestamp>.json)")
+    parser.add_argument("--baseline", help="earlier results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed throughput drop before failing")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(levelname)s %(message)s")
+    reporting.set_reporter(reporting.LogReporter())
+    import analyzer
+    import http_cache
+    import inference_cache
+    args.backend = args.backend or analyzer.DEFAULT_BACKEND
+
+    results = {
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory(prefix="bench-") as workdir:
+        # Never touch the real databases or response cache
+        http_cache.CACHE_DIR = os.path.join(workdir, "http_cache")
+        http_cache.BYPASS = True
+        inference_cache.CACHE_DB = os.path.join(workdir, "inference_cache.db")
+        for size in args.sizes:
+            res = run_size(size, args, workdir)
+            results["sizes"][str(size)] = res
+            _print_table(size, res)
+
+    out = args.out or os.path.join(RESULTS_DIR, f"bench-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nwrote {out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print(f"\ncompared with {args.baseline}:")
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} stage(s) slower than baseline by more than {args.tolerance:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# bench_startup.py
+"""
+Cold-start benchmark: time to import each app module in a fresh interpreter
+and time for the first render of main.py.
+
+    python bench_startup.py --runs 5 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ["analyzer", "serpapi_client", "brand_inference", "mistral_helper", "emotion_model",
+           "pipeline", "streaming", "db", "main"]
+HEAVY = ("torch", "transformers", "mistralai", "serpapi", "bs4", "optimum")
+
+_IMPORT_SNIPPET = """
+import sys, time, json
+start = time.perf_counter()
+try:
+    import {module}
+    error = None
+except BaseException as e:
+    error = f"{{type(e).__name__}}: {{e}}"
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "error": error,
+                  "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+_RENDER_SNIPPET = """
+import time, json
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file("main.py", default_timeout=600).run()
+print(json.dumps({"seconds": time.perf_counter() - start,
+                  "exceptions": [str(e.value) for e in at.exception]}))
+"""
+
+
+def _run_json(code: str, env: dict, args=()) -> dict:
+    out = subprocess.run([sys.executable, *args, "-c", code], capture_output=True, text=True, env=env)
+    lines = [l for l in out.stdout.splitlines() if l.startswith("{")]
+    if not lines:
+        return {"seconds": None, "error": (out.stderr.strip().splitlines() or ["no output"])[-1]}
+    return json.loads(lines[-1])
+
+
+def time_import(module: str, runs: int, env: dict) -> dict:
+    """Median wall time of `import module` in a fresh interpreter, plus which heavy deps it dragged in."""
+    results = [_run_json(_IMPORT_SNIPPET.format(module=module, heavy=HEAVY), env) for _ in range(runs)]
+    times = [r["seconds"] for r in results if r.get("seconds") is not None]
+    return {
+        "median_seconds": statistics.median(times) if times else None,
+        "min_seconds": min(times) if times else None,
+        "heavy_modules_loaded": results[-1].get("heavy", []),
+        "error": results[-1].get("error"),
+    }
+
+
+def import_profile(module: str, env: dict, top: int = 10) -> list:
+    """Largest cumulative entries from `python -X importtime`."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, env=env)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        try:
+            rows.append((int(cumulative.strip()), name.strip()))
+        except ValueError:
+            continue  # header line
+    rows.sort(reverse=True)
+    return [{"module": name, "cumulative_ms": us / 1000} for us, name in rows[:top]]
+
+
+def time_first_render(runs: int, env: dict) -> dict:
+    results = [_run_json(_RENDER_SNIPPET, env) for _ in range(runs)]
+    times = [r["seconds"] for r in results if r.get("seconds") is not None]
+    return {
+        "median_seconds": statistics.median(times) if times else None,
+        "exceptions": results[-1].get("exceptions") or results[-1].get("error"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import and first-render time")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--modules", nargs="*", default=MODULES)
+    parser.add_argument("--no-render", action="store_true", help="skip the Streamlit first-render timing")
+    parser.add_argument("--out", help="write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    # Keys only need to exist for call-time checks; nothing here talks to the network
+    env.setdefault("SERPAPI_API_KEY", "bench")
+    env.setdefault("MISTRAL_API_KEY", "bench")
+
+    results = {"python": sys.version.split()[0], "runs": args.runs, "imports": {}, "profile": {}}
+    for module in args.modules:
+        res = time_import(module, args.runs, env)
+        results["imports"][module] = res
+        took = "error" if res["median_seconds"] is None else f"{res['median_seconds'] * 1000:8.1f} ms"
+        heavy = ", ".join(res["heavy_modules_loaded"]) or "-"
+        print(f"{module:18s} {took}   heavy: {heavy}" + (f"   ({res['error']})" if res["error"] else ""))
+    results["profile"]["main"] = import_profile("main", env)
+
+    if not args.no_render:
+        start = time.perf_counter()
+        results["first_render"] = time_first_render(args.runs, env)
+        median = results["first_render"]["median_seconds"]
+        print(f"first render       {'error' if median is None else f'{median * 1000:8.1f} ms'}"
+              f"   (measured in {time.perf_counter() - start:.1f}s)")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"wrote {args.out}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
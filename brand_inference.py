@@ -0,0 +1,135 @@
+# brand_inference.py
+import os
+import json
+from typing import Dict, List, Optional
+
+import reporting
+from instrumentation import span, timed
+from ratelimit import RetryError, call_with_retry
+from concurrency import session_thread_pool
+from db import get_brand_verdicts, store_brand_verdicts
+
+BRAND_MODEL = "mistral-large-latest"
+FALLBACK_WORKERS = 4
+
+MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
+_client = None
+
+
+def _get_client():
+    """Build the Mistral client on first use so importing this module stays cheap."""
+    global _client
+    if _client is None:
+        from mistralai import Mistral
+        _client = Mistral(api_key=MISTRAL_API_KEY)
+    return _client
+
+IGNORE_WORDS = {"the","best","and","for","of","in","review","reviews","guide","headphones","earbuds"}
+
+
+def _chat(prompt: str, **kwargs) -> Optional[str]:
+    """Single Mistral completion under the shared "mistral" limiter. None if it never succeeded."""
+    def complete():
+        with span("llm.chat"):
+            return _get_client().chat.complete(
+                model=BRAND_MODEL,
+                messages=[{"role": "user", "content": prompt}],
+                **kwargs,
+            )
+
+    try:
+        resp = call_with_retry("mistral", complete, retries=3, base_delay=5.0,
+                               on_retry=lambda attempt, e, wait: reporting.warning(
+                                   f"LLM rate limit hit. Waiting {wait:.1f}s..."))
+    except RetryError:
+        return None
+    except Exception as e:
+        reporting.error(f"LLM check error: {e}")
+        return None
+    return resp.choices[0].message.content.strip()
+
+
+def _ask_is_brand(word: str, product_context: str) -> Optional[bool]:
+    ans = _chat(f"In the context of {product_context}, is '{word}' a brand? yes or no")
+    return None if ans is None else "yes" in ans.lower()
+
+
+@timed("llm.is_word_a_brand")
+def is_word_a_brand_llm(word: str, product_context: str) -> bool:
+    if not MISTRAL_API_KEY:
+        return False
+    return bool(_ask_is_brand(word, product_context))
+
+
+@timed("llm.verify_brands_batch")
+def verify_brands_batch(candidates: List[str], product_context: str) -> Optional[Dict[str, bool]]:
+    """
+    Classify every candidate in one structured LLM call.
+    Returns {candidate: is_brand}, or None if the reply could not be used.
+    """
+    prompt = (
+        f"In the context of {product_context}, which of the following words are brand names? "
+        'Answer with a JSON object of the form {"brands": [...]} listing only the words that are brands, '
+        "spelled exactly as given.\n"
+        f"Words: {json.dumps(candidates, ensure_ascii=False)}"
+    )
+    ans = _chat(prompt, response_format={"type": "json_object"})
+    if ans is None:
+        return None
+    try:
+        brands = json.loads(ans).get("brands")
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(brands, list):
+        return None
+    found = {str(b).strip().lower() for b in brands}
+    return {c: c.lower() in found for c in candidates}
+
+
+def verify_brands(candidates: List[str], product_context: str) -> Dict[str, bool]:
+    """
+    Brand verdicts for candidates: cached ones first, then one batched LLM
+    call for the rest, falling back to parallel per-word calls. Only verdicts
+    the LLM actually gave are stored in the persistent cache.
+    """
+    verdicts = get_brand_verdicts(product_context, candidates)
+    unknown = [c for c in candidates if c not in verdicts]
+    if not unknown or not MISTRAL_API_KEY:
+        return {c: verdicts.get(c, False) for c in candidates}
+
+    reporting.info(f"🤖 Verifying {len(unknown)} new candidates with the LLM ({len(verdicts)} cached)")
+    fresh = verify_brands_batch(unknown, product_context)
+    if fresh is None:
+        reporting.warning("Batched brand check failed, falling back to per-word checks")
+        with session_thread_pool(min(FALLBACK_WORKERS, len(unknown)), name="brand-llm") as pool:
+            answers = pool.map(lambda w: _ask_is_brand(w, product_context), unknown)
+        fresh = {w: a for w, a in zip(unknown, answers) if a is not None}
+
+    store_brand_verdicts(product_context, fresh)
+    verdicts.update(fresh)
+    return {c: verdicts.get(c, False) for c in candidates}
+
+
+def infer_brands_from_serp(product, top_k=5):
+    from serpapi_client import serpapi_search, extract_snippets_from_results
+    reporting.info("🔎 Inferring brands from search results...")
+    try:
+        res = serpapi_search(f"{product} brands reviews", num=20)
+        items = extract_snippets_from_results(res)
+    except Exception as e:
+        reporting.error(f"Error fetching search results: {e}")
+        return []
+
+    tokens = {}
+    for it in items:
+        txt = (it.get("title") or "") + " " + (it.get("snippet") or "")
+        for w in txt.split():
+            w = w.strip('.,!?:;()[]{}')
+            if w.istitle() and len(w) > 2 and w.lower() not in IGNORE_WORDS:
+                tokens[w] = tokens.get(w, 0) + 1
+
+    candidates = [t for t, _ in sorted(tokens.items(), key=lambda x: x[1], reverse=True)[:15]]
+    reporting.info(f"Candidates: {candidates}")
+
+    verdicts = verify_brands(candidates, product)
+    return [c for c in candidates if verdicts[c]][:top_k]
@@ -0,0 +1,23 @@
+# concurrency.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+
+def session_thread_pool(max_workers: int, name: str = "worker") -> ThreadPoolExecutor:
+    """
+    ThreadPoolExecutor whose threads inherit the current Streamlit script
+    context, so progress messages (see reporting.py) from workers still reach the
+    user's page. Outside Streamlit it is a plain thread pool.
+    """
+    ctx = None
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+        ctx = get_script_run_ctx()
+    except ImportError:
+        pass
+
+    def attach():
+        if ctx is not None:
+            add_script_run_ctx(threading.current_thread(), ctx)
+
+    return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name, initializer=attach)
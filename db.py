@@ -1,15 +1,70 @@
 # db.py
 import sqlite3
+import threading
+import time
 import pandas as pd
-from typing import Optional
+from typing import Iterator, Optional, List
+
+import reporting
+from instrumentation import count, span, timed
+from near_dup import NEAR_DUP_THRESHOLD, band_keys, best_match, signature, to_blob, from_blob
 
 DB_NAME = "reviews.db"
+SCHEMA_VERSION = 8
 
-def init_db():
-    conn = sqlite3.connect(DB_NAME)
-    c = conn.cursor()
-    # Schema remains the same, the issue is with old DB files
-    c.execute("""
+REVIEW_COLUMNS = ["brand", "product", "source", "title", "snippet", "link", "emotion", "fetched_at"]
+# Near-duplicate bookkeeping: canonical row id for duplicates, MinHash signature for canonical rows
+DEDUP_COLUMNS = {"duplicate_of": "INTEGER", "minhash": "BLOB"}
+# Model class probabilities, float16 packed in rescoring.LABELS order (see rescoring.py)
+SCORE_COLUMNS = {"scores": "BLOB"}
+# What callers get back from SELECTs (signatures stay internal)
+_COLUMNS = ["id", *REVIEW_COLUMNS, "duplicate_of"]
+_SELECT_COLUMNS = ", ".join(_COLUMNS)
+# Rows per chunk for the iterator APIs: memory use is bounded by this, not by the table size
+DEFAULT_CHUNK_ROWS = 50_000
+
+_local = threading.local()
+
+
+def get_conn() -> sqlite3.Connection:
+    """
+    Reused connection for the current thread (one per DB file), set up once
+    with WAL and tuned pragmas instead of reconnecting on every call.
+    """
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(DB_NAME)
+    if conn is None:
+        conn = sqlite3.connect(DB_NAME, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+        conn.execute("PRAGMA mmap_size=268435456")
+        conn.execute("PRAGMA busy_timeout=30000")
+        conns[DB_NAME] = conn
+    return conn
+
+
+def close_conn():
+    """Close this thread's connections (e.g. before deleting the DB file)."""
+    for conn in getattr(_local, "conns", {}).values():
+        conn.close()
+    _local.conns = {}
+
+
+def _migrate(conn: sqlite3.Connection):
+    """
+    Idempotent schema setup for reviews.db files created by older versions:
+    missing columns are added in place, indexes and tables are created if
+    absent and the count triggers are (re)created. Files already at
+    SCHEMA_VERSION are left alone, so a start (or Streamlit rerun) runs no
+    DDL and never invalidates other connections' prepared statements.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS reviews (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             brand TEXT,
@@ -22,46 +77,445 @@ def init_db():
             fetched_at TEXT
         )
     """)
-    conn.commit()
-    conn.close()
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(reviews)")}
+    for col in REVIEW_COLUMNS:
+        if col not in existing:
+            conn.execute(f"ALTER TABLE reviews ADD COLUMN {col} TEXT")
+    for col, col_type in {**DEDUP_COLUMNS, **SCORE_COLUMNS}.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE reviews ADD COLUMN {col} {col_type}")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_brand_product ON reviews(brand, product)")
+    # Partial index: only rows still waiting for a sentiment label
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_unclassified ON reviews(brand, product) WHERE emotion IS NULL")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_reviews_duplicate_of ON reviews(duplicate_of) WHERE duplicate_of IS NOT NULL")
+
+    had_counts = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='review_counts'").fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS review_counts (
+            brand TEXT NOT NULL,
+            product TEXT NOT NULL,
+            emotion TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (brand, product, emotion)
+        ) WITHOUT ROWID
+    """)
+    _create_count_triggers(conn)
+    if not had_counts:
+        _rebuild_counts(conn)
+
+    # LLM brand verdicts; deliberately not touched by clear_cache
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS brand_verdicts (
+            product_context TEXT NOT NULL,
+            token TEXT NOT NULL,
+            is_brand INTEGER NOT NULL,
+            checked_at TEXT NOT NULL,
+            PRIMARY KEY (product_context, token)
+        ) WITHOUT ROWID
+    """)
+
+    # Resumable progress for headless batch jobs (batch_run.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS job_progress (
+            job_id TEXT NOT NULL,
+            product TEXT NOT NULL,
+            brand TEXT NOT NULL,
+            stage TEXT NOT NULL,
+            detail TEXT,
+            updated_at TEXT NOT NULL,
+            PRIMARY KEY (job_id, product, brand)
+        ) WITHOUT ROWID
+    """)
+
+    # LSH buckets of canonical rows' MinHash signatures, so a new snippet is only compared with rows
+    # sharing a band instead of rebuilding an index over the whole brand+product on every insert
+    had_bands = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='minhash_bands'").fetchone()
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS minhash_bands (
+            brand TEXT NOT NULL,
+            product TEXT NOT NULL,
+            band INTEGER NOT NULL,
+            key BLOB NOT NULL,
+            id INTEGER NOT NULL,
+            PRIMARY KEY (brand, product, band, key, id)
+        ) WITHOUT ROWID
+    """)
+    if not had_bands:
+        _backfill_bands(conn)
+
+    # When each (brand, product, search query) was last fetched, for incremental refresh
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS fetch_watermarks (
+            brand TEXT NOT NULL,
+            product TEXT NOT NULL,
+            query TEXT NOT NULL,
+            last_fetched_at TEXT NOT NULL,
+            PRIMARY KEY (brand, product, query)
+        ) WITHOUT ROWID
+    """)
 
-def insert_reviews(records: list):
+    conn.execute(f"PRAGMA user_version={SCHEMA_VERSION}")
+
+
+def _create_count_triggers(conn: sqlite3.Connection):
     """
-    records: list of dicts matching columns: brand, product, source, title, snippet, link, fetched_at
+    Keep review_counts in step with reviews. Near-duplicate rows are not
+    counted, so mirrored snippets don't inflate a brand. Triggers are
+    recreated by every migration; bump SCHEMA_VERSION when changing them.
     """
-    if not records:
-        return
-    df = pd.DataFrame(records)
-    conn = sqlite3.connect(DB_NAME)
-    df.to_sql("reviews", conn, if_exists="append", index=False)
-    conn.close()
+    bump = """
+        INSERT INTO review_counts (brand, product, emotion, count)
+        SELECT COALESCE(NEW.brand, ''), COALESCE(NEW.product, ''), NEW.emotion, 1
+        WHERE NEW.emotion IS NOT NULL AND NEW.duplicate_of IS NULL
+        ON CONFLICT (brand, product, emotion) DO UPDATE SET count = count + 1;
+    """
+    drop = """
+        UPDATE review_counts SET count = count - 1
+        WHERE OLD.emotion IS NOT NULL AND OLD.duplicate_of IS NULL AND brand = COALESCE(OLD.brand, '')
+          AND product = COALESCE(OLD.product, '') AND emotion = OLD.emotion;
+        DELETE FROM review_counts
+        WHERE count <= 0 AND brand = COALESCE(OLD.brand, '')
+          AND product = COALESCE(OLD.product, '') AND emotion = OLD.emotion;
+    """
+    triggers = {
+        "trg_review_counts_insert": f"AFTER INSERT ON reviews BEGIN {bump} END",
+        "trg_review_counts_update": f"AFTER UPDATE OF brand, product, emotion, duplicate_of ON reviews BEGIN {drop} {bump} END",
+        "trg_review_counts_delete": f"AFTER DELETE ON reviews BEGIN {drop} END",
+    }
+    for name, body in triggers.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {body}")
+
+
+def _rebuild_counts(conn: sqlite3.Connection):
+    conn.execute("DELETE FROM review_counts")
+    conn.execute("""
+        INSERT INTO review_counts (brand, product, emotion, count)
+        SELECT COALESCE(brand, ''), COALESCE(product, ''), emotion, COUNT(*)
+        FROM reviews WHERE emotion IS NOT NULL AND duplicate_of IS NULL
+        GROUP BY 1, 2, 3
+    """)
+
+
+@timed("db.init_db")
+def init_db():
+    conn = get_conn()
+    with conn:
+        _migrate(conn)
+    # Refresh planner statistics only where SQLite thinks they are stale
+    conn.execute("PRAGMA optimize")
+
+
+def _backfill_bands(conn: sqlite3.Connection, chunk_rows: int = 5000):
+    """
+    One-time LSH band keys for canonical rows stored before minhash_bands
+    existed; rows from before dedup get their signature computed here too.
+    """
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            "SELECT id, brand, product, snippet, minhash FROM reviews "
+            "WHERE id > ? AND duplicate_of IS NULL ORDER BY id LIMIT ?", (last_id, chunk_rows)).fetchall()
+        if not rows:
+            break
+        last_id = rows[-1][0]
+        sigs, bands = [], []
+        for row_id, brand, product, snippet, blob in rows:
+            sig = from_blob(blob)
+            if sig is None:
+                sig = signature(snippet or "")
+                if sig is None:
+                    continue
+                sigs.append((to_blob(sig), row_id))
+            bands.extend((brand or "", product or "", band, key, row_id) for band, key in band_keys(sig))
+        conn.executemany("UPDATE reviews SET minhash=? WHERE id=?", sigs)
+        conn.executemany("INSERT OR IGNORE INTO minhash_bands VALUES (?, ?, ?, ?, ?)", bands)
+
+
+def _candidates(conn: sqlite3.Connection, brand: str, product: str, sig) -> list:
+    """Canonical rows of brand+product sharing an LSH band with sig: [(id, minhash, snippet)]."""
+    keys = band_keys(sig)
+    lookup = " UNION ".join(["SELECT id FROM minhash_bands WHERE brand=? AND product=? AND band=? AND key=?"] * len(keys))
+    params = [v for band, key in keys for v in (brand, product, band, key)]
+    return conn.execute(
+        f"SELECT id, minhash, snippet FROM reviews WHERE id IN ({lookup}) AND duplicate_of IS NULL", params
+    ).fetchall()
+
+
+@timed("db.insert_reviews")
+def insert_reviews(records, dedup_threshold: Optional[float] = NEAR_DUP_THRESHOLD) -> List[int]:
+    """
+    records: list of dicts (or a DataFrame) matching columns: brand, product, source, title, snippet, link, fetched_at
+    Snippets that are near-duplicates (MinHash similarity >= dedup_threshold) of a
+    review already stored for the same brand+product are stored with duplicate_of
+    pointing at that canonical row and take over its emotion and scores (if it
+    has them yet); pass dedup_threshold=None to disable (rows stored that way
+    are not matched against later either).
+    Returns the ids of the inserted rows, in order.
+    """
+    if records is None or len(records) == 0:
+        return []
+    if isinstance(records, pd.DataFrame):
+        records = records.to_dict("records")
+    conn = get_conn()
+    columns = [*REVIEW_COLUMNS, *DEDUP_COLUMNS]
+    cols = ", ".join(columns)
+    marks = ", ".join("?" * len(columns))
+    # Duplicates copy the canonical row's label, otherwise they would stay unlabelled for good
+    # (unclassified queries skip them and the canonical row may never be written again)
+    copy_marks = ", ".join("COALESCE(?, emotion)" if c == "emotion" else "?" for c in columns)
+    insert_copy = f"INSERT INTO reviews ({cols}, scores) SELECT {copy_marks}, scores FROM reviews WHERE id=?"
+    ids = []
+    duplicates = 0
+    with conn:
+        for r in records:
+            duplicate_of, sig = None, None
+            brand, product = r.get("brand") or "", r.get("product") or ""
+            if dedup_threshold is not None:
+                sig = signature(r.get("snippet") or "")
+                if sig is not None:
+                    match = best_match(sig, r.get("snippet") or "", _candidates(conn, brand, product, sig),
+                                       dedup_threshold)
+                    if match:
+                        duplicate_of = match[0]
+                        duplicates += 1
+            values = [r.get(c) for c in REVIEW_COLUMNS] + [duplicate_of, None if duplicate_of else to_blob(sig)]
+            if duplicate_of:
+                cur = conn.execute(insert_copy, [*values, duplicate_of])
+            else:
+                cur = conn.execute(f"INSERT INTO reviews ({cols}) VALUES ({marks})", values)
+            ids.append(cur.lastrowid)
+            if sig is not None and duplicate_of is None:
+                conn.executemany("INSERT OR IGNORE INTO minhash_bands VALUES (?, ?, ?, ?, ?)",
+                                 [(brand, product, band, key, cur.lastrowid) for band, key in band_keys(sig)])
+    count("db.rows_inserted", len(ids))
+    if duplicates:
+        count("db.near_duplicates", duplicates)
+        reporting.info(f"🧬 Linked {duplicates} of {len(records)} new snippets to existing near-duplicates")
+    return ids
+
 
+@timed("db.fetch_reviews")
 def fetch_reviews(brand: str, product: str) -> pd.DataFrame:
-    conn = sqlite3.connect(DB_NAME)
-    query = "SELECT * FROM reviews WHERE brand=? AND product=?"
-    df = pd.read_sql_query(query, conn, params=(brand, product))
-    conn.close()
-    return df
+    query = f"SELECT {_SELECT_COLUMNS} FROM reviews WHERE brand=? AND product=?"
+    return pd.read_sql_query(query, get_conn(), params=(brand, product))
+
+
+def iter_reviews(brands: List[str], product: str, columns: Optional[List[str]] = None,
+                 chunk_size: int = DEFAULT_CHUNK_ROWS, unclassified_only: bool = False,
+                 limit: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Stored rows for these brands as DataFrames of at most chunk_size rows,
+    brand by brand in id order. Pages by id (keyset) over the brand/product
+    indexes, so only one chunk is in memory and rows may be updated (e.g.
+    labelled) between chunks. columns projects the SELECT (e.g. without
+    snippet); unclassified_only keeps canonical rows without an emotion yet
+    (served from the partial unclassified index; near-duplicates inherit their
+    canonical row's label); limit caps the total number of rows. "scores" can
+    be requested explicitly.
+    """
+    cols = list(columns or _COLUMNS)
+    unknown = set(cols) - set(_COLUMNS) - set(SCORE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown review columns: {sorted(unknown)}")
+    select = ", ".join(dict.fromkeys(["id", *cols]))
+    where = "brand=? AND product=? AND id > ?"
+    if unclassified_only:
+        where += " AND emotion IS NULL AND duplicate_of IS NULL"
+    remaining = limit
+    for brand in brands:
+        last_id = 0
+        while remaining is None or remaining > 0:
+            n = chunk_size if remaining is None else min(chunk_size, remaining)
+            with span("db.iter_reviews"):
+                chunk = pd.read_sql_query(f"SELECT {select} FROM reviews WHERE {where} ORDER BY id LIMIT ?",
+                                          get_conn(), params=(brand, product, last_id, n))
+            if chunk.empty:
+                break
+            last_id = int(chunk["id"].iloc[-1])
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk[cols]
+            if len(chunk) < n:
+                break
+
+
+@timed("db.count_reviews")
+def count_reviews(brands: List[str], product: str, unclassified_only: bool = False) -> int:
+    if not brands:
+        return 0
+    marks = ", ".join("?" * len(brands))
+    where = f"product=? AND brand IN ({marks})"
+    if unclassified_only:
+        where += " AND emotion IS NULL AND duplicate_of IS NULL"
+    return get_conn().execute(f"SELECT COUNT(*) FROM reviews WHERE {where}", (product, *brands)).fetchone()[0]
+
+
+@timed("db.canonical_ids")
+def canonical_ids(ids: List[int]) -> List[int]:
+    """The subset of ids that are not near-duplicates of another row."""
+    found = set()
+    conn = get_conn()
+    for i in range(0, len(ids), 500):
+        chunk = [int(x) for x in ids[i:i + 500]]
+        marks = ", ".join("?" * len(chunk))
+        found.update(r[0] for r in conn.execute(
+            f"SELECT id FROM reviews WHERE id IN ({marks}) AND duplicate_of IS NULL", chunk))
+    return [int(i) for i in ids if int(i) in found]
+
+
+@timed("db.fetch_emotion_counts")
+def fetch_emotion_counts(brands: List[str], product: str) -> pd.DataFrame:
+    """
+    Per-brand sentiment counts from the review_counts summary table:
+    columns brand, emotion, count. Never touches the reviews themselves.
+    """
+    if not brands:
+        return pd.DataFrame(columns=["brand", "emotion", "count"])
+    marks = ", ".join("?" * len(brands))
+    query = f"""
+        SELECT brand, emotion, count FROM review_counts
+        WHERE product=? AND brand IN ({marks}) AND count > 0
+        ORDER BY brand, emotion
+    """
+    return pd.read_sql_query(query, get_conn(), params=(product, *brands))
+
+
+@timed("db.rebuild_emotion_counts")
+def rebuild_emotion_counts():
+    """Recompute review_counts from scratch (e.g. after editing reviews.db by hand)."""
+    conn = get_conn()
+    with conn:
+        _rebuild_counts(conn)
+
+
+def _verdict_key(product_context: str, token: str = ""):
+    return product_context.strip().lower(), token.strip().lower()
+
+
+@timed("db.get_brand_verdicts")
+def get_brand_verdicts(product_context: str, tokens: List[str]) -> dict:
+    """Cached LLM verdicts: {token: is_brand} for the tokens seen before in this product context."""
+    if not tokens:
+        return {}
+    ctx, _ = _verdict_key(product_context)
+    by_key = {_verdict_key(product_context, t)[1]: t for t in tokens}
+    marks = ", ".join("?" * len(by_key))
+    rows = get_conn().execute(
+        f"SELECT token, is_brand FROM brand_verdicts WHERE product_context=? AND token IN ({marks})",
+        (ctx, *by_key),
+    ).fetchall()
+    return {by_key[token]: bool(is_brand) for token, is_brand in rows}
 
+
+@timed("db.store_brand_verdicts")
+def store_brand_verdicts(product_context: str, verdicts: dict):
+    if not verdicts:
+        return
+    now = time.strftime("%Y-%m-%d %H:%M:%S")
+    conn = get_conn()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO brand_verdicts (product_context, token, is_brand, checked_at) VALUES (?, ?, ?, ?)",
+            [(*_verdict_key(product_context, t), int(bool(v)), now) for t, v in verdicts.items()],
+        )
+
+
+@timed("db.set_job_progress")
+def set_job_progress(job_id: str, product: str, brand: str, stage: str, detail: Optional[str] = None):
+    conn = get_conn()
+    with conn:
+        conn.execute(
+            "INSERT OR REPLACE INTO job_progress (job_id, product, brand, stage, detail, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (job_id, product, brand, stage, detail, time.strftime("%Y-%m-%d %H:%M:%S")),
+        )
+
+
+@timed("db.get_job_progress")
+def get_job_progress(job_id: str) -> dict:
+    """{(product, brand): stage} for everything this job has recorded so far."""
+    rows = get_conn().execute(
+        "SELECT product, brand, stage FROM job_progress WHERE job_id=?", (job_id,)).fetchall()
+    return {(product, brand): stage for product, brand, stage in rows}
+
+
+@timed("db.get_watermarks")
+def get_watermarks(brand: str, product: str, queries: List[str]) -> dict:
+    """
+    {query: last_fetched_at} for this brand+product. If no query was ever
+    recorded, all of them fall back to the newest fetched_at of the stored
+    reviews (data fetched before watermarks existed), or None if there are no
+    reviews at all. Once some are recorded, a missing query (e.g. one whose
+    search failed) is None, so it is searched again.
+    """
+    conn = get_conn()
+    rows = dict(conn.execute(
+        "SELECT query, last_fetched_at FROM fetch_watermarks WHERE brand=? AND product=?", (brand, product)))
+    legacy = None
+    if not rows:
+        legacy = conn.execute(
+            "SELECT MAX(fetched_at) FROM reviews WHERE brand=? AND product=?", (brand, product)).fetchone()[0]
+    return {q: rows.get(q, legacy) for q in queries}
+
+
+@timed("db.set_watermarks")
+def set_watermarks(brand: str, product: str, queries: List[str], fetched_at: str):
+    if not queries:
+        return
+    conn = get_conn()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO fetch_watermarks (brand, product, query, last_fetched_at) VALUES (?, ?, ?, ?)",
+            [(brand, product, q, fetched_at) for q in queries],
+        )
+
+
+@timed("db.stored_links")
+def stored_links(brand: str, product: str) -> set:
+    """Links already stored for brand+product, so a refresh only inserts new ones."""
+    rows = get_conn().execute(
+        "SELECT DISTINCT link FROM reviews WHERE brand=? AND product=? AND link IS NOT NULL", (brand, product))
+    return {r[0] for r in rows}
+
+
+@timed("db.update_emotions_for_rows")
 def update_emotions_for_rows(updates: pd.DataFrame):
     """
-    updates: DataFrame containing id and emotion columns.
+    updates: DataFrame containing id and emotion columns, and optionally
+    scores (packed blobs from rescoring.pack_scores) to store alongside.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-    for _, r in updates.iterrows():
-        cur.execute("UPDATE reviews SET emotion=? WHERE id=?", (r['emotion'], int(r['id'])))
-    conn.commit()
-    conn.close()
+    if updates is None or updates.empty:
+        return
+    ids = [int(i) for i in updates['id']]
+    if "scores" in updates.columns:
+        blobs = [b if isinstance(b, bytes) else None for b in updates['scores']]
+        rows = list(zip(updates['emotion'].tolist(), blobs, ids))
+        assign = "emotion=?, scores=?"
+    else:
+        rows = list(zip(updates['emotion'].tolist(), ids))
+        assign = "emotion=?"
+    count("db.rows_labelled", len(rows))
+    conn = get_conn()
+    with conn:
+        conn.executemany(f"UPDATE reviews SET {assign} WHERE id=?", rows)
+        # Near-duplicates share their canonical row's label (and scores)
+        conn.executemany(f"UPDATE reviews SET {assign} WHERE duplicate_of=?", rows)
+
 
+@timed("db.clear_cache")
 def clear_cache():
     """
     Drops the table entirely to ensure the schema is recreated on next init.
     This is more robust than just deleting rows.
     """
-    conn = sqlite3.connect(DB_NAME)
-    cur = conn.cursor()
-    cur.execute("DROP TABLE IF EXISTS reviews") # <-- CORRECTED LOGIC
-    conn.commit()
-    conn.close()
-    init_db() # Re-create the table immediately after dropping
\ No newline at end of file
+    conn = get_conn()
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS reviews")
+        conn.execute("DROP TABLE IF EXISTS review_counts")
+        conn.execute("DROP TABLE IF EXISTS fetch_watermarks")
+        conn.execute("DROP TABLE IF EXISTS minhash_bands")
+        conn.execute("PRAGMA user_version=0")  # so init_db migrates again
+    init_db() # Re-create the table immediately after dropping
@@ -1,5 +1,25 @@
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+# emotion_model.py
+from functools import lru_cache
 
 model_name = "cardiffnlp/twitter-xlm-roberta-base-sentiment"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSequenceClassification.from_pretrained(model_name)
+
+
+@lru_cache(maxsize=1)
+def get_tokenizer():
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(model_name)
+
+
+@lru_cache(maxsize=1)
+def get_model():
+    from transformers import AutoModelForSequenceClassification
+    return AutoModelForSequenceClassification.from_pretrained(model_name)
+
+
+def __getattr__(name):
+    # Keeps `from emotion_model import tokenizer, model` working, loading on first access
+    if name == "tokenizer":
+        return get_tokenizer()
+    if name == "model":
+        return get_model()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,134 @@
+# export.py
+"""
+Stream stored reviews to CSV, gzipped CSV, Parquet or Arrow IPC without
+holding a whole product in memory: rows come from db.iter_reviews one chunk
+at a time and each chunk is written out before the next is read. This CLI is
+the memory-bounded export path; the Streamlit download button in
+ui.export_csv has to hold the finished file in memory.
+
+    python export.py headphones Sony Boat -o reviews.parquet --columns brand emotion link
+"""
+import argparse
+import gzip
+import importlib.util
+import io
+import sys
+from typing import BinaryIO, List, Optional, Union
+
+from db import DEFAULT_CHUNK_ROWS, REVIEW_COLUMNS, iter_reviews
+from instrumentation import count, timed
+
+EXPORT_FORMATS = ("csv", "csv.gz", "parquet", "arrow")
+MIME_TYPES = {
+    "csv": "text/csv",
+    "csv.gz": "application/gzip",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.file",
+}
+EXPORT_COLUMNS = ["id", *REVIEW_COLUMNS, "duplicate_of"]
+INT_COLUMNS = {"id", "duplicate_of"}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise RuntimeError("Parquet/Arrow export needs pyarrow: pip install pyarrow")
+    return pa
+
+
+def default_format() -> str:
+    """Parquet when pyarrow is installed (compressed and typed), else gzipped CSV. Does not import pyarrow."""
+    return "parquet" if importlib.util.find_spec("pyarrow") else "csv.gz"
+
+
+def _schema(pa, columns: List[str]):
+    # Fixed up front so every chunk matches, even one whose column is all NULL
+    return pa.schema([(c, pa.int64() if c in INT_COLUMNS else pa.string()) for c in columns])
+
+
+def _write_csv(out: BinaryIO, chunks, gz: bool) -> int:
+    raw = gzip.GzipFile(fileobj=out, mode="wb") if gz else out
+    text = io.TextIOWrapper(raw, encoding="utf-8", newline="")
+    rows = 0
+    try:
+        for i, chunk in enumerate(chunks):
+            # A chunk with NULLs reads as float64; nullable Int64 keeps "1" from becoming "1.0"
+            ints = [c for c in chunk.columns if c in INT_COLUMNS]
+            chunk = chunk.astype({c: "Int64" for c in ints})
+            chunk.to_csv(text, index=False, header=i == 0)
+            rows += len(chunk)
+    finally:
+        text.flush()
+        text.detach()
+        if gz:
+            raw.close()
+    return rows
+
+
+def _write_arrow(out: BinaryIO, chunks, columns: List[str], fmt: str) -> int:
+    pa = _pyarrow()
+    schema = _schema(pa, columns)
+    if fmt == "parquet":
+        writer = pa.parquet.ParquetWriter(out, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_file(out, schema, options=pa.ipc.IpcWriteOptions(compression="zstd"))
+    rows = 0
+    try:
+        for chunk in chunks:
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        writer.close()
+    return rows
+
+
+@timed("export.write")
+def write_export(dest: Union[str, BinaryIO], brands: List[str], product: str, fmt: str = "csv",
+                 columns: Optional[List[str]] = None, chunk_size: int = DEFAULT_CHUNK_ROWS) -> int:
+    """
+    Write the stored rows of these brands to dest (a path or a binary file
+    object) in fmt, one chunk of at most chunk_size rows at a time. columns
+    picks and orders the exported columns (default: all). Returns the row count.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {EXPORT_FORMATS}")
+    columns = list(columns or EXPORT_COLUMNS)
+    if fmt in ("parquet", "arrow"):
+        _pyarrow()  # fail before a half-written file is left behind
+    chunks = iter_reviews(brands, product, columns=columns, chunk_size=chunk_size)
+
+    out = open(dest, "wb") if isinstance(dest, str) else dest
+    try:
+        if fmt in ("csv", "csv.gz"):
+            rows = _write_csv(out, chunks, gz=fmt == "csv.gz")
+        else:
+            rows = _write_arrow(out, chunks, columns, fmt)
+    finally:
+        if out is not dest:
+            out.close()
+    count("export.rows", rows)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export stored reviews without loading them all into memory")
+    parser.add_argument("product")
+    parser.add_argument("brands", nargs="+")
+    parser.add_argument("-o", "--out", required=True, help="output path; the format defaults to its extension")
+    parser.add_argument("--format", choices=EXPORT_FORMATS)
+    parser.add_argument("--columns", nargs="+", choices=EXPORT_COLUMNS, help="columns to export (default: all)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    fmt = args.format or next((f for f in sorted(EXPORT_FORMATS, key=len, reverse=True)
+                               if args.out.endswith("." + f)), "csv")
+    rows = write_export(args.out, args.brands, args.product, fmt, args.columns, args.chunk_rows)
+    print(f"wrote {rows} rows to {args.out} ({fmt})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,7 @@
+# html_utils.py
+"""Small helpers shared by the review-page extractors (serpapi_client, scraper)."""
+
+
+def has_class(name: str) -> str:
+    """XPath predicate matching elements whose class attribute contains `name` as a whole word."""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
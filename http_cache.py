@@ -0,0 +1,148 @@
+# http_cache.py
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Optional
+
+CACHE_DIR = os.environ.get("HTTP_CACHE_DIR", "http_cache")
+MAX_BYTES = int(os.environ.get("HTTP_CACHE_MAX_MB", "512")) * 1024 * 1024
+
+# Seconds a stored response stays fresh, per source
+TTLS = {
+    "serpapi": 24 * 3600,
+    "page": 7 * 24 * 3600,
+}
+DEFAULT_TTL = 24 * 3600
+
+# When set, lookups always miss for the whole process (fresh responses are still written back).
+# A single run bypasses the cache by passing bypass=True instead.
+BYPASS = os.environ.get("HTTP_CACHE_BYPASS") == "1"
+
+_lock = threading.Lock()
+_approx_size = None
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evicted_files": 0}
+_stats_lock = threading.Lock()
+
+
+def _bump(stat: str, n: int = 1):
+    with _stats_lock:
+        _stats[stat] += n
+
+
+def cache_key(payload) -> str:
+    """Content address for a request: sha256 of its canonical JSON form."""
+    if not isinstance(payload, str):
+        payload = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _path(source: str, key: str) -> str:
+    return os.path.join(CACHE_DIR, source, key[:2], key + ".z")
+
+
+def get(source: str, payload, ttl: Optional[float] = None, bypass: bool = False) -> Optional[bytes]:
+    """
+    Return the cached body for payload if present and younger than the source
+    TTL. bypass=True always misses, for callers that want a fresh response.
+    """
+    if bypass or BYPASS:
+        return None
+    path = _path(source, cache_key(payload))
+    ttl = TTLS.get(source, DEFAULT_TTL) if ttl is None else ttl
+    try:
+        st = os.stat(path)
+        if time.time() - st.st_mtime > ttl:
+            _bump("misses")
+            return None
+        with open(path, "rb") as f:
+            data = zlib.decompress(f.read())
+        # Bump access time only; mtime stays the write time so the TTL isn't extended
+        os.utime(path, (time.time(), st.st_mtime))
+    except (OSError, zlib.error):
+        _bump("misses")
+        return None
+    _bump("hits")
+    return data
+
+
+def put(source: str, payload, data: bytes):
+    global _approx_size
+    path = _path(source, cache_key(payload))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    blob = zlib.compress(data, 6)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(blob)
+    os.replace(tmp, path)
+    _bump("writes")
+
+    with _lock:
+        if _approx_size is None:
+            _approx_size = _disk_usage()
+        else:
+            _approx_size += len(blob)
+        if _approx_size > MAX_BYTES:
+            _approx_size = _evict(int(MAX_BYTES * 0.9))
+
+
+def get_json(source: str, payload, ttl: Optional[float] = None, bypass: bool = False):
+    data = get(source, payload, ttl, bypass)
+    return None if data is None else json.loads(data.decode("utf-8"))
+
+
+def put_json(source: str, payload, obj):
+    put(source, payload, json.dumps(obj, ensure_ascii=False).encode("utf-8"))
+
+
+def _entries():
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".z"):
+                path = os.path.join(root, name)
+                try:
+                    yield path, os.stat(path)
+                except OSError:
+                    continue
+
+
+def _disk_usage() -> int:
+    return sum(st.st_size for _, st in _entries())
+
+
+def _evict(target_bytes: int) -> int:
+    """Delete least recently read entries until the store is under target_bytes."""
+    entries = sorted(_entries(), key=lambda e: e[1].st_atime)
+    total = sum(st.st_size for _, st in entries)
+    for path, st in entries:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= st.st_size
+            _bump("evicted_files")
+        except OSError:
+            pass
+    return total
+
+
+def cache_stats() -> dict:
+    """Hit/miss/write/eviction counters for this process."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    return stats
+
+
+def clear_http_cache():
+    global _approx_size
+    with _lock:
+        for path, _ in list(_entries()):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        _approx_size = 0
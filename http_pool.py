@@ -0,0 +1,56 @@
+# http_pool.py
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+POOL_SIZE = 32
+PER_HOST_LIMIT = 4
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+_CHUNK = 64 * 1024
+
+_local = threading.local()
+_host_slots = defaultdict(lambda: threading.BoundedSemaphore(PER_HOST_LIMIT))
+_host_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """One keep-alive session per thread, so connections are reused across pages."""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _local.session = session
+    return session
+
+
+@contextmanager
+def host_slot(url: str):
+    """Limit how many requests run against the same host at once."""
+    host = urlsplit(url).netloc.lower()
+    with _host_lock:
+        slot = _host_slots[host]
+    with slot:
+        yield
+
+
+def get_capped(url: str, headers: dict = None, timeout: float = 8, max_bytes: int = MAX_PAGE_BYTES):
+    """
+    Streamed GET that stops reading after max_bytes.
+    Returns (status_code, text); text is empty for non-200 responses.
+    """
+    with host_slot(url):
+        with get_session().get(url, headers=headers, timeout=timeout, stream=True) as r:
+            if r.status_code != 200:
+                return r.status_code, ""
+            body = bytearray()
+            for chunk in r.iter_content(_CHUNK):
+                body.extend(chunk)
+                if len(body) >= max_bytes:
+                    break
+            return r.status_code, bytes(body[:max_bytes]).decode(r.encoding or "utf-8", errors="replace")
@@ -0,0 +1,172 @@
+# inference_cache.py
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+# Kept in its own file so db.clear_cache() (which drops the reviews table) never wipes it.
+CACHE_DB = "inference_cache.db"
+MAX_ENTRIES = 200_000
+_SQL_CHUNK = 500
+
+_stats = {"hits": 0, "misses": 0, "writes": 0, "evictions": 0}
+_stats_lock = threading.Lock()
+_init_lock = threading.RLock()
+_sizes = {}  # cache file -> entry count (kept up to date by this process instead of COUNT(*) per call)
+_local = threading.local()
+
+
+def normalize_text(text: str) -> str:
+    """Unicode-normalize and collapse whitespace so trivially different copies share a key."""
+    text = unicodedata.normalize("NFKC", text or "")
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha1(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def init_cache():
+    """Create or upgrade the cache table. Runs once per process and file; later calls are free."""
+    with _init_lock:
+        if CACHE_DB in _sizes:
+            return
+        conn = _conn()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS inference_cache (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                label TEXT NOT NULL,
+                last_used REAL NOT NULL,
+                scores BLOB,
+                PRIMARY KEY (model, text_hash)
+            ) WITHOUT ROWID
+        """)
+        # Caches created before class probabilities were kept: their entries just have no scores
+        if "scores" not in {row[1] for row in conn.execute("PRAGMA table_info(inference_cache)")}:
+            conn.execute("ALTER TABLE inference_cache ADD COLUMN scores BLOB")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_inference_cache_last_used ON inference_cache(last_used)")
+        conn.commit()
+        _sizes[CACHE_DB] = conn.execute("SELECT COUNT(*) FROM inference_cache").fetchone()[0]
+
+
+def _conn() -> sqlite3.Connection:
+    """Reused connection for the current thread and cache file."""
+    conns = getattr(_local, "conns", None)
+    if conns is None:
+        conns = _local.conns = {}
+    conn = conns.get(CACHE_DB)
+    if conn is None:
+        conn = conns[CACHE_DB] = sqlite3.connect(CACHE_DB, timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def get_cached_labels(model_name: str, texts: List[str]) -> Dict[str, str]:
+    """
+    Look up labels for texts. Returns {text_hash: label} for the hits and
+    bumps their last_used timestamp so eviction stays LRU.
+    """
+    return {h: label for h, (label, _) in get_cached_entries(model_name, texts).items()}
+
+
+def get_cached_entries(model_name: str, texts: List[str]) -> Dict[str, Tuple[str, Optional[bytes]]]:
+    """Like get_cached_labels, but returns {text_hash: (label, packed scores or None)}."""
+    hashes = list({text_hash(t) for t in texts})
+    found = {}
+    if not hashes:
+        return found
+    init_cache()
+    conn = _conn()
+    for i in range(0, len(hashes), _SQL_CHUNK):
+        chunk = hashes[i:i + _SQL_CHUNK]
+        marks = ",".join("?" * len(chunk))
+        rows = conn.execute(
+            f"SELECT text_hash, label, scores FROM inference_cache WHERE model=? AND text_hash IN ({marks})",
+            [model_name, *chunk],
+        ).fetchall()
+        found.update((h, (label, scores)) for h, label, scores in rows)
+    if found:
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "UPDATE inference_cache SET last_used=? WHERE model=? AND text_hash=?",
+                [(now, model_name, h) for h in found],
+            )
+    with _stats_lock:
+        _stats["hits"] += len(found)
+        _stats["misses"] += len(hashes) - len(found)
+    return found
+
+
+def store_labels(model_name: str, labels: Dict[str, str], scores: Optional[Dict[str, bytes]] = None):
+    """
+    labels: {text: label}. Only real model labels should be passed in;
+    'unknown'/'error' placeholders are not worth remembering.
+    scores: optional {text: packed class probabilities} stored with them.
+    """
+    if not labels:
+        return
+    scores = scores or {}
+    init_cache()
+    now = time.time()
+    conn = _conn()
+    with conn:
+        conn.executemany(
+            "INSERT OR REPLACE INTO inference_cache (model, text_hash, label, last_used, scores) VALUES (?, ?, ?, ?, ?)",
+            [(model_name, text_hash(t), label, now, scores.get(t)) for t, label in labels.items()],
+        )
+        with _init_lock:
+            # Upper bound: replaced entries are counted too until the next real COUNT in _evict
+            _sizes[CACHE_DB] += len(labels)
+        evicted = _evict(conn)
+    with _stats_lock:
+        _stats["writes"] += len(labels)
+        _stats["evictions"] += evicted
+
+
+def _evict(conn) -> int:
+    """
+    Drop least-recently-used entries once the cache grows past MAX_ENTRIES.
+    The tracked size only over-estimates, so the table is counted for real
+    only when that estimate crosses the limit.
+    """
+    if _sizes[CACHE_DB] <= MAX_ENTRIES:
+        return 0
+    size = conn.execute("SELECT COUNT(*) FROM inference_cache").fetchone()[0]
+    excess = 0
+    if size > MAX_ENTRIES:
+        # Trim to 90% so we don't evict on every single write once full
+        excess = size - int(MAX_ENTRIES * 0.9)
+        conn.execute("""
+            DELETE FROM inference_cache WHERE (model, text_hash) IN (
+                SELECT model, text_hash FROM inference_cache ORDER BY last_used LIMIT ?
+            )
+        """, (excess,))
+    with _init_lock:
+        _sizes[CACHE_DB] = size - excess
+    return excess
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters for this process plus the cache size (tracked, not counted on every call)."""
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = stats["hits"] + stats["misses"]
+    stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+    init_cache()
+    stats["size"] = _sizes[CACHE_DB]
+    return stats
+
+
+def clear_inference_cache():
+    init_cache()
+    conn = _conn()
+    with conn:
+        conn.execute("DELETE FROM inference_cache")
+    with _init_lock:
+        _sizes[CACHE_DB] = 0
@@ -0,0 +1,150 @@
+# inference_pool.py
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from typing import Iterable, Iterator, Optional, Union
+
+import pandas as pd
+
+import reporting
+from rescoring import pack_scores
+from analyzer import (
+    MODEL_NAME, MAX_CHARS, DEFAULT_BATCH_SIZE, DEFAULT_BACKEND, MAX_CHUNKS_PER_TEXT,
+    _best_label, _cache_key, _plan_rows, _remember,
+)
+
+DEFAULT_SHARD_SIZE = 256
+
+# Per-worker state, filled in once by _init_worker
+_pipe = None
+
+
+def physical_cores() -> int:
+    """Count physical cores (hyperthreads don't help a matmul-bound model)."""
+    try:
+        cores = set()
+        phys = None
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("physical id"):
+                    phys = line.split(":")[1].strip()
+                elif line.startswith("core id"):
+                    cores.add((phys, line.split(":")[1].strip()))
+        if cores:
+            return len(cores)
+    except OSError:
+        pass
+    return os.cpu_count() or 1
+
+
+def _init_worker(model_name: str, backend: str, threads: int):
+    """Pin intra-op threads, then load the model once for the lifetime of the worker."""
+    global _pipe
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+        os.environ[var] = str(threads)
+    import torch
+    torch.set_num_threads(threads)
+    try:
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        pass  # already fixed for this process
+
+    from analyzer import load_pipeline
+    _pipe = load_pipeline(model_name, backend)
+
+
+def _classify_shard(hashes: list, texts: list, batch_size: int, long_text: bool, max_chunks: int):
+    from analyzer import _score
+    return hashes, _score(_pipe, texts, batch_size, long_text, max_chunks)
+
+
+def iter_detect_parallel(df: Union[pd.DataFrame, Iterable[pd.DataFrame]], workers: int, text_col: str = "snippet",
+                         batch_size: int = DEFAULT_BATCH_SIZE, backend: str = DEFAULT_BACKEND,
+                         use_cache: bool = True, shard_size: int = DEFAULT_SHARD_SIZE,
+                         long_text: bool = False, max_chunks: int = MAX_CHUNKS_PER_TEXT,
+                         total: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """
+    Same results as analyzer.detect_and_return, but the rows that need the model
+    are sharded across `workers` processes. Yields id/emotion/scores DataFrames as soon
+    as each shard finishes, so callers can write them with update_emotions_for_rows
+    while the rest is still running. df may also be an iterable of DataFrames
+    (e.g. db.iter_reviews chunks): they share a single pool, so the workers load
+    the model once for the whole backlog, and the next chunk's shards are queued
+    while the current ones are still running, so no worker idles at chunk
+    boundaries. total (rows in the whole backlog, e.g. from db.count_reviews)
+    caps the pool size for small backlogs; a DataFrame is its own total.
+    """
+    if isinstance(df, pd.DataFrame):
+        chunks, total = [df], len(df)
+    else:
+        chunks = df
+    if total is not None:
+        workers = min(workers, max(1, -(-total // max(batch_size, 1))))
+    workers = max(1, workers)
+    cache_key = _cache_key(MODEL_NAME, backend, long_text)
+    pool = None
+    inflight = {}  # future -> (row ids, {text hash: row indices}, {text hash: text}) of its chunk
+    start = time.perf_counter()
+    done = 0
+
+    def collect(fut) -> pd.DataFrame:
+        nonlocal done
+        ids, rows_by_hash, pending = inflight.pop(fut)
+        shard_hashes, shard_scores = fut.result()
+        new_labels = {h: _best_label(s) for h, s in zip(shard_hashes, shard_scores)}
+        new_scores = {h: pack_scores(s) for h, s in zip(shard_hashes, shard_scores)}
+        if use_cache:
+            _remember(cache_key, pending, new_labels, new_scores)
+        done += len(shard_hashes)
+        rows = [(ids[i], label, new_scores[h]) for h, label in new_labels.items() for i in rows_by_hash[h]]
+        return pd.DataFrame(rows, columns=["id", "emotion", "scores"])
+
+    try:
+        for chunk in chunks:
+            ids, labels, scores, hashes, pending = _plan_rows(chunk, text_col, cache_key, use_cache,
+                                                              max_chars=None if long_text else MAX_CHARS)
+            rows_by_hash = {}
+            for i, h in hashes.items():
+                rows_by_hash.setdefault(h, []).append(i)
+
+            known = [i for i in range(len(ids)) if i not in hashes or hashes[i] not in pending]
+            if known:
+                yield pd.DataFrame({"id": [ids[i] for i in known], "emotion": [labels[i] for i in known],
+                                    "scores": [scores[i] for i in known]})
+            if not pending:
+                continue
+
+            if pool is None:
+                threads = max(1, physical_cores() // workers)
+                # spawn, not fork: forking a process that already has torch/OpenMP threads can deadlock
+                pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context("spawn"),
+                                           initializer=_init_worker, initargs=(MODEL_NAME, backend, threads))
+                reporting.info(f"⚡ Running {backend} model across {workers} processes ({threads} threads each)...")
+            # Small chunks are split finer so every worker still gets a share
+            size = max(batch_size, min(shard_size, -(-len(pending) // workers)))
+            items = list(pending.items())
+            shards = [items[i:i + size] for i in range(0, len(items), size)]
+            reporting.info(f"⚡ Classifying {len(pending)} snippets in {len(shards)} shards...")
+            for shard in shards:
+                fut = pool.submit(_classify_shard, [h for h, _ in shard], [t for _, t in shard], batch_size,
+                                  long_text, max_chunks)
+                inflight[fut] = (ids, rows_by_hash, pending)
+
+            # Hand back what has finished, and only block once about two rounds of shards are queued:
+            # the rest keeps the workers busy while the next chunk is read and planned
+            for fut in [f for f in inflight if f.done()]:
+                yield collect(fut)
+            while len(inflight) > 2 * workers:
+                finished, _ = wait(list(inflight), return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    yield collect(fut)
+        for fut in as_completed(list(inflight)):
+            yield collect(fut)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    if done:
+        elapsed = time.perf_counter() - start
+        reporting.info(f"📈 Classified {done} snippets in {elapsed:.1f}s ({done / max(elapsed, 1e-9):.1f} rows/sec)")
@@ -0,0 +1,206 @@
+# inference_server.py
+"""
+Shared local sentiment service: one process holds the model and every client
+(UI replicas, batch_run, streaming) sends it texts over localhost HTTP.
+Concurrent requests are merged into micro-batches before hitting the model.
+
+    python inference_server.py --port 8765 --backend onnx-int8
+    INFERENCE_SERVER_URL=http://127.0.0.1:8765 streamlit run main.py
+"""
+import argparse
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional
+
+import reporting
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+SERVER_URL = os.environ.get("INFERENCE_SERVER_URL")
+
+MAX_BATCH_TEXTS = 256     # texts merged into one model call at most
+MAX_WAIT_MS = 10          # how long the first request waits for others to join its batch
+CLIENT_CHUNK = 512        # texts per HTTP request from the client
+CLIENT_TIMEOUT = 300
+
+
+class MicroBatcher:
+    """
+    Single model thread fed by a queue. Requests that arrive within MAX_WAIT_MS
+    of each other (up to MAX_BATCH_TEXTS texts) are classified together, with
+    duplicate texts across requests only run once.
+    """
+
+    def __init__(self, pipe, batch_size: int, max_batch: int = MAX_BATCH_TEXTS, max_wait_ms: float = MAX_WAIT_MS):
+        self.pipe = pipe
+        self.batch_size = batch_size
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.stats = {"requests": 0, "texts": 0, "model_calls": 0, "model_texts": 0, "model_seconds": 0.0}
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name="micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts: List[str], long_text: bool, max_chunks: int) -> List[Optional[dict]]:
+        fut = Future()
+        self._queue.put((texts, long_text, max_chunks, fut))
+        return fut.result()
+
+    def _collect(self) -> list:
+        items = [self._queue.get()]
+        n = len(items[0][0])
+        deadline = time.monotonic() + self.max_wait
+        while n < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            n += len(item[0])
+        return items
+
+    def _loop(self):
+        from analyzer import _score
+        while True:
+            items = self._collect()
+            groups = {}
+            for item in items:
+                groups.setdefault((item[1], item[2]), []).append(item)
+            for (long_text, max_chunks), group in groups.items():
+                unique = list(dict.fromkeys(t for texts, *_ in group for t in texts))
+                start = time.perf_counter()
+                try:
+                    scores = dict(zip(unique, _score(self.pipe, unique, self.batch_size, long_text, max_chunks,
+                                                     verbose=False)))
+                except Exception as e:
+                    for *_, fut in group:
+                        fut.set_exception(e)
+                    continue
+                with self._lock:
+                    self.stats["requests"] += len(group)
+                    self.stats["texts"] += sum(len(texts) for texts, *_ in group)
+                    self.stats["model_calls"] += 1
+                    self.stats["model_texts"] += len(unique)
+                    self.stats["model_seconds"] += time.perf_counter() - start
+                for texts, *_, fut in group:
+                    fut.set_result([scores[t] for t in texts])
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch"] = stats["model_texts"] / stats["model_calls"] if stats["model_calls"] else 0.0
+        return stats
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "SentimentServer/1.0"
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path != "/health":
+            return self._reply(404, {"error": "not found"})
+        self._reply(200, {"model": self.server.model_name, "backend": self.server.backend,
+                          **self.server.batcher.snapshot()})
+
+    def do_POST(self):
+        if self.path != "/classify":
+            return self._reply(404, {"error": "not found"})
+        from analyzer import MAX_CHUNKS_PER_TEXT, _best_label
+        try:
+            req = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            texts = [str(t) for t in req["texts"]]
+            long_text = bool(req.get("long_text", False))
+            max_chunks = int(req.get("max_chunks", MAX_CHUNKS_PER_TEXT))
+        except (ValueError, KeyError, TypeError, AttributeError) as e:
+            return self._reply(400, {"error": f"bad request: {e}"})
+        backend = req.get("backend", self.server.backend)
+        if backend != self.server.backend:
+            # Labels are cached per backend on the client side, so never answer for a different one
+            return self._reply(409, {"error": f"server runs {self.server.backend!r}, not {backend!r}"})
+        try:
+            scores = self.server.batcher.submit(texts, long_text, max_chunks)
+        except Exception as e:
+            return self._reply(500, {"error": str(e)})
+        self._reply(200, {"labels": [_best_label(s) for s in scores], "scores": scores,
+                          "backend": self.server.backend})
+
+    def log_message(self, fmt, *args):
+        pass  # one line per request is too noisy under load
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT, backend: Optional[str] = None,
+          batch_size: Optional[int] = None, max_batch: int = MAX_BATCH_TEXTS,
+          max_wait_ms: float = MAX_WAIT_MS) -> ThreadingHTTPServer:
+    """Load the model once and return the bound HTTP server; call serve_forever() on it."""
+    from analyzer import MODEL_NAME, DEFAULT_BACKEND, DEFAULT_BATCH_SIZE, load_pipeline
+    backend = backend or DEFAULT_BACKEND
+    pipe = load_pipeline(MODEL_NAME, backend)
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.model_name = MODEL_NAME
+    server.backend = backend
+    server.batcher = MicroBatcher(pipe, batch_size or DEFAULT_BATCH_SIZE, max_batch, max_wait_ms)
+    return server
+
+
+def classify_remote(texts: List[str], backend: str, long_text: bool = False, max_chunks: Optional[int] = None,
+                    url: Optional[str] = None) -> List[Optional[dict]]:
+    """
+    Client side: score texts on the shared server. One {label: probability}
+    dict per text in input order (None where the model failed).
+    """
+    from http_pool import get_session
+    url = (url or SERVER_URL or f"http://{DEFAULT_HOST}:{DEFAULT_PORT}").rstrip("/")
+    scores = []
+    for i in range(0, len(texts), CLIENT_CHUNK):
+        payload = {"texts": texts[i:i + CLIENT_CHUNK], "backend": backend, "long_text": long_text}
+        if max_chunks is not None:
+            payload["max_chunks"] = max_chunks
+        r = get_session().post(f"{url}/classify", json=payload, timeout=CLIENT_TIMEOUT)
+        if r.status_code != 200:
+            raise RuntimeError(f"Inference server at {url} returned {r.status_code}: {r.text[:200]}")
+        scores.extend(r.json()["scores"])
+    return scores
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the sentiment model to local clients")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--backend", default=None)
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH_TEXTS)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    server = serve(args.host, args.port, args.backend, args.batch_size, args.max_batch, args.max_wait_ms)
+    reporting.info(f"Serving {server.model_name} ({server.backend}) on http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
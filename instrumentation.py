@@ -0,0 +1,183 @@
+# instrumentation.py
+"""
+Lightweight timing spans and counters for finding where a run spends its time.
+
+    with span("serpapi.search"):          # time a block
+    @timed("db.insert_reviews")           # time every call of a function
+    count("serpapi.retries")              # bump a counter
+    observe("serpapi.rate_limit_wait", s) # record a duration measured elsewhere
+
+Everything is aggregated in-process (count / total / max per span) and can be
+exported with write_json() or write_prometheus(). Setting INSTRUMENT_JSON or
+INSTRUMENT_PROM to a path writes that file at exit; INSTRUMENT_EVENTS appends
+one JSON line per finished span. INSTRUMENTATION=0 turns recording off.
+
+For hot paths inside a span, run under profile() (cProfile, writes .pstats)
+or attach py-spy to the process: worker threads carry descriptive names
+(serpapi-*, fulltext-*, stream-*, micro-batcher), which show up in its output.
+"""
+import atexit
+import cProfile
+import functools
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+ENABLED = os.environ.get("INSTRUMENTATION", "1") != "0"
+EVENTS_PATH = os.environ.get("INSTRUMENT_EVENTS")
+METRIC_PREFIX = "review_comparator"
+
+_lock = threading.Lock()
+_spans = {}     # name -> {"count", "errors", "total", "max"}
+_counters = {}  # name -> value
+_events_file = None
+
+
+def _record(name: str, seconds: float, error: bool = False):
+    global _events_file
+    with _lock:
+        s = _spans.get(name)
+        if s is None:
+            s = _spans[name] = {"count": 0, "errors": 0, "total": 0.0, "max": 0.0}
+        s["count"] += 1
+        s["errors"] += error
+        s["total"] += seconds
+        s["max"] = max(s["max"], seconds)
+        if EVENTS_PATH:
+            if _events_file is None:
+                _events_file = open(EVENTS_PATH, "a", encoding="utf-8")
+            _events_file.write(json.dumps({"ts": time.time(), "span": name, "seconds": round(seconds, 6),
+                                           "error": error, "thread": threading.current_thread().name}) + "\n")
+
+
+@contextmanager
+def span(name: str):
+    """Time the enclosed block under `name`; exceptions are counted and re-raised."""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        _record(name, time.perf_counter() - start, error)
+
+
+def timed(name: str):
+    """Decorator form of span()."""
+    def wrap(fn):
+        @functools.wraps(fn)
+        def inner(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return inner
+    return wrap
+
+
+def observe(name: str, seconds: float):
+    """Record a duration measured elsewhere (e.g. time spent waiting for a rate limiter)."""
+    if ENABLED:
+        _record(name, seconds)
+
+
+def count(name: str, n: float = 1):
+    if not ENABLED:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + n
+
+
+def snapshot() -> dict:
+    """{"spans": {name: {count, errors, total, max, mean}}, "counters": {name: value}}"""
+    with _lock:
+        spans = {name: dict(s) for name, s in _spans.items()}
+        counters = dict(_counters)
+    for s in spans.values():
+        s["mean"] = s["total"] / s["count"] if s["count"] else 0.0
+    return {"spans": spans, "counters": counters}
+
+
+def reset():
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+
+
+def write_json(path: str) -> dict:
+    snap = {"written_at": time.strftime("%Y-%m-%d %H:%M:%S"), "pid": os.getpid(), **snapshot()}
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(snap, f, indent=2, sort_keys=True)
+    return snap
+
+
+def _metric_label(name: str) -> str:
+    return name.replace("\\", "\\\\").replace('"', '\\"')
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", f"{METRIC_PREFIX}_{name}")
+
+
+def prometheus_text() -> str:
+    """Current metrics in the Prometheus text exposition format."""
+    snap = snapshot()
+    base = f"{METRIC_PREFIX}_span_seconds"
+    lines = [f"# HELP {base} Time spent in instrumented spans.", f"# TYPE {base} summary"]
+    for name, s in sorted(snap["spans"].items()):
+        label = f'{{span="{_metric_label(name)}"}}'
+        lines.append(f"{base}_count{label} {s['count']}")
+        lines.append(f"{base}_sum{label} {s['total']:.6f}")
+    lines.append(f"# TYPE {base}_max gauge")
+    lines.extend(f'{base}_max{{span="{_metric_label(n)}"}} {s["max"]:.6f}' for n, s in sorted(snap["spans"].items()))
+    lines.append(f"# TYPE {METRIC_PREFIX}_span_errors_total counter")
+    lines.extend(f'{METRIC_PREFIX}_span_errors_total{{span="{_metric_label(n)}"}} {s["errors"]}'
+                 for n, s in sorted(snap["spans"].items()))
+    for name, value in sorted(snap["counters"].items()):
+        metric = _metric_name(name) + "_total"
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus(path: str):
+    """Write prometheus_text() atomically, e.g. into a node_exporter textfile directory."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(prometheus_text())
+    os.replace(tmp, path)
+
+
+@contextmanager
+def profile(path: Optional[str] = None):
+    """
+    cProfile the enclosed block (all of it, not just spans) and dump stats to
+    path, for `python -m pstats` or snakeviz. Profiles only the calling thread.
+    """
+    prof = cProfile.Profile()
+    prof.enable()
+    try:
+        yield prof
+    finally:
+        prof.disable()
+        if path:
+            prof.dump_stats(path)
+
+
+def _export_at_exit():
+    if os.environ.get("INSTRUMENT_JSON"):
+        write_json(os.environ["INSTRUMENT_JSON"])
+    if os.environ.get("INSTRUMENT_PROM"):
+        write_prometheus(os.environ["INSTRUMENT_PROM"])
+    if _events_file is not None:
+        _events_file.close()
+
+
+atexit.register(_export_at_exit)
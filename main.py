@@ -6,24 +6,28 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 import os
-import time
-import random
-from mistralai import Mistral
 
-from serpapi_client import get_reviews_for_brand
-from db import init_db, insert_reviews, fetch_reviews, update_emotions_for_rows, clear_cache
-from analyzer import detect_and_return
+import http_cache
+import instrumentation
+from db import init_db, iter_reviews, count_reviews, fetch_emotion_counts, clear_cache
+from export import EXPORT_COLUMNS, EXPORT_FORMATS, default_format
+from ui import export_csv
+from analyzer import BACKENDS, DEFAULT_BACKEND, warm_pipeline_async
+from inference_pool import physical_cores
+from brand_inference import infer_brands_from_serp
+from pipeline import RunOptions, fetch_and_store, classify_pending
+from streaming import run_streaming
+from rescoring import brand_summary
+
+PREVIEW_ROWS = 1000
 
 st.set_page_config(page_title="SerpAPI-driven Review Comparator", layout="wide")
 st.title("🔎 Product Review Comparison via SerpAPI (Amazon/Flipkart)")
 
-MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
 SERPAPI_API_KEY = os.environ.get("SERPAPI_API_KEY")
 
 if not SERPAPI_API_KEY:
     st.error("🚨 Missing SERPAPI_API_KEY")
-if MISTRAL_API_KEY:
-    mistral_client = Mistral(api_key=MISTRAL_API_KEY)
 
 init_db()
 
@@ -33,62 +37,39 @@ product_name = st.sidebar.text_input("Product name", "headphones")
 brands_input = st.sidebar.text_input("Brands (comma separated)", "")
 num_snippets = st.sidebar.slider("Max snippets per brand", 5, 100, 30)
 use_fulltext = st.sidebar.checkbox("Fetch full review pages", False)
+max_chunks = st.sidebar.slider("Max chunks per full review", 1, 16, 8, disabled=not use_fulltext,
+                               help="Full reviews are classified over sentence-aware chunks instead of the first 512 chars")
+batch_size = st.sidebar.select_slider("Inference batch size", options=[1, 4, 8, 16, 32, 64], value=16)
+backend = st.sidebar.selectbox("Inference backend", BACKENDS, index=BACKENDS.index(DEFAULT_BACKEND),
+                               help="int8/ONNX backends are faster on CPU; validate with `python analyzer.py <backend>`")
+streaming = st.sidebar.checkbox("Streaming pipeline", False,
+                                help="Classify and store reviews while other brands are still being fetched")
+inference_workers = st.sidebar.number_input("Inference worker processes", 1, physical_cores(), 1,
+                                            help="Shard large backlogs across processes (1 = run in this process)")
+
+neutral_band = st.sidebar.slider("Neutral band", 0.0, 0.5, 0.0, 0.05,
+                                 help="Count a review as neutral when P(positive) and P(negative) are this close; "
+                                      "recomputed from stored probabilities, no model run")
+refresh_hours = st.sidebar.number_input("Refresh reviews older than (hours)", 0, 24 * 90, 168,
+                                        help="Re-search brands whose last fetch is older than this and add only new "
+                                             "links; 0 never re-fetches a brand that already has reviews")
+export_format = st.sidebar.selectbox("Export format", EXPORT_FORMATS, index=EXPORT_FORMATS.index(default_format()),
+                                     help="Parquet/Arrow are compressed and much smaller for large comparisons")
+export_columns = st.sidebar.multiselect("Export columns", EXPORT_COLUMNS,
+                                        default=[c for c in EXPORT_COLUMNS if c != "snippet"])
+bypass_cache = st.sidebar.checkbox("Bypass HTTP cache", False,
+                                   help="Re-query SerpAPI and re-download pages even if a fresh copy is cached")
+
+# Start loading the model now so it is usually ready by the time "Run Analysis" is clicked
+warm_pipeline_async(backend=backend)
 
 if st.sidebar.button("Clear DB cache"):
     clear_cache()
     st.success("✅ Database reset!")
 
-# --- Helper: LLM check ---
-def is_word_a_brand_llm(word: str, product_context: str) -> bool:
-    if not MISTRAL_API_KEY:
-        return False
-    for attempt in range(3):
-        try:
-            resp = mistral_client.chat.complete(
-                model="mistral-large-latest",
-                messages=[{"role": "user", "content": f"In the context of {product_context}, is '{word}' a brand? yes or no"}],
-            )
-            ans = resp.choices[0].message.content.strip().lower()
-            return "yes" in ans
-        except Exception as e:
-            if "429" in str(e) or "capacity" in str(e):
-                wait = random.uniform(5, 10) * (attempt + 1)
-                st.warning(f"LLM rate limit hit. Waiting {wait:.1f}s...")
-                time.sleep(wait)
-                continue
-            st.error(f"LLM check error: {e}")
-            return False
-    return False
-
-def infer_brands_from_serp(product, top_k=5):
-    from serpapi_client import serpapi_search, extract_snippets_from_results
-    st.info("🔎 Inferring brands from search results...")
-    try:
-        res = serpapi_search(f"{product} brands reviews", num=20)
-        items = extract_snippets_from_results(res)
-    except Exception as e:
-        st.error(f"Error fetching search results: {e}")
-        return []
-
-    ignore = {"the","best","and","for","of","in","review","reviews","guide","headphones","earbuds"}
-    tokens = {}
-    for it in items:
-        txt = (it.get("title") or "") + " " + (it.get("snippet") or "")
-        for w in txt.split():
-            w = w.strip('.,!?:;()[]{}')
-            if w.istitle() and len(w) > 2 and w.lower() not in ignore:
-                tokens[w] = tokens.get(w, 0) + 1
-
-    candidates = [t for t, _ in sorted(tokens.items(), key=lambda x: x[1], reverse=True)[:15]]
-    st.info(f"Candidates: {candidates}")
-
-    confirmed = []
-    for c in candidates:
-        if is_word_a_brand_llm(c, product):
-            confirmed.append(c)
-            if len(confirmed) >= top_k:
-                break
-    return confirmed
+if st.sidebar.button("Clear HTTP cache"):
+    http_cache.clear_http_cache()
+    st.success("✅ Cached SerpAPI responses and review pages removed!")
 
 # --- Main Action ---
 if st.sidebar.button("Run Analysis"):
@@ -106,50 +87,71 @@ if st.sidebar.button("Run Analysis"):
         st.stop()
 
     st.success(f"✅ Running analysis for brands: {brands}")
-
-    for brand in brands:
-        cached = fetch_reviews(brand, product_name)
-        if not cached.empty:
-            st.info(f"Using {len(cached)} cached reviews for {brand}")
-            continue
-
-        recs = get_reviews_for_brand(product_name, brand, max_snippets=num_snippets)
-        if use_fulltext:
-            from serpapi_client import try_fetch_full_text_from_link
-            for r in recs:
-                if r.get("link"):
-                    full = try_fetch_full_text_from_link(r["link"])
-                    if full:
-                        r["snippet"] = full
-        insert_reviews(recs)
-
-    dfs = [fetch_reviews(b, product_name) for b in brands]
-    df_all = pd.concat(dfs, ignore_index=True)
-    st.dataframe(df_all.drop(columns=["emotion"], errors="ignore"))
-
-    if df_all.empty:
+    st.session_state["last_run"] = (product_name, brands)
+
+    opts = RunOptions(max_snippets=num_snippets, use_fulltext=use_fulltext, batch_size=batch_size,
+                      backend=backend, workers=int(inference_workers), max_chunks=max_chunks, streaming=streaming,
+                      refresh_ttl=refresh_hours * 3600 if refresh_hours else None, bypass_cache=bypass_cache)
+    if opts.streaming:
+        written = st.empty()
+        run_streaming(product_name, brands, opts, on_progress=lambda n: written.text(f"Classified and stored {n} rows"))
+    else:
+        fetch_and_store(product_name, brands, opts)
+
+    # Only a preview is loaded; everything else stays in the DB and is streamed on export
+    total_rows = count_reviews(brands, product_name)
+    # iter_reviews goes brand by brand; limit caps the total, so this fills up across brands
+    chunks = list(iter_reviews(brands, product_name, chunk_size=PREVIEW_ROWS, limit=PREVIEW_ROWS))
+    if chunks:
+        preview = pd.concat(chunks, ignore_index=True)
+        st.dataframe(preview.drop(columns=["emotion"], errors="ignore"))
+        st.caption(f"Showing {len(preview)} of {total_rows} stored reviews")
+
+    if not total_rows:
         st.warning("No data to analyze.")
         st.stop()
 
-    missing = df_all[df_all["emotion"].isnull()]
-    if not missing.empty:
-        updates = detect_and_return(missing)
-        update_emotions_for_rows(updates)
-        st.success("✅ Sentiment predictions updated!")
+    if not opts.streaming:
+        progress = st.progress(0.0, text="Classifying...")
+        classified = classify_pending(
+            product_name, brands, opts,
+            on_progress=lambda done, total: progress.progress(min(done / total, 1.0), text=f"Classified {done}/{total}"),
+        )
+        if classified:
+            st.success("✅ Sentiment predictions updated!")
 
-    df_all = pd.concat([fetch_reviews(b, product_name) for b in brands], ignore_index=True)
     st.subheader("Sentiment Distribution")
-    counts = df_all.groupby(["brand", "emotion"]).size().reset_index(name="count")
+    counts = fetch_emotion_counts(brands, product_name)
 
     chart = alt.Chart(counts).mark_bar().encode(
         x="brand:N", y="count:Q", color="emotion:N", tooltip=["brand", "emotion", "count"]
     )
     st.altair_chart(chart, use_container_width=True)
 
-    st.download_button(
-        "📥 Download CSV",
-        df_all.to_csv(index=False).encode("utf-8"),
-        "analyzed_reviews.csv",
-        "text/csv",
-    )
+    st.subheader("Confidence-weighted brand scores")
+    summary = brand_summary(brands, product_name, neutral_band=neutral_band)
+    if summary.empty:
+        st.caption("No stored class probabilities yet; rows classified from now on will have them.")
+    else:
+        st.dataframe(summary.set_index("brand").round(3))
+
     st.balloons()
+
+# The export is only built when asked for: the download button keeps the whole file in memory
+last_run = st.session_state.get("last_run")
+if last_run and st.sidebar.button(f"Prepare {export_format} export", help=f"Stored reviews of {last_run[1]}"):
+    with st.sidebar:
+        export_csv(brands=last_run[1], product=last_run[0], columns=export_columns or None, fmt=export_format)
+
+# --- Timings for this server process (spans and counters from instrumentation.py) ---
+with st.sidebar.expander("Performance metrics"):
+    snap = instrumentation.snapshot()
+    if snap["spans"]:
+        spans = pd.DataFrame.from_dict(snap["spans"], orient="index").sort_values("total", ascending=False)
+        st.dataframe(spans[["count", "total", "mean", "max", "errors"]].round(4))
+        st.json(snap["counters"])
+    else:
+        st.caption("Nothing recorded yet.")
+    http = http_cache.cache_stats()
+    st.caption(f"HTTP cache: {http['hits']} hits, {http['misses']} misses (hit rate {http['hit_rate']:.0%}), "
+               f"{http['writes']} writes, {http['evicted_files']} files evicted")
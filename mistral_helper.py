@@ -1,37 +1,51 @@
 # mistral_helper.py
 import os
-import time
-import random
-import streamlit as st
-from mistralai import Mistral
+
+import reporting
+from instrumentation import span, timed
+from ratelimit import RetryError, call_with_retry
 
 MISTRAL_KEY = os.environ.get("MISTRAL_API_KEY")
 
-if not MISTRAL_KEY:
-    raise RuntimeError("MISTRAL_API_KEY environment variable not set.")
+_client = None
 
-client = Mistral(api_key=MISTRAL_KEY)
+def _get_client():
+    """The key is checked and the client built on first call, not at import."""
+    global _client
+    if _client is None:
+        key = MISTRAL_KEY or os.environ.get("MISTRAL_API_KEY")
+        if not key:
+            raise RuntimeError("MISTRAL_API_KEY environment variable not set.")
+        from mistralai import Mistral
+        _client = Mistral(api_key=key)
+    return _client
 
+@timed("llm.call_mistral_with_retry")
 def call_mistral_with_retry(prompt: str, retries: int = 5, base_wait: float = 5.0):
     """
-    Calls Mistral API with retry + exponential backoff & jitter.
-    Prevents 429 'capacity exceeded' errors.
+    Calls Mistral API through the shared "mistral" rate limiter, which backs
+    off on 429 'capacity exceeded' errors (honouring Retry-After) for every
+    caller on this host at once.
     """
-    for attempt in range(1, retries + 1):
-        try:
-            response = client.chat.complete(
+    client = _get_client()
+
+    def complete():
+        with span("llm.chat"):
+            return client.chat.complete(
                 model="mistral-small-latest",
                 messages=[{"role": "user", "content": prompt}],
             )
-            return response.choices[0].message.content.strip()
-        except Exception as e:
-            if "429" in str(e) or "capacity" in str(e):
-                wait = base_wait * attempt + random.uniform(0, 3)
-                st.warning(f"⚠️ Mistral rate limit (attempt {attempt}/{retries}). Waiting {wait:.1f}s...")
-                time.sleep(wait)
-                continue
-            else:
-                st.error(f"❌ Mistral API error: {e}")
-                return ""
-    st.error("🚫 Mistral failed after all retries.")
-    return ""
+
+    try:
+        response = call_with_retry(
+            "mistral", complete, retries=retries, base_delay=base_wait,
+            on_retry=lambda attempt, e, wait: reporting.warning(
+                f"⚠️ Mistral rate limit (attempt {attempt}/{retries}). Waiting {wait:.1f}s..."),
+        )
+    except RetryError:
+        reporting.error("🚫 Mistral failed after all retries.")
+        return ""
+    except Exception as e:
+        reporting.error(f"❌ Mistral API error: {e}")
+        return ""
+    return response.choices[0].message.content.strip()
@@ -0,0 +1,93 @@
+# near_dup.py
+import os
+import re
+import unicodedata
+import zlib
+from difflib import SequenceMatcher
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Estimated Jaccard similarity (over character shingles) above which two snippets count as the same review
+NEAR_DUP_THRESHOLD = float(os.environ.get("NEAR_DUP_THRESHOLD", "0.85"))
+# Short snippets ("Good product") are legitimately repeated by different reviewers, so they are never merged
+MIN_DEDUP_CHARS = 40
+
+SHINGLE_SIZE = 5
+NUM_PERM = 64
+BANDS = 16
+ROWS = NUM_PERM // BANDS
+
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240611)
+_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKC", text or "").casefold()
+    return re.sub(r"\W+", " ", text).strip()
+
+
+def signature(text: str) -> Optional[np.ndarray]:
+    """MinHash signature over character shingles (script-agnostic); None for short texts."""
+    norm = _normalize(text)
+    if len(norm) < MIN_DEDUP_CHARS:
+        return None
+    grams = {norm[i:i + SHINGLE_SIZE] for i in range(len(norm) - SHINGLE_SIZE + 1)}
+    x = np.fromiter((zlib.crc32(g.encode("utf-8")) & _PRIME for g in grams), dtype=np.uint64, count=len(grams))
+    hashed = (_A[:, None] * x[None, :] + _B[:, None]) % _PRIME
+    return hashed.min(axis=1).astype(np.uint32)
+
+
+def to_blob(sig: Optional[np.ndarray]) -> Optional[bytes]:
+    return None if sig is None else sig.astype("<u4").tobytes()
+
+
+def from_blob(blob: Optional[bytes]) -> Optional[np.ndarray]:
+    return None if blob is None else np.frombuffer(blob, dtype="<u4")
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """Estimated Jaccard similarity of the two underlying shingle sets."""
+    return float(np.mean(a == b))
+
+
+def same_review(a: str, b: str) -> bool:
+    """
+    Word-level check before linking a MinHash match: the two texts may only
+    differ at their start or end (a truncated mirror, a "Read more" tail), not
+    in the middle. Character shingles alone rate "would recommend" vs
+    "would not recommend" above 0.95, which would merge opposite verdicts.
+    """
+    ta, tb = _normalize(a).split(), _normalize(b).split()
+    for op, i1, i2, j1, j2 in SequenceMatcher(None, ta, tb, autojunk=False).get_opcodes():
+        if op != "equal" and not (i1 == 0 and j1 == 0) and not (i2 == len(ta) and j2 == len(tb)):
+            return False
+    return True
+
+
+def band_keys(sig: np.ndarray) -> List[Tuple[int, bytes]]:
+    """
+    LSH keys for a signature: it is split into BANDS bands and only snippets
+    sharing at least one (band, key) are compared, so lookups stay cheap as
+    the number of stored snippets grows.
+    """
+    return [(band, sig[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+
+def best_match(sig: np.ndarray, text: str, candidates: Iterable[Tuple[int, bytes, str]],
+               threshold: float = NEAR_DUP_THRESHOLD) -> Optional[Tuple[int, float]]:
+    """
+    Best (id, similarity) among (id, signature blob, text) candidates at or
+    above the threshold that also pass same_review(), or None.
+    """
+    best = None
+    for item_id, blob, other in candidates:
+        sim = similarity(sig, from_blob(blob))
+        if sim < threshold or (best is not None and (sim, -item_id) <= (best[1], -best[0])):
+            continue
+        if not same_review(text, other or ""):
+            continue
+        best = (item_id, sim)
+    return best
@@ -0,0 +1,208 @@
+# pipeline.py
+import os
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Set
+
+import reporting
+from analyzer import (detect_and_return, DEFAULT_BATCH_SIZE, DEFAULT_BACKEND, MAX_CHUNKS_PER_TEXT,
+                      INFERENCE_SERVER_URL)
+from db import (DEFAULT_CHUNK_ROWS, insert_reviews, iter_reviews, count_reviews, update_emotions_for_rows,
+                set_job_progress, get_job_progress, get_watermarks, set_watermarks, stored_links)
+
+# Job stages, in order. A (product, brand) pair only ever moves forward.
+STAGES = ("pending", "fetched", "classified")
+
+# A brand's search queries are re-run once their last fetch is older than this
+REFRESH_TTL = float(os.environ.get("REFRESH_TTL_HOURS", "168")) * 3600
+_TS_FORMAT = "%Y-%m-%d %H:%M:%S"
+# Unlabelled rows read per round in classify_pending (worker pools read DEFAULT_CHUNK_ROWS at a time)
+CLASSIFY_CHUNK_ROWS = 5_000
+
+
+@dataclass
+class RunOptions:
+    max_snippets: int = 30
+    use_fulltext: bool = False
+    batch_size: int = DEFAULT_BATCH_SIZE
+    backend: str = DEFAULT_BACKEND
+    workers: int = 1
+    max_chunks: int = MAX_CHUNKS_PER_TEXT
+    # Overlap fetching and inference through streaming.run_streaming (workers is ignored then)
+    streaming: bool = False
+    # Seconds before stored reviews are refreshed with new links; None never re-fetches a brand
+    refresh_ttl: Optional[float] = REFRESH_TTL
+    # Ignore cached SerpAPI responses and review pages for this run (fresh ones are still cached)
+    bypass_cache: bool = False
+
+
+def _age_seconds(ts: str) -> float:
+    try:
+        return time.time() - time.mktime(time.strptime(ts, _TS_FORMAT))
+    except (TypeError, ValueError):
+        return float("inf")  # unparseable watermark: treat as stale
+
+
+def plan_fetch(product: str, brands: List[str], opts: RunOptions) -> Dict[str, List[str]]:
+    """
+    {brand: search queries to run}. Brands never fetched get all their queries;
+    fetched brands only get the queries whose watermark is older than
+    opts.refresh_ttl. Brands with nothing to do are left out.
+    """
+    from serpapi_client import brand_queries
+
+    plan = {}
+    for brand in brands:
+        queries = brand_queries(product, brand)
+        marks = get_watermarks(brand, product, queries)
+        stale = [q for q in queries if marks[q] is None
+                 or (opts.refresh_ttl is not None and _age_seconds(marks[q]) > opts.refresh_ttl)]
+        if stale:
+            plan[brand] = stale
+    return plan
+
+
+def search_new(product: str, plan: Dict[str, List[str]], opts: RunOptions):
+    """
+    Run the planned searches, keeping only links that are not stored yet.
+    Returns ({brand: records}, {brand: queries that succeeded}, fetch time);
+    record the latter with set_watermarks once the records are stored.
+    """
+    from serpapi_client import get_reviews_for_brands
+
+    fetched_at = time.strftime(_TS_FORMAT)
+    searched = {}
+    records = get_reviews_for_brands(product, list(plan), max_snippets=opts.max_snippets, queries=plan,
+                                     known_links={b: stored_links(b, product) for b in plan},
+                                     max_age=opts.refresh_ttl, searched=searched, bypass_cache=opts.bypass_cache)
+    done = {b: [q for q in qs if searched.get((b, q))] for b, qs in plan.items()}
+    return records, done, fetched_at
+
+
+def fetch_and_store(product: str, brands: List[str], opts: RunOptions,
+                    incomplete: Optional[Set[str]] = None) -> Dict[str, int]:
+    """
+    Fetch (and optionally enrich with full review pages) every brand that has
+    no stored reviews yet or whose last fetch is older than opts.refresh_ttl,
+    then insert only the links not stored before. Returns {brand: rows inserted}.
+    incomplete, if given, receives the brands with a failed search; only their
+    successful queries get a new watermark, so the next run retries the rest.
+    """
+    from serpapi_client import fetch_full_texts
+
+    plan = plan_fetch(product, brands, opts)
+    for brand in brands:
+        if brand not in plan:
+            reporting.info(f"Stored reviews for {brand} are fresh, not re-fetching")
+    if not plan:
+        return {}
+
+    fetched, done, fetched_at = search_new(product, plan, opts)
+    if opts.use_fulltext:
+        links = [r["link"] for recs in fetched.values() for r in recs if r.get("link")]
+        full_texts = fetch_full_texts(links, bypass_cache=opts.bypass_cache)
+        for recs in fetched.values():
+            for r in recs:
+                if full_texts.get(r.get("link")):
+                    r["snippet"] = full_texts[r["link"]]
+
+    inserted = {}
+    for brand in plan:
+        inserted[brand] = len(insert_reviews(fetched[brand]))
+        set_watermarks(brand, product, done[brand], fetched_at)
+        if incomplete is not None and len(done[brand]) < len(plan[brand]):
+            incomplete.add(brand)
+    return inserted
+
+
+def classify_pending(product: str, brands: List[str], opts: RunOptions,
+                     on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """
+    Classify every stored row of these brands that has no emotion yet and
+    write the labels back, reading the backlog in chunks so memory does not
+    grow with it. on_progress(done, total) is called after each write.
+    Returns the number of rows classified.
+    """
+    total = count_reviews(brands, product, unclassified_only=True)
+    if not total:
+        return 0
+
+    parallel = opts.workers > 1 and not INFERENCE_SERVER_URL
+    chunks = iter_reviews(brands, product, columns=["id", "snippet"],
+                          chunk_size=DEFAULT_CHUNK_ROWS if parallel else CLASSIFY_CHUNK_ROWS, unclassified_only=True)
+    if parallel:
+        from inference_pool import iter_detect_parallel
+        # One worker pool for the whole backlog; chunks are read as it gets through them
+        batches = iter_detect_parallel(chunks, opts.workers, batch_size=opts.batch_size, backend=opts.backend,
+                                       long_text=opts.use_fulltext, max_chunks=opts.max_chunks, total=total)
+    else:
+        batches = (detect_and_return(missing, batch_size=opts.batch_size, backend=opts.backend,
+                                     long_text=opts.use_fulltext, max_chunks=opts.max_chunks) for missing in chunks)
+    written = 0
+    for updates in batches:
+        update_emotions_for_rows(updates)
+        written += len(updates)
+        if on_progress:
+            on_progress(written, total)
+    return written
+
+
+def _warn_incomplete(product: str, brands):
+    if brands:
+        reporting.warning(f"⚠️ {product}: searches failed for {', '.join(sorted(brands))}; "
+                          f"they stay pending and are retried when the job is resumed")
+
+
+def run_product(product: str, brands: List[str], opts: RunOptions, job_id: Optional[str] = None) -> List[str]:
+    """
+    Full fetch -> enrich -> classify -> store run for one product.
+    With a job_id, each brand's stage is recorded in job_progress so an
+    interrupted job picks up where it stopped. Brands whose searches failed
+    (serpapi_search returns no results instead of raising) are classified
+    but stay pending, so resuming the job searches them again.
+    Returns the brands processed.
+    """
+    if not brands:
+        from brand_inference import infer_brands_from_serp
+        brands = infer_brands_from_serp(product)
+        if not brands:
+            reporting.warning(f"No brands detected for {product}.")
+            return []
+
+    done = get_job_progress(job_id) if job_id else {}
+
+    def stage_of(brand):
+        return STAGES.index(done.get((product, brand), "pending"))
+
+    def mark(brands_, stage, detail=None):
+        if job_id:
+            for b in brands_:
+                set_job_progress(job_id, product, b, stage, detail)
+
+    if opts.streaming:
+        todo = [b for b in brands if stage_of(b) < STAGES.index("classified")]
+        if todo:
+            from streaming import run_streaming
+            stats = run_streaming(product, todo, opts)
+            mark([b for b in todo if b not in stats["incomplete"]], "classified",
+                 f"{stats['written']} rows classified (streaming)")
+            _warn_incomplete(product, stats["incomplete"])
+        return brands
+
+    incomplete = set()
+    to_fetch = [b for b in brands if stage_of(b) < STAGES.index("fetched")]
+    if to_fetch:
+        inserted = fetch_and_store(product, to_fetch, opts, incomplete=incomplete)
+        for b in to_fetch:
+            if b not in incomplete:
+                mark([b], "fetched", f"{inserted.get(b, 0)} new rows")
+        _warn_incomplete(product, incomplete)
+
+    to_classify = [b for b in brands if stage_of(b) < STAGES.index("classified")]
+    if to_classify:
+        n = classify_pending(product, to_classify, opts)
+        mark([b for b in to_classify if b not in incomplete], "classified", f"{n} rows classified")
+        reporting.success(f"✅ {product}: classified {n} rows for {len(to_classify)} brands")
+    else:
+        reporting.info(f"{product}: already complete for this job, skipping")
+    return brands
@@ -0,0 +1,364 @@
+# ratelimit.py
+"""
+Shared rate limiting and retries for every external call.
+
+Each provider ("serpapi", "mistral", "model") gets one ProviderLimiter per
+process: an adaptive token bucket that halves its rate on a 429 and creeps
+back up on success, honours Retry-After, and (where fcntl is available) a
+host-wide quota file so every process on the machine shares one budget and
+backs off together. call_with_retry() is the single retry loop built on it.
+"""
+import email.utils
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Callable, Optional
+
+from instrumentation import count, observe
+
+try:
+    import fcntl
+except ImportError:  # not on Windows: the quota is then per process only
+    fcntl = None
+
+QUOTA_DIR = os.environ.get("RATE_LIMIT_DIR", os.path.join(tempfile.gettempdir(), "review_comparator_quota"))
+
+
+def _env_rate(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return float(value) or None  # 0 disables the limit
+
+
+# rate/capacity: per-process bucket; host_rate: budget shared by all processes on this host (None = no limit)
+PROVIDERS = {
+    "serpapi": {
+        "rate": _env_rate("SERPAPI_RATE_PER_SEC", 1.0),
+        "capacity": int(os.environ.get("SERPAPI_MAX_CONCURRENCY", "4")),
+        "host_rate": _env_rate("SERPAPI_HOST_RATE_PER_SEC", _env_rate("SERPAPI_RATE_PER_SEC", 1.0)),
+    },
+    "mistral": {
+        "rate": _env_rate("MISTRAL_RATE_PER_SEC", 1.0),
+        "capacity": 2,
+        "host_rate": _env_rate("MISTRAL_HOST_RATE_PER_SEC", _env_rate("MISTRAL_RATE_PER_SEC", 1.0)),
+    },
+    # Local model or inference server: no quota, only backoff when it reports it is overloaded
+    "model": {"rate": None, "capacity": 1, "host_rate": None},
+}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens are added per second, up to
+    `capacity`. acquire() blocks until enough tokens are available, so any
+    number of threads sharing one bucket stay under the same request rate.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _take(self, tokens: float) -> float:
+        """Take tokens if available (0.0), else return how long until they would be. Caller holds the lock."""
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return 0.0
+        return (tokens - self._tokens) / self.rate
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        """Non-blocking: 0.0 if the tokens were taken, else the seconds to wait before trying again."""
+        with self._lock:
+            return self._take(tokens)
+
+    def refund(self, tokens: float = 1.0):
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Take `tokens`, sleeping as needed. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire(tokens)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+
+class AdaptiveBucket(TokenBucket):
+    """
+    Token bucket that adapts to the provider (AIMD): every throttle halves the
+    rate (down to min_rate) and pauses all callers, every success adds a little
+    back (up to the configured rate).
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: Optional[float] = None,
+                 decrease: float = 0.5, recover_after: int = 20):
+        super().__init__(rate, capacity)
+        self.max_rate = float(rate)
+        self.min_rate = min_rate or self.max_rate / 16
+        self.decrease = decrease
+        self.increase = self.max_rate / recover_after  # successes to climb back from zero
+        self._paused_until = 0.0
+
+    def _take(self, tokens: float) -> float:
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            return pause
+        return super()._take(tokens)
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttle(self, pause: float):
+        with self._lock:
+            self._refill()
+            self.rate = max(self.min_rate, self.rate * self.decrease)
+            self._tokens = 0.0
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+
+
+class HostQuota:
+    """
+    Token bucket whose state lives in a small JSON file under QUOTA_DIR,
+    updated under an exclusive flock, so all processes on the host draw from
+    one budget and see each other's throttle pauses. Without fcntl it never
+    blocks (the per-process bucket still applies).
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float = 1.0, directory: str = QUOTA_DIR):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.path = os.path.join(directory, f"{name}.json")
+        if fcntl is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def _update(self, fn) -> float:
+        if fcntl is None:
+            return 0.0
+        with open(self.path, "a+", encoding="utf-8") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                try:
+                    state = json.loads(f.read() or "{}")
+                except ValueError:
+                    state = {}
+                now = time.time()
+                elapsed = max(0.0, now - state.get("updated", now))
+                state["tokens"] = min(self.capacity, state.get("tokens", self.capacity) + elapsed * self.rate)
+                state["updated"] = now
+                result = fn(state, now)
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def try_acquire(self, tokens: float = 1.0) -> float:
+        def take(state, now):
+            pause = state.get("paused_until", 0.0) - now
+            if pause > 0:
+                return pause
+            if state["tokens"] >= tokens:
+                state["tokens"] -= tokens
+                return 0.0
+            return (tokens - state["tokens"]) / self.rate
+        return self._update(take)
+
+    def pause(self, seconds: float):
+        def set_pause(state, now):
+            state["paused_until"] = max(state.get("paused_until", 0.0), now + seconds)
+            state["tokens"] = 0.0
+            return 0.0
+        self._update(set_pause)
+
+
+class ProviderLimiter:
+    """The process-local adaptive bucket plus the host quota for one provider."""
+
+    def __init__(self, name: str, rate: Optional[float], capacity: float = 1.0, host_rate: Optional[float] = None):
+        self.name = name
+        self.bucket = AdaptiveBucket(rate, capacity) if rate else None
+        self.host = HostQuota(name, host_rate, capacity) if host_rate else None
+        self._paused_until = 0.0  # used when there is no bucket
+        self.throttles = 0
+
+    def try_acquire(self) -> float:
+        """Non-blocking: 0.0 when a call may go ahead now, else the seconds to wait before asking again."""
+        if self.bucket is None:
+            wait = self._paused_until - time.monotonic()
+            if wait > 0:
+                return wait
+        else:
+            wait = self.bucket.try_acquire()
+            if wait:
+                return wait
+        if self.host is not None:
+            wait = self.host.try_acquire()
+            if wait:
+                if self.bucket is not None:
+                    self.bucket.refund()
+                return wait
+        return 0.0
+
+    def acquire(self) -> float:
+        """Block until a call may go ahead. Returns the time spent waiting."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def acquire_async(self) -> float:
+        """Like acquire(), but yields to the event loop while waiting."""
+        waited = 0.0
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+    def on_success(self):
+        if self.bucket is not None:
+            self.bucket.on_success()
+
+    def on_throttle(self, pause: float):
+        """Slow down and make every caller (in this process and, via the quota file, on this host) wait `pause`."""
+        self.throttles += 1
+        if self.bucket is not None:
+            self.bucket.on_throttle(pause)
+        else:
+            self._paused_until = max(self._paused_until, time.monotonic() + pause)
+        if self.host is not None:
+            self.host.pause(pause)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(provider)
+        if limiter is None:
+            limiter = _limiters[provider] = ProviderLimiter(provider, **PROVIDERS.get(provider, {"rate": None}))
+        return limiter
+
+
+def configure(provider: str, **settings) -> ProviderLimiter:
+    """Override a provider's rate/capacity/host_rate and replace its limiter (e.g. in benchmarks)."""
+    with _limiters_lock:
+        PROVIDERS[provider] = {**PROVIDERS.get(provider, {"rate": None}), **settings}
+        limiter = _limiters[provider] = ProviderLimiter(provider, **PROVIDERS[provider])
+        return limiter
+
+
+class RetryError(RuntimeError):
+    """Raised by call_with_retry once every attempt failed; the last error is kept as __cause__."""
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    for obj in (exc, getattr(exc, "response", None), getattr(exc, "raw_response", None)):
+        code = getattr(obj, "status_code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_throttle(exc: Exception) -> bool:
+    """True for 429 / capacity / rate-limit errors, whichever SDK raised them."""
+    if _status_code(exc) in (429, 503):
+        return True
+    msg = str(exc).lower()
+    return "429" in msg or "capacity" in msg or "rate limit" in msg or "too many requests" in msg
+
+
+def retry_after(exc: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header on the error's response, if there is one."""
+    for obj in (getattr(exc, "response", None), getattr(exc, "raw_response", None)):
+        headers = getattr(obj, "headers", None)
+        value = headers.get("Retry-After") if headers is not None else None
+        if not value:
+            continue
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            when = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None  # malformed header: fall back to the normal backoff
+        return max(0.0, when.timestamp() - time.time())
+    return None
+
+
+def backoff(attempt: int, base_delay: float, max_delay: float = 60.0) -> float:
+    """Exponential backoff with jitter for the given (1-based) attempt."""
+    return min(max_delay, base_delay * 2 ** (attempt - 1)) * random.uniform(0.5, 1.0)
+
+
+def _handle_failure(limiter: ProviderLimiter, exc: Exception, attempt: int, retry_errors: bool,
+                    base_delay: float, max_delay: float):
+    """Returns (delay, throttled) for a retryable failure; re-raises anything else."""
+    if is_throttle(exc):
+        delay = retry_after(exc)
+        delay = backoff(attempt, base_delay, max_delay) if delay is None else min(delay, max_delay)
+        limiter.on_throttle(delay)
+        count(f"ratelimit.{limiter.name}.throttled")
+        return delay, True
+    if retry_errors:
+        count(f"ratelimit.{limiter.name}.errors")
+        return backoff(attempt, base_delay, max_delay), False
+    raise exc
+
+
+def call_with_retry(provider: str, fn: Callable, *args, retries: int = 3, retry_errors: bool = False,
+                    base_delay: float = 2.0, max_delay: float = 60.0,
+                    on_retry: Optional[Callable[[int, Exception, float], None]] = None, **kwargs):
+    """
+    Call fn(*args, **kwargs) under the provider's limiter. Throttling errors
+    slow the provider down and are retried after Retry-After (or exponential
+    backoff); other errors are retried too only with retry_errors=True,
+    otherwise they propagate. on_retry(attempt, error, delay) is called
+    before each retry. Raises RetryError after `retries` failed attempts.
+    """
+    limiter = get_limiter(provider)
+    last_exc = None
+    for attempt in range(1, retries + 1):
+        observe(f"ratelimit.{provider}.wait", limiter.acquire())
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            last_exc = e
+            delay, throttled = _handle_failure(limiter, e, attempt, retry_errors, base_delay, max_delay)
+            if attempt == retries:
+                break
+            count(f"ratelimit.{provider}.retries")
+            if on_retry:
+                on_retry(attempt, e, delay)
+            if not throttled:
+                time.sleep(delay)  # throttles wait in the next acquire(), shared with everyone else
+            continue
+        limiter.on_success()
+        return result
+    raise RetryError(f"{provider}: giving up after {retries} attempts: {last_exc}") from last_exc
@@ -0,0 +1,82 @@
+# reporting.py
+import logging
+
+logger = logging.getLogger("review_comparator")
+
+
+class LogReporter:
+    """Sends progress messages to the standard logging module (headless runs)."""
+
+    def __init__(self, log: logging.Logger = logger):
+        self.log = log
+
+    def info(self, msg: str):
+        self.log.info(msg)
+
+    def success(self, msg: str):
+        self.log.info(msg)
+
+    def warning(self, msg: str):
+        self.log.warning(msg)
+
+    def error(self, msg: str):
+        self.log.error(msg)
+
+
+class StreamlitReporter:
+    """Shows progress messages on the current Streamlit page."""
+
+    def info(self, msg: str):
+        import streamlit as st
+        st.info(msg)
+
+    def success(self, msg: str):
+        import streamlit as st
+        st.success(msg)
+
+    def warning(self, msg: str):
+        import streamlit as st
+        st.warning(msg)
+
+    def error(self, msg: str):
+        import streamlit as st
+        st.error(msg)
+
+
+_reporter = None
+
+
+def set_reporter(reporter):
+    """Install a reporter (anything with info/success/warning/error). None restores auto-detection."""
+    global _reporter
+    _reporter = reporter
+
+
+def _in_streamlit() -> bool:
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return False
+    return get_script_run_ctx() is not None
+
+
+def get_reporter():
+    if _reporter is not None:
+        return _reporter
+    return StreamlitReporter() if _in_streamlit() else LogReporter()
+
+
+def info(msg: str):
+    get_reporter().info(msg)
+
+
+def success(msg: str):
+    get_reporter().success(msg)
+
+
+def warning(msg: str):
+    get_reporter().warning(msg)
+
+
+def error(msg: str):
+    get_reporter().error(msg)
@@ -0,0 +1,164 @@
+# rescoring.py
+"""
+Re-derive labels and brand scores from the class probabilities stored with
+every classified review (reviews.scores), without running the model again.
+
+Scores are packed as float16 in LABELS order (6 bytes per review). Changing a
+decision rule is array math over those vectors:
+
+    python rescoring.py headphones Sony Boat --neutral-band 0.2          # per-brand summary
+    python rescoring.py headphones Sony Boat --min-confidence 0.6 --write  # relabel stored rows
+"""
+import argparse
+import sys
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import count, timed
+
+# The model's classes, in the order they are packed. Changing this order invalidates stored blobs.
+LABELS = ("negative", "neutral", "positive")
+_DTYPE = np.dtype("<f2")
+_EMPTY = np.full(len(LABELS), np.nan, dtype=_DTYPE).tobytes()
+
+
+def pack_scores(scores: Optional[dict]) -> Optional[bytes]:
+    """{label: probability} -> float16 blob in LABELS order (None if there is nothing to store)."""
+    if not scores or not any(label in scores for label in LABELS):
+        return None
+    return np.array([scores.get(label, np.nan) for label in LABELS], dtype=_DTYPE).tobytes()
+
+
+def unpack_scores(blobs: Iterable[Optional[bytes]]) -> np.ndarray:
+    """Blobs -> float32 array of shape (n, len(LABELS)); rows without scores are all NaN."""
+    data = b"".join(b if isinstance(b, (bytes, bytearray, memoryview)) and len(b) == len(_EMPTY) else _EMPTY
+                    for b in blobs)
+    return np.frombuffer(data, dtype=_DTYPE).reshape(-1, len(LABELS)).astype(np.float32)
+
+
+def relabel(probs: np.ndarray, min_confidence: float = 0.0, neutral_band: float = 0.0) -> np.ndarray:
+    """
+    Labels for an (n, len(LABELS)) probability array: the most likely class,
+    except that rows whose top probability is below min_confidence, or whose
+    positive and negative probabilities are within neutral_band of each other,
+    become "neutral". Rows without scores are "unknown".
+    """
+    valid = ~np.isnan(probs).all(axis=1)
+    filled = np.nan_to_num(probs, nan=0.0)
+    labels = np.asarray(LABELS, dtype=object)[filled.argmax(axis=1)]
+    neutral = filled.max(axis=1) < min_confidence
+    if neutral_band:
+        neg, pos = LABELS.index("negative"), LABELS.index("positive")
+        neutral |= np.abs(filled[:, pos] - filled[:, neg]) < neutral_band
+    labels[neutral] = "neutral"
+    labels[~valid] = "unknown"
+    return labels
+
+
+def polarity(probs: np.ndarray) -> np.ndarray:
+    """P(positive) - P(negative), in [-1, 1]; NaN where there are no scores."""
+    return probs[:, LABELS.index("positive")] - probs[:, LABELS.index("negative")]
+
+
+def _partial_sums(brands: np.ndarray, probs: np.ndarray, min_confidence: float, neutral_band: float) -> pd.DataFrame:
+    """Additive per-brand sums for one chunk, so chunks can be combined before the means are taken."""
+    valid = ~np.isnan(probs).all(axis=1)
+    brands, probs = brands[valid], np.nan_to_num(probs[valid], nan=0.0)
+    confidence = probs.max(axis=1)
+    frame = pd.DataFrame({"brand": brands, "reviews": 1, "confidence": confidence,
+                          "weighted_polarity": confidence * polarity(probs)})
+    for i, label in enumerate(LABELS):
+        frame[f"p_{label}"] = probs[:, i]
+    labels = relabel(probs, min_confidence, neutral_band)
+    for label in LABELS:
+        frame[f"n_{label}"] = labels == label
+    return frame.groupby("brand").sum()
+
+
+def _finish(sums: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame(index=sums.index)
+    out["reviews"] = sums["reviews"].astype(int)
+    for label in LABELS:
+        out[f"n_{label}"] = sums[f"n_{label}"].astype(int)
+    for label in LABELS:
+        out[f"mean_{label}"] = sums[f"p_{label}"] / sums["reviews"]
+    out["mean_confidence"] = sums["confidence"] / sums["reviews"]
+    # Confidence-weighted polarity: sure verdicts count more than near coin-flips
+    out["weighted_score"] = sums["weighted_polarity"] / sums["confidence"].where(sums["confidence"] > 0)
+    return out.reset_index()
+
+
+def aggregate(brands: Iterable[str], probs: np.ndarray, min_confidence: float = 0.0,
+              neutral_band: float = 0.0) -> pd.DataFrame:
+    """
+    Per-brand summary of in-memory scores: label counts under the given rule,
+    mean class probabilities, mean confidence and the confidence-weighted
+    polarity score. Rows without scores are left out.
+    """
+    return _finish(_partial_sums(np.asarray(list(brands), dtype=object), probs, min_confidence, neutral_band))
+
+
+@timed("rescoring.brand_summary")
+def brand_summary(brands: List[str], product: str, min_confidence: float = 0.0, neutral_band: float = 0.0,
+                  chunk_size: Optional[int] = None) -> pd.DataFrame:
+    """
+    aggregate() over the stored scores of these brands, read from the DB chunk
+    by chunk. Near-duplicates are left out, as in fetch_emotion_counts.
+    """
+    from db import DEFAULT_CHUNK_ROWS, iter_reviews
+    parts = []
+    for chunk in iter_reviews(brands, product, columns=["brand", "scores", "duplicate_of"],
+                              chunk_size=chunk_size or DEFAULT_CHUNK_ROWS):
+        chunk = chunk[chunk["duplicate_of"].isna()]
+        parts.append(_partial_sums(chunk["brand"].to_numpy(dtype=object), unpack_scores(chunk["scores"]),
+                                   min_confidence, neutral_band))
+    if not parts:
+        return aggregate([], np.empty((0, len(LABELS)), np.float32))
+    return _finish(pd.concat(parts).groupby(level=0).sum())
+
+
+@timed("rescoring.relabel_stored")
+def relabel_stored(brands: List[str], product: str, min_confidence: float = 0.0, neutral_band: float = 0.0,
+                   chunk_size: Optional[int] = None) -> int:
+    """
+    Rewrite the emotion of stored rows from their scores under a new rule.
+    Rows without scores keep their label. Returns the number of rows changed.
+    """
+    from db import DEFAULT_CHUNK_ROWS, iter_reviews, update_emotions_for_rows
+    changed = 0
+    for chunk in iter_reviews(brands, product, columns=["id", "emotion", "scores", "duplicate_of"],
+                              chunk_size=chunk_size or DEFAULT_CHUNK_ROWS):
+        # Duplicates follow their canonical row when it is updated
+        chunk = chunk[chunk["duplicate_of"].isna() & chunk["scores"].notna()]
+        labels = relabel(unpack_scores(chunk["scores"]), min_confidence, neutral_band)
+        moved = labels != chunk["emotion"].to_numpy(dtype=object)
+        diff = pd.DataFrame({"id": chunk["id"].to_numpy()[moved], "emotion": labels[moved]})
+        update_emotions_for_rows(diff)
+        changed += len(diff)
+    count("rescoring.rows_relabelled", changed)
+    return changed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recompute labels and brand scores from stored probabilities")
+    parser.add_argument("product")
+    parser.add_argument("brands", nargs="+")
+    parser.add_argument("--min-confidence", type=float, default=0.0,
+                        help="top probability below this is labelled neutral")
+    parser.add_argument("--neutral-band", type=float, default=0.0,
+                        help="|P(positive) - P(negative)| below this is labelled neutral")
+    parser.add_argument("--write", action="store_true", help="store the recomputed labels")
+    args = parser.parse_args(argv)
+
+    if args.write:
+        n = relabel_stored(args.brands, args.product, args.min_confidence, args.neutral_band)
+        print(f"relabelled {n} rows")
+    summary = brand_summary(args.brands, args.product, args.min_confidence, args.neutral_band)
+    print(summary.round(3).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
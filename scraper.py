@@ -1,9 +1,25 @@
-import requests
-from bs4 import BeautifulSoup
+# scraper.py
+import os
+import threading
+import time
+from concurrent.futures import wait, FIRST_COMPLETED
+from typing import Dict, List, Optional
+from urllib.parse import urlsplit
+
 import pandas as pd
-import random, time
-import streamlit as st
-from db import fetch_reviews, insert_reviews
+
+import ratelimit
+import reporting
+from concurrency import session_thread_pool
+from db import REVIEW_COLUMNS, fetch_reviews, insert_reviews
+from html_utils import has_class
+from http_pool import PER_HOST_LIMIT, get_capped
+from instrumentation import count, span, timed
+
+try:
+    import lxml.html
+except ImportError:  # fall back to BeautifulSoup's pure-Python parser
+    lxml = None
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -12,63 +28,203 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.9"
 }
 
+PREFETCH_PAGES = 3        # review pages of one source requested ahead of the one being parsed
+SOURCE_WORKERS = 4        # sources scraped at the same time
+PAGE_WORKERS = 16         # page downloads in flight across all sources (per host: http_pool.PER_HOST_LIMIT)
+# Politeness: sustained requests per second to any one site (adapts down on 429/503)
+SCRAPE_RATE_PER_HOST = float(os.environ.get("SCRAPE_RATE_PER_HOST", "1.0"))
+MAX_PAGES = 50
+
+# page URL, review block, text inside a block, optional title inside a block
+SITES = {
+    "amazon": {
+        "page_url": lambda url, n: f"{url}{'&' if '?' in url else '?'}pageNumber={n}",
+        "block": f"//div[{has_class('review')}]",
+        "text": f".//span[{has_class('review-text-content')}]",
+        "title": f".//*[{has_class('review-title')}]",
+        "css": ("div.review", "span.review-text-content", ".review-title"),
+    },
+    "flipkart": {
+        "page_url": lambda url, n: f"{url}{'&' if '?' in url else '?'}page={n}",
+        "block": f"//div[{has_class('_27M-vq')}]",
+        "text": f".//div[{has_class('t-ZTKy')}]/div",
+        "title": f".//p[{has_class('_2-N8zT')}]",
+        "css": ("div._27M-vq", "div.t-ZTKy > div", "p._2-N8zT"),
+    },
+}
+
+_host_lock = threading.Lock()
+
+
+class _HTTPStatus(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+def _host_provider(url: str) -> str:
+    """One adaptive rate limiter per site, registered on first use."""
+    name = "scrape:" + urlsplit(url).netloc.lower()
+    with _host_lock:
+        if name not in ratelimit.PROVIDERS:
+            ratelimit.configure(name, rate=SCRAPE_RATE_PER_HOST, capacity=PER_HOST_LIMIT, host_rate=None)
+    return name
+
+
+def _fetch_page(url: str) -> Optional[str]:
+    """GET one review page politely (pooled session, per-host slots and rate). None if it failed."""
+    def get():
+        status, html = get_capped(url, headers=HEADERS, timeout=10)
+        if status in (429, 503):
+            raise _HTTPStatus(status)
+        return html if status == 200 else None
+
+    try:
+        with span("scrape.download"):
+            return ratelimit.call_with_retry(_host_provider(url), get, retries=3)
+    except Exception as e:
+        reporting.warning(f"Giving up on {url}: {e}")
+        return None
+
+
+def _parse_lxml(html: str, site: dict) -> List[dict]:
+    out = []
+    for i, block in enumerate(lxml.html.fromstring(html).xpath(site["block"])):
+        text = " ".join("".join(t.strip() for t in el.itertext()) for el in block.xpath(site["text"])).strip()
+        if not text:
+            continue
+        title = " ".join(el.text_content().strip() for el in block.xpath(site["title"])).strip()
+        out.append({"key": block.get("id") or str(i), "title": title, "snippet": text})
+    return out
+
+
+def _parse_bs4(html: str, site: dict) -> List[dict]:
+    from bs4 import BeautifulSoup
+    block_css, text_css, title_css = site["css"]
+    out = []
+    for i, block in enumerate(BeautifulSoup(html, "html.parser").select(block_css)):
+        txt = block.select_one(text_css)
+        if not txt or not txt.get_text(strip=True):
+            continue
+        title = block.select_one(title_css)
+        out.append({"key": block.get("id") or str(i), "title": title.get_text(strip=True) if title else "",
+                    "snippet": txt.get_text(strip=True)})
+    return out
+
+
+def parse_review_page(html: str, platform: str) -> List[dict]:
+    """Reviews on one page: [{key, title, snippet}], key being the review's id on the page."""
+    site = SITES[platform]
+    with span("scrape.parse"):
+        return _parse_lxml(html, site) if lxml is not None else _parse_bs4(html, site)
+
+
+@timed("scrape.source")
+def scrape_source(platform: str, url: str, brand: str, product: str, max_reviews: int = 30,
+                  pool=None, prefetch: int = PREFETCH_PAGES) -> List[dict]:
+    """
+    Reviews of one product page, as rows in the reviews-table schema.
+    Up to `prefetch` pages are downloaded ahead of the one being parsed;
+    pages are consumed in order and everything still pending is cancelled
+    as soon as max_reviews is reached or a page comes back empty.
+    """
+    platform = platform.lower()
+    if platform not in SITES:
+        raise ValueError(f"Unsupported platform: {platform}")
+    site = SITES[platform]
+    reporting.info(f"🔎 Scraping {platform.title()} reviews for {brand} {product}...")
+
+    own_pool = pool is None
+    if own_pool:
+        pool = session_thread_pool(max(1, prefetch), name=f"scrape-{platform}")
+    fetched_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    rows, seen = [], set()
+    pending = {}
+    next_page = 1
+
+    def submit_until(limit):
+        nonlocal next_page
+        while next_page <= min(limit, MAX_PAGES):
+            page_url = site["page_url"](url, next_page)
+            pending[next_page] = (page_url, pool.submit(_fetch_page, page_url))
+            next_page += 1
+
+    try:
+        submit_until(prefetch)
+        page = 1
+        while page in pending and len(rows) < max_reviews:
+            page_url, fut = pending.pop(page)
+            html = fut.result()
+            reviews = parse_review_page(html, platform) if html else []
+            if not reviews:
+                break  # past the last page (or blocked): later pages won't have more
+            for r in reviews:
+                link = f"{page_url}#{r['key']}"
+                if link in seen:
+                    continue
+                seen.add(link)
+                rows.append({"brand": brand, "product": product, "source": platform, "title": r["title"],
+                             "snippet": r["snippet"], "link": link, "emotion": None, "fetched_at": fetched_at})
+            page += 1
+            submit_until(page + prefetch - 1)
+    finally:
+        for _, fut in pending.values():
+            fut.cancel()
+        if own_pool:
+            pool.shutdown(wait=False, cancel_futures=True)
+    count("scrape.reviews", min(len(rows), max_reviews))
+    return rows[:max_reviews]
+
+
 def fetch_amazon_reviews(url, brand, product, max_reviews=30):
-    st.info(f"🔎 Scraping Amazon reviews for {brand} {product}...")
-    reviews = []
-    page = 1
-    while len(reviews) < max_reviews:
-        r = requests.get(f"{url}?pageNumber={page}", headers=HEADERS)
-        if r.status_code != 200:
-            break
-        soup = BeautifulSoup(r.text, "html.parser")
-        blocks = soup.select("div.review")
-        if not blocks: break
-        for b in blocks:
-            txt = b.select_one("span.review-text-content")
-            if txt: reviews.append(txt.get_text(strip=True))
-        page += 1
-        time.sleep(random.uniform(1,2))
-    return pd.DataFrame({"platform":["amazon"]*len(reviews),"brand":[brand]*len(reviews),
-                         "product":[product]*len(reviews),"review":reviews})
+    return pd.DataFrame(scrape_source("amazon", url, brand, product, max_reviews), columns=REVIEW_COLUMNS)
+
 
 def fetch_flipkart_reviews(url, brand, product, max_reviews=30):
-    st.info(f"🔎 Scraping Flipkart reviews for {brand} {product}...")
-    reviews = []
-    page = 1
-    while len(reviews) < max_reviews:
-        r = requests.get(f"{url}&page={page}", headers=HEADERS)
-        if r.status_code != 200:
-            break
-        soup = BeautifulSoup(r.text, "html.parser")
-        blocks = soup.select("div._27M-vq")
-        if not blocks: break
-        for b in blocks:
-            txt = b.select_one("div.t-ZTKy > div")
-            if txt: reviews.append(txt.get_text(strip=True))
-        page += 1
-        time.sleep(random.uniform(1,2))
-    return pd.DataFrame({"platform":["flipkart"]*len(reviews),"brand":[brand]*len(reviews),
-                         "product":[product]*len(reviews),"review":reviews})
-
-def scrape_reviews(sources, max_reviews=30):
-    all_data = []
+    return pd.DataFrame(scrape_source("flipkart", url, brand, product, max_reviews), columns=REVIEW_COLUMNS)
+
+
+def scrape_reviews(sources: List[Dict], max_reviews: int = 30, workers: int = SOURCE_WORKERS,
+                   prefetch: int = PREFETCH_PAGES) -> pd.DataFrame:
+    """
+    sources: [{"platform", "url", "brand", "product"}]. Sources already stored
+    for that brand, product and platform are loaded from the DB; the rest are
+    scraped `workers` at a time, sharing one pool of page downloads (per-host
+    politeness limits apply across all of them), and stored as they finish.
+    Returns every row, with ids, in the reviews-table schema.
+    """
+    all_data, to_scrape = [], []
     for s in sources:
-        # First check DB cache
+        if s["platform"].lower() not in SITES:
+            raise ValueError(f"Unsupported platform: {s['platform']}")
         cached = fetch_reviews(s["brand"], s["product"])
+        cached = cached.loc[cached["source"] == s["platform"].lower(), ["id", *REVIEW_COLUMNS]]
         if not cached.empty:
-            st.success(f"✅ Loaded cached reviews for {s['brand']} {s['product']}")
+            reporting.success(f"✅ Loaded cached reviews for {s['brand']} {s['product']}")
             all_data.append(cached)
-            continue
-
-        if s["platform"].lower()=="amazon":
-            df = fetch_amazon_reviews(s["url"], s["brand"], s["product"], max_reviews)
-        elif s["platform"].lower()=="flipkart":
-            df = fetch_flipkart_reviews(s["url"], s["brand"], s["product"], max_reviews)
         else:
-            raise ValueError(f"Unsupported platform: {s['platform']}")
+            to_scrape.append(s)
 
-        if not df.empty:
-            insert_reviews(df)
-            st.success(f"💾 Stored {len(df)} reviews for {s['brand']} in DB")
-            all_data.append(df)
-    return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
+    if to_scrape:
+        with session_thread_pool(min(PAGE_WORKERS, max(1, prefetch) * len(to_scrape)), name="scrape-page") as pages, \
+                session_thread_pool(min(workers, len(to_scrape)), name="scrape-source") as sources_pool:
+            futures = {
+                sources_pool.submit(scrape_source, s["platform"], s["url"], s["brand"], s["product"],
+                                    max_reviews, pages, prefetch): s
+                for s in to_scrape
+            }
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    s = futures.pop(fut)
+                    try:
+                        rows = fut.result()
+                    except Exception as e:
+                        reporting.error(f"Scraping {s['platform']} for {s['brand']} failed: {e}")
+                        continue
+                    if rows:
+                        df = pd.DataFrame(rows, columns=REVIEW_COLUMNS)
+                        df.insert(0, "id", insert_reviews(rows))
+                        reporting.success(f"💾 Stored {len(df)} reviews for {s['brand']} in DB")
+                        all_data.append(df)
+    return pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame(columns=["id", *REVIEW_COLUMNS])
@@ -1,17 +1,31 @@
 # serpapi_client.py
-from serpapi import GoogleSearch
-from typing import List, Dict
+from typing import List, Dict, Optional
 import os
 import time
-import random
-import requests
-from bs4 import BeautifulSoup
-import streamlit as st
+import threading
+
+import http_cache
+import reporting
+from instrumentation import count, span, timed
+from concurrency import session_thread_pool
+from html_utils import has_class
+from http_pool import get_capped
+from ratelimit import RetryError, call_with_retry, is_throttle
+
+try:
+    import lxml.html
+except ImportError:  # fall back to BeautifulSoup's pure-Python parser
+    lxml = None
 
 # ---- CONFIG ----
 SERPAPI_KEY = os.environ.get("SERPAPI_API_KEY")
-if not SERPAPI_KEY:
-    raise RuntimeError("SERPAPI_API_KEY environment variable is not set. Get one at https://serpapi.com/")
+
+def _api_key() -> str:
+    """Checked when a search is actually made, not at import time."""
+    key = SERPAPI_KEY or os.environ.get("SERPAPI_API_KEY")
+    if not key:
+        raise RuntimeError("SERPAPI_API_KEY environment variable is not set. Get one at https://serpapi.com/")
+    return key
 
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
@@ -19,31 +33,65 @@ HEADERS = {
     "Accept-Language": "en-US,en;q=0.9"
 }
 
-def serpapi_search(query: str, engine: str = "google", num: int = 10, country: str = "in", retries: int = 3) -> Dict:
-    """Run a SerpAPI search with retry and backoff."""
-    params = {
+# At most SERPAPI_MAX_CONCURRENCY requests in flight per process; the request rate
+# itself (per process and per host) is governed by the "serpapi" limiter in ratelimit.py.
+SERPAPI_MAX_CONCURRENCY = int(os.environ.get("SERPAPI_MAX_CONCURRENCY", "4"))
+_serp_slots = threading.BoundedSemaphore(SERPAPI_MAX_CONCURRENCY)
+# SerpAPI reports a query without results as an "error"; it is a valid (empty) answer, not a failure
+_NO_RESULTS = "hasn't returned any results"
+
+@timed("serpapi.search")
+def serpapi_search(query: str, engine: str = "google", num: int = 10, country: str = "in", retries: int = 3,
+                   max_age: Optional[float] = None, bypass_cache: bool = False) -> Dict:
+    """
+    Run a SerpAPI search with retry and backoff. max_age (seconds) tightens
+    how old a cached response may be; by default the source TTL applies.
+    bypass_cache=True skips the cached response (the fresh one is still stored).
+    Only throttling and transport errors are retried. A query without results
+    comes back (and is cached) as an empty page; other SerpAPI errors return {}.
+    """
+    cache_params = {
         "engine": engine,
         "q": query,
         "hl": "en",
         "gl": country,
-        "api_key": SERPAPI_KEY,
         "num": num
     }
+    ttl = None if max_age is None else min(max_age, http_cache.TTLS["serpapi"])
+    cached = http_cache.get_json("serpapi", cache_params, ttl, bypass=bypass_cache)
+    if cached is not None:
+        count("serpapi.cache_hits")
+        return cached
+
+    from serpapi import GoogleSearch
+    params = {**cache_params, "api_key": _api_key()}
+
+    def search():
+        with _serp_slots, span("serpapi.request"):
+            result = GoogleSearch(params).get_dict()
+        if "error" in result and is_throttle(RuntimeError(result["error"])):
+            raise RuntimeError(result["error"])
+        return result
 
-    for attempt in range(1, retries + 1):
-        try:
-            st.info(f"🔍 Fetching search results for: {query} (Attempt {attempt})")
-            search = GoogleSearch(params)
-            result = search.get_dict()
-            if "error" in result:
-                raise RuntimeError(result["error"])
-            return result
-        except Exception as e:
-            wait_time = random.uniform(4, 8) * attempt
-            st.warning(f"⚠️ SerpAPI error ({e}). Retrying in {wait_time:.1f}s...")
-            time.sleep(wait_time)
-    st.error("❌ Failed to fetch results after retries.")
-    return {}
+    reporting.info(f"🔍 Fetching search results for: {query}")
+    try:
+        result = call_with_retry(
+            "serpapi", search, retries=retries, retry_errors=True, base_delay=4.0,
+            on_retry=lambda attempt, e, wait: reporting.warning(
+                f"⚠️ SerpAPI error ({e}). Retrying in {wait:.1f}s (attempt {attempt + 1}/{retries})..."),
+        )
+    except RetryError:
+        reporting.error("❌ Failed to fetch results after retries.")
+        return {}
+    error = result.pop("error", None)
+    if error and _NO_RESULTS not in error.lower():
+        reporting.error(f"❌ SerpAPI error for {query!r}: {error}")
+        return {}
+    if error:
+        count("serpapi.empty_results")
+        result.setdefault("organic_results", [])
+    http_cache.put_json("serpapi", cache_params, result)
+    return result
 
 def extract_snippets_from_results(results: Dict) -> List[Dict]:
     items = []
@@ -55,56 +103,147 @@ def extract_snippets_from_results(results: Dict) -> List[Dict]:
             items.append({"title": title, "snippet": snippet, "link": link})
     return items
 
-def get_reviews_for_brand(product_name: str, brand: str, max_snippets: int = 30) -> List[Dict]:
-    """Fetch product reviews from Amazon + Flipkart."""
-    queries = [
+def brand_queries(product_name: str, brand: str) -> List[str]:
+    return [
         f"{product_name} {brand} reviews site:amazon.in",
         f"{product_name} {brand} reviews site:flipkart.com",
         f"{product_name} {brand} reviews"
     ]
 
-    collected, seen_links = [], set()
-
-    for q in queries:
-        res = serpapi_search(q)
-        items = extract_snippets_from_results(res)
-        for it in items:
-            link = it.get("link")
-            if not link or link in seen_links:
-                continue
-            seen_links.add(link)
-            collected.append({
-                "brand": brand,
-                "product": product_name,
-                "source": "snippet",
-                "snippet": it.get("snippet", ""),
-                "title": it.get("title", ""),
-                "link": link,
-                "fetched_at": time.strftime("%Y-%m-%d %H:%M:%S")
-            })
+def get_reviews_for_brands(product_name: str, brands: List[str], max_snippets: int = 30,
+                           queries: Optional[Dict[str, List[str]]] = None,
+                           known_links: Optional[Dict[str, set]] = None,
+                           max_age: Optional[float] = None,
+                           searched: Optional[Dict] = None,
+                           bypass_cache: bool = False) -> Dict[str, List[Dict]]:
+    """
+    Fetch Amazon + Flipkart reviews for several brands at once.
+    Every brand x query search is issued concurrently under the shared SerpAPI
+    concurrency limit and rate limiter; results are then merged per brand in
+    query order with the same dedup-by-link and max_snippets rules as before.
+
+    For incremental refresh: `queries` limits each brand to some of its
+    queries, links in `known_links[brand]` are skipped (max_snippets then
+    counts new links only), and `searched`, if given, is filled with
+    {(brand, query): succeeded} so callers can advance their watermarks.
+    bypass_cache=True re-queries SerpAPI even when a fresh response is cached.
+    """
+    queries = queries or {}
+    known_links = known_links or {}
+    jobs = [(brand, q) for brand in brands for q in queries.get(brand, brand_queries(product_name, brand))]
+    if not jobs:
+        return {brand: [] for brand in brands}
+
+    def run(job):
+        return serpapi_search(job[1], max_age=max_age, bypass_cache=bypass_cache)
+
+    with session_thread_pool(min(SERPAPI_MAX_CONCURRENCY, len(jobs)), name="serpapi") as pool:
+        raw = dict(zip(jobs, pool.map(run, jobs)))
+    if searched is not None:
+        searched.update({job: bool(result) for job, result in raw.items()})
+    results = {job: extract_snippets_from_results(result) for job, result in raw.items()}
+
+    fetched_at = time.strftime("%Y-%m-%d %H:%M:%S")
+    out = {}
+    for brand in brands:
+        collected, seen_links = [], set(known_links.get(brand, ()))
+        for q in queries.get(brand, brand_queries(product_name, brand)):
+            for it in results[(brand, q)]:
+                link = it.get("link")
+                if not link or link in seen_links:
+                    continue
+                seen_links.add(link)
+                collected.append({
+                    "brand": brand,
+                    "product": product_name,
+                    "source": "snippet",
+                    "snippet": it.get("snippet", ""),
+                    "title": it.get("title", ""),
+                    "link": link,
+                    "fetched_at": fetched_at
+                })
+                if len(collected) >= max_snippets:
+                    break
             if len(collected) >= max_snippets:
                 break
-        if len(collected) >= max_snippets:
-            break
-        time.sleep(random.uniform(3, 6))
-    st.success(f"✅ Collected {len(collected)} snippets for {brand}.")
-    return collected
+        new = " new" if known_links.get(brand) else ""
+        reporting.success(f"✅ Collected {len(collected)}{new} snippets for {brand}.")
+        out[brand] = collected
+    return out
+
+def get_reviews_for_brand(product_name: str, brand: str, max_snippets: int = 30) -> List[Dict]:
+    """Fetch product reviews from Amazon + Flipkart."""
+    return get_reviews_for_brands(product_name, [brand], max_snippets)[brand]
+
+FULLTEXT_MAX_WORKERS = 16
+
+def _fetch_page_html(link: str, bypass_cache: bool = False) -> str:
+    """GET a review page, served from the on-disk response cache when fresh (unless bypass_cache)."""
+    cached = http_cache.get("page", link, bypass=bypass_cache)
+    if cached is not None:
+        return cached.decode("utf-8", errors="replace")
+    status, html = get_capped(link, headers=HEADERS, timeout=8)
+    if status != 200:
+        return ""
+    http_cache.put("page", link, html.encode("utf-8"))
+    return html
+
+_AMAZON_XPATH = f"//div[{has_class('review-text-content')}]//span"
+_FLIPKART_XPATH = f"//div[{has_class('_27M-vq')}]//div[{has_class('t-ZTKy')}]/div"
+
+def _extract_with_lxml(html: str, link: str) -> str:
+    root = lxml.html.fromstring(html)
+    xpath = _AMAZON_XPATH if "amazon." in link else _FLIPKART_XPATH if "flipkart." in link else None
+    if xpath:
+        blocks = ["".join(s.strip() for s in el.itertext()) for el in root.xpath(xpath)]
+        if blocks:
+            return "\n".join(blocks)
+    for bad in root.xpath("//script|//style|//noscript"):
+        bad.drop_tree()
+    return "\n".join(s.strip() for s in root.itertext() if s.strip())[:2000]
 
-def try_fetch_full_text_from_link(link: str) -> str:
+def _extract_with_bs4(html: str, link: str) -> str:
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    if "amazon." in link:
+        blocks = soup.select("div.review-text-content span")
+        if blocks:
+            return "\n".join([b.get_text(strip=True) for b in blocks])
+    if "flipkart." in link:
+        blocks = soup.select("div._27M-vq div.t-ZTKy > div")
+        if blocks:
+            return "\n".join([b.get_text(strip=True) for b in blocks])
+    return soup.get_text(separator="\n", strip=True)[:2000]
+
+def extract_review_text(html: str, link: str) -> str:
+    """Pull review text out of a page: site-specific blocks first, else the page text."""
+    if lxml is not None:
+        return _extract_with_lxml(html, link)
+    return _extract_with_bs4(html, link)
+
+@timed("page.full_text")
+def try_fetch_full_text_from_link(link: str, bypass_cache: bool = False) -> str:
     """Fetch full review text if available."""
     try:
-        r = requests.get(link, headers=HEADERS, timeout=8)
-        if r.status_code != 200:
+        with span("page.download"):
+            html = _fetch_page_html(link, bypass_cache)
+        if not html:
+            count("page.empty")
             return ""
-        soup = BeautifulSoup(r.text, "html.parser")
-        if "amazon." in link:
-            blocks = soup.select("div.review-text-content span")
-            if blocks:
-                return "\n".join([b.get_text(strip=True) for b in blocks])
-        if "flipkart." in link:
-            blocks = soup.select("div._27M-vq div.t-ZTKy > div")
-            if blocks:
-                return "\n".join([b.get_text(strip=True) for b in blocks])
-        return soup.get_text(separator="\n", strip=True)[:2000]
+        with span("page.parse"):
+            return extract_review_text(html, link)
     except Exception:
         return ""
+
+def fetch_full_texts(links: List[str], max_workers: int = FULLTEXT_MAX_WORKERS,
+                     bypass_cache: bool = False) -> Dict[str, str]:
+    """
+    Fetch many review pages in parallel over pooled keep-alive sessions
+    (per-host concurrency is capped in http_pool). Returns {link: text};
+    links that failed map to "". bypass_cache=True re-downloads cached pages.
+    """
+    unique = list(dict.fromkeys(l for l in links if l))
+    if not unique:
+        return {}
+    with session_thread_pool(min(max_workers, len(unique)), name="fulltext") as pool:
+        return dict(zip(unique, pool.map(lambda link: try_fetch_full_text_from_link(link, bypass_cache), unique)))
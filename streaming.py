@@ -0,0 +1,229 @@
+# streaming.py
+import queue
+import threading
+import time
+from typing import Callable, List, Optional
+
+import pandas as pd
+
+import reporting
+from analyzer import detect_and_return
+from concurrency import session_thread_pool
+from db import canonical_ids, insert_reviews, iter_reviews, set_watermarks, update_emotions_for_rows
+
+QUEUE_SIZE = 8
+FLUSH_WAIT = 0.5  # seconds a partial classifier batch may wait for more rows
+FETCH_WORKERS = 4
+
+_DONE = object()
+
+
+class _Pipeline:
+    """Shared state for the stage threads: error capture and an abort flag."""
+
+    def __init__(self):
+        self.errors = []
+        self.abort = threading.Event()
+        self.timings = {}
+        self._lock = threading.Lock()
+
+    def fail(self, stage: str, exc: Exception):
+        with self._lock:
+            self.errors.append((stage, exc))
+        self.abort.set()
+
+    def add_time(self, stage: str, seconds: float):
+        with self._lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds
+
+    def put(self, q: queue.Queue, item):
+        """Blocking put that still notices an abort (backpressure without deadlock)."""
+        while not self.abort.is_set():
+            try:
+                q.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+
+    def get(self, q: queue.Queue, timeout: Optional[float] = None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.abort.is_set():
+            wait = 0.2 if deadline is None else min(0.2, deadline - time.monotonic())
+            if wait <= 0:
+                raise queue.Empty
+            try:
+                return q.get(timeout=wait)
+            except queue.Empty:
+                continue
+        return _DONE
+
+
+def run_streaming(product: str, brands: List[str], opts, queue_size: int = QUEUE_SIZE,
+                  flush_rows: Optional[int] = None,
+                  on_progress: Optional[Callable[[int], None]] = None) -> dict:
+    """
+    Staged fetch -> enrich -> store -> classify -> write pipeline with bounded
+    queues between the stages, so network time and model time overlap and only
+    a few batches are ever held in memory. Only brands with stale or missing
+    fetch watermarks are searched (for new links only); rows already stored
+    but not yet classified go straight to the classifier.
+    on_progress(rows_written) is called from the writer stage.
+    Returns per-stage busy time, row counts, total wall time and, under
+    "incomplete", the brands whose searches did not all succeed.
+    """
+    flush_rows = flush_rows or max(opts.batch_size * 4, 32)
+    p = _Pipeline()
+    fetched_q = queue.Queue(maxsize=queue_size)    # (brand, records without ids, searched queries, fetch time)
+    stored_q = queue.Queue(maxsize=queue_size)     # DataFrames of id/snippet rows
+    labelled_q = queue.Queue(maxsize=queue_size)   # DataFrames of id/emotion rows
+    counts = {"fetched": 0, "classified": 0, "written": 0}
+    incomplete = set()  # brands with a failed search (only their successful queries get a watermark)
+
+    from pipeline import plan_fetch, search_new
+    plan = plan_fetch(product, brands, opts)
+    to_fetch = list(plan)
+
+    def fetch_stage():
+        from serpapi_client import fetch_full_texts
+        try:
+            def fetch_one(brand):
+                start = time.perf_counter()
+                found, done, fetched_at = search_new(product, {brand: plan[brand]}, opts)
+                recs = found[brand]
+                if len(done[brand]) < len(plan[brand]):
+                    incomplete.add(brand)
+                p.add_time("fetch", time.perf_counter() - start)
+                if opts.use_fulltext and recs:
+                    start = time.perf_counter()
+                    full = fetch_full_texts([r["link"] for r in recs if r.get("link")], bypass_cache=opts.bypass_cache)
+                    for r in recs:
+                        if full.get(r.get("link")):
+                            r["snippet"] = full[r["link"]]
+                    p.add_time("enrich", time.perf_counter() - start)
+                p.put(fetched_q, (brand, recs, done[brand], fetched_at))
+
+            if to_fetch:
+                with session_thread_pool(min(FETCH_WORKERS, len(to_fetch)), name="stream-fetch") as pool:
+                    for fut in [pool.submit(fetch_one, b) for b in to_fetch]:
+                        fut.result()
+        except Exception as e:
+            p.fail("fetch", e)
+        finally:
+            p.put(fetched_q, _DONE)
+
+    def store_stage():
+        try:
+            # Read before anything new is inserted, so new rows aren't queued twice
+            for backlog in iter_reviews(brands, product, columns=["id", "snippet"], chunk_size=flush_rows,
+                                        unclassified_only=True):
+                p.put(stored_q, backlog)
+            while True:
+                item = p.get(fetched_q)
+                if item is _DONE:
+                    break
+                brand, recs, queries, fetched_at = item
+                start = time.perf_counter()
+                ids = insert_reviews(recs)
+                set_watermarks(brand, product, queries, fetched_at)
+                p.add_time("store", time.perf_counter() - start)
+                counts["fetched"] += len(ids)
+                snippets = dict(zip(ids, (r.get("snippet") or "" for r in recs)))
+                keep = canonical_ids(ids)  # near-duplicates inherit their canonical row's label
+                if keep:
+                    p.put(stored_q, pd.DataFrame({"id": keep, "snippet": [snippets[i] for i in keep]}))
+        except Exception as e:
+            p.fail("store", e)
+        finally:
+            p.put(stored_q, _DONE)
+
+    def classify_stage():
+        pending = []
+
+        def flush():
+            if not pending:
+                return
+            batch = pd.concat(pending, ignore_index=True)
+            pending.clear()
+            start = time.perf_counter()
+            labels = detect_and_return(batch, batch_size=opts.batch_size, backend=opts.backend,
+                                       long_text=opts.use_fulltext, max_chunks=opts.max_chunks, verbose=False)
+            p.add_time("classify", time.perf_counter() - start)
+            counts["classified"] += len(labels)
+            p.put(labelled_q, labels)
+
+        try:
+            while True:
+                try:
+                    item = p.get(stored_q, timeout=FLUSH_WAIT if pending else None)
+                except queue.Empty:
+                    flush()  # upstream is slow: don't sit on a partial batch
+                    continue
+                if item is _DONE:
+                    break
+                pending.append(item)
+                if sum(len(df) for df in pending) >= flush_rows:
+                    flush()
+            flush()
+        except Exception as e:
+            p.fail("classify", e)
+        finally:
+            p.put(labelled_q, _DONE)
+
+    def write_stage():
+        try:
+            while True:
+                first = p.get(labelled_q)
+                if first is _DONE:
+                    break
+                # Coalesce whatever else is already waiting into one transaction
+                batch, done = [first], False
+                while True:
+                    try:
+                        item = labelled_q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is _DONE:
+                        done = True
+                        break
+                    batch.append(item)
+                updates = pd.concat(batch, ignore_index=True)
+                start = time.perf_counter()
+                update_emotions_for_rows(updates)
+                p.add_time("write", time.perf_counter() - start)
+                counts["written"] += len(updates)
+                if on_progress:
+                    on_progress(counts["written"])
+                if done:
+                    break
+        except Exception as e:
+            p.fail("write", e)
+
+    reporting.info(f"🚰 Streaming {len(to_fetch)} brands to fetch and {len(brands) - len(to_fetch)} fresh brands "
+                   f"through the pipeline")
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=fn, name=f"stream-{name}", daemon=True)
+        for name, fn in (("fetch", fetch_stage), ("store", store_stage),
+                         ("classify", classify_stage), ("write", write_stage))
+    ]
+    try:
+        from streamlit.runtime.scriptrunner import add_script_run_ctx
+        for t in threads:
+            add_script_run_ctx(t)
+    except ImportError:
+        pass
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - start
+
+    if p.errors:
+        stage, exc = p.errors[0]
+        raise RuntimeError(f"Streaming pipeline failed in {stage} stage: {exc}") from exc
+
+    stats = {"wall_seconds": wall, **{f"{k}_seconds": v for k, v in p.timings.items()}, **counts,
+             "incomplete": sorted(incomplete)}
+    busy = ", ".join(f"{k} {v:.1f}s" for k, v in p.timings.items())
+    reporting.success(f"✅ Streamed {counts['written']} rows in {wall:.1f}s (stage busy time: {busy or 'none'})")
+    return stats
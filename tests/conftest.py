@@ -0,0 +1,80 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# The app is a set of flat top-level modules
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    """db pointed at an empty file in tmp_path, with its connections closed afterwards."""
+    import db
+    db.close_conn()
+    monkeypatch.setattr(db, "DB_NAME", str(tmp_path / "reviews.db"))
+    yield db
+    db.close_conn()
+
+
+@pytest.fixture
+def fresh_cache(tmp_path, monkeypatch):
+    """inference_cache pointed at an empty file in tmp_path."""
+    import inference_cache
+    path = str(tmp_path / "inference_cache.db")
+    monkeypatch.setattr(inference_cache, "CACHE_DB", path)
+    yield inference_cache
+    conn = getattr(inference_cache._local, "conns", {}).pop(path, None)
+    if conn is not None:
+        conn.close()
+
+
+class FakeSearch:
+    """serpapi_search stand-in: three results per query (links unique to the query); `fail` holds failing queries."""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = set()
+
+    def __call__(self, query, num=10, max_age=None, bypass_cache=False, **kwargs):
+        self.calls.append(query)
+        if query in self.fail:
+            return {}  # what serpapi_search returns once its retries are exhausted
+        slug = query.replace(" ", "-")
+        return {"organic_results": [
+            {"title": f"{query} #{i}", "link": f"https://example.com/{slug}/{i}",
+             "snippet": f"Review {i} for {query}: " + ("good sound, would buy again" if i % 2 else "bad battery life")}
+            for i in range(3)]}
+
+
+class FakeModel:
+    """Sentiment pipeline stand-in: "good" texts are positive, the rest negative."""
+
+    class _Tokenizer:
+        def __call__(self, texts, truncation=False, max_length=512, add_special_tokens=True, **kwargs):
+            return {"input_ids": [list(range(len(t.split()))) for t in texts]}
+
+        def decode(self, ids):
+            return " ".join("tok" for _ in ids)
+
+    def __init__(self):
+        self.tokenizer = self._Tokenizer()
+        self.texts = []
+
+    def __call__(self, texts, batch_size=16, truncation=True):
+        self.texts.extend(texts)
+        return [[{"label": "positive" if "good" in t else "negative", "score": 0.8},
+                 {"label": "neutral", "score": 0.2}] for t in texts]
+
+
+@pytest.fixture
+def fake_services(fresh_db, fresh_cache, monkeypatch):
+    """Empty reviews.db and inference cache, with SerpAPI and the model replaced by fakes."""
+    import analyzer
+    import serpapi_client
+    search, model = FakeSearch(), FakeModel()
+    monkeypatch.setattr(serpapi_client, "serpapi_search", search)
+    monkeypatch.setattr(analyzer, "load_pipeline", lambda *args, **kwargs: model)
+    fresh_db.init_db()
+    return search, model
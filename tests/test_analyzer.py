@@ -0,0 +1,119 @@
+# tests/test_analyzer.py
+import pandas as pd
+import pytest
+
+import analyzer
+
+
+class _Tokenizer:
+    """One token per word."""
+
+    def __call__(self, texts, truncation=False, max_length=512, add_special_tokens=True, **kwargs):
+        extra = 2 if add_special_tokens else 0
+        return {"input_ids": [list(range(min(len(t.split()) + extra, max_length) if truncation
+                                         else len(t.split()) + extra)) for t in texts]}
+
+    def decode(self, ids):
+        return " ".join("tok" for _ in ids)
+
+
+class _Pipeline:
+    """Labels "good" texts positive and the rest negative; records every batch it is given."""
+
+    def __init__(self, fail_on=None):
+        self.tokenizer = _Tokenizer()
+        self.batches = []
+        self.fail_on = fail_on
+
+    def __call__(self, texts, batch_size=16, truncation=True):
+        self.batches.append(list(texts))
+        if self.fail_on and any(self.fail_on in t for t in texts):
+            raise RuntimeError("CUDA error: device-side assert triggered")
+        return [[{"label": "positive" if "good" in t else "negative", "score": 0.9},
+                 {"label": "neutral", "score": 0.1}] for t in texts]
+
+
+@pytest.fixture
+def pipe(monkeypatch):
+    fake = _Pipeline()
+    monkeypatch.setattr(analyzer, "load_pipeline", lambda *args, **kwargs: fake)
+    return fake
+
+
+def _frame(texts):
+    return pd.DataFrame({"id": range(100, 100 + len(texts)), "snippet": texts})
+
+
+def test_batches_are_length_bucketed_and_results_keep_input_order(pipe):
+    texts = ["good " * n if n % 2 else "bad " * n for n in (9, 1, 14, 3, 7, 2, 11)] + ["   "]
+    out = analyzer.detect_and_return(_frame(texts), batch_size=3, use_cache=False, verbose=False)
+
+    assert out["id"].tolist() == list(range(100, 108))
+    assert out["emotion"].tolist() == ["positive", "positive", "negative", "positive", "positive", "negative",
+                                       "positive", "unknown"]
+    assert out["scores"].iloc[-1] is None and out["scores"].iloc[:-1].notna().all()
+    # Empty text never reaches the model; the rest go shortest first, at most batch_size at a time
+    assert [len(b) for b in pipe.batches] == [3, 3, 1]
+    lengths = [len(t.split()) for b in pipe.batches for t in b]
+    assert lengths == sorted(lengths)
+
+
+def test_failing_batch_falls_back_to_single_rows(monkeypatch):
+    fake = _Pipeline(fail_on="broken")
+    monkeypatch.setattr(analyzer, "load_pipeline", lambda *args, **kwargs: fake)
+    texts = ["good one", "broken row", "bad one", "good two"]
+    out = analyzer.detect_and_return(_frame(texts), batch_size=4, use_cache=False, verbose=False)
+
+    assert out["emotion"].tolist() == ["positive", "error", "negative", "positive"]
+    assert len(fake.batches) == 1 + len(texts)
+
+
+
+def test_repeated_snippets_are_served_from_the_inference_cache(pipe, fresh_cache):
+    texts = ["good  value", "good value", "bad value"]
+    first = analyzer.detect_and_return(_frame(texts), verbose=False)
+    # Copies that only differ in whitespace are classified once
+    assert [len(b) for b in pipe.batches] == [2]
+
+    second = analyzer.detect_and_return(_frame(texts[::-1]), verbose=False)
+    assert len(pipe.batches) == 1
+    assert second["emotion"].tolist() == first["emotion"].tolist()[::-1] == ["negative", "positive", "positive"]
+    assert second["scores"].tolist() == first["scores"].tolist()[::-1]
+
+
+def _sentence(i, words):
+    return " ".join(f"w{i}_{k}" for k in range(words - 1)) + f" end{i}."
+
+
+def test_long_text_chunks_stay_within_the_token_window():
+    tokenizer = _Tokenizer()
+    # Sentence lengths around the stride so overlaps have to be trimmed to fit
+    text = " ".join(_sentence(i, n) for i, n in enumerate([60, 300, 200, 64, 450, 30, 500, 10, 70]))
+    chunks = analyzer._chunk_text(tokenizer, text, max_tokens=510, stride=64)
+
+    assert len(chunks) > 1
+    for chunk, n_tokens in chunks:
+        assert n_tokens == len(chunk.split()) <= 510
+    # Every sentence lands in some chunk, in order
+    ends = [w for chunk, _ in chunks for w in chunk.split() if w.startswith("end")]
+    assert list(dict.fromkeys(ends)) == [f"end{i}." for i in range(9)]
+
+
+def test_sentences_longer_than_the_window_are_sliced():
+    chunks = analyzer._chunk_text(_Tokenizer(), _sentence(0, 1200), max_tokens=510, stride=64)
+    assert [n for _, n in chunks] == [510, 510, 308]
+
+
+def test_long_text_mode_caps_model_work_per_review(pipe):
+    long_review = " ".join(_sentence(i, 200) for i in range(20))
+    out = analyzer.detect_and_return(_frame([long_review, "good short one"]), use_cache=False, long_text=True,
+                                     max_chunks=3, verbose=False)
+    assert out["emotion"].tolist() == ["negative", "positive"]
+    assert sum(len(b) for b in pipe.batches) == 3 + 1
+    assert max(len(t.split()) for b in pipe.batches for t in b) <= analyzer.CHUNK_TOKENS
+
+
+def test_limit_chunks_keeps_both_ends():
+    assert analyzer._limit_chunks(list(range(10)), 4) == [0, 3, 6, 9]
+    assert analyzer._limit_chunks(list(range(3)), 8) == [0, 1, 2]
+    assert analyzer._limit_chunks(list(range(5)), 1) == [0]
@@ -0,0 +1,131 @@
+# tests/test_db.py
+import sqlite3
+import threading
+
+import pandas as pd
+
+CANONICAL = "These headphones have a warm, detailed sound and the battery easily lasts three days."
+
+
+def _review(brand, snippet, link, product="headphones"):
+    return {"brand": brand, "product": product, "source": "snippet", "title": "t", "snippet": snippet,
+            "link": link, "fetched_at": "2026-01-01 00:00:00"}
+
+
+def _grouped(db) -> dict:
+    rows = db.get_conn().execute(
+        "SELECT brand, emotion, COUNT(*) FROM reviews "
+        "WHERE emotion IS NOT NULL AND duplicate_of IS NULL GROUP BY 1, 2").fetchall()
+    return {(b, e): n for b, e, n in rows}
+
+
+def _counted(db, brands) -> dict:
+    counts = db.fetch_emotion_counts(brands, "headphones")
+    return {(r.brand, r.emotion): r.count for r in counts.itertuples()}
+
+
+def test_connections_are_reused_per_thread(fresh_db):
+    db = fresh_db
+    conn = db.get_conn()
+    assert db.get_conn() is conn
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    other = []
+    worker = threading.Thread(target=lambda: (other.append(db.get_conn()), db.close_conn()))
+    worker.start()
+    worker.join()
+    assert other[0] is not conn
+
+
+def test_unclassified_rows_use_the_partial_index(fresh_db):
+    db = fresh_db
+    db.init_db()
+    plan = db.get_conn().execute(
+        "EXPLAIN QUERY PLAN SELECT id FROM reviews WHERE brand=? AND product=? AND id > ? "
+        "AND emotion IS NULL AND duplicate_of IS NULL ORDER BY id", ("Sony", "headphones", 0)).fetchall()
+    assert any("idx_reviews_unclassified" in row[-1] for row in plan)
+
+
+def test_review_counts_match_group_by(fresh_db):
+    db = fresh_db
+    db.init_db()
+    brands = ["Sony", "Boat"]
+    ids = db.insert_reviews([_review(b, f"{b} review number {i} with enough words to be hashed", f"{b}{i}")
+                             for b in brands for i in range(6)])
+    ids += db.insert_reviews([_review("Sony", CANONICAL, "c"), _review("Sony", CANONICAL + " Read more", "c2")])
+    assert _counted(db, brands) == _grouped(db) == {}
+
+    labels = ["positive", "negative", "neutral"]
+    db.update_emotions_for_rows(pd.DataFrame({"id": ids, "emotion": [labels[i % 3] for i in range(len(ids))]}))
+    assert _counted(db, brands) == _grouped(db)
+
+    # A near-duplicate of a labelled row is stored with its label but not counted
+    db.insert_reviews([_review("Sony", "Read more: " + CANONICAL, "c3")])
+    assert _counted(db, brands) == _grouped(db)
+
+    db.update_emotions_for_rows(pd.DataFrame({"id": ids[:4], "emotion": ["negative"] * 4}))
+    assert _counted(db, brands) == _grouped(db)
+
+    db.clear_cache()
+    assert _counted(db, brands) == _grouped(db) == {}
+
+
+def test_init_db_runs_no_ddl_once_current(fresh_db):
+    db = fresh_db
+    db.init_db()
+    conn = db.get_conn()
+    schema = conn.execute("PRAGMA schema_version").fetchone()[0]
+    db.init_db()
+    assert conn.execute("PRAGMA schema_version").fetchone()[0] == schema
+
+    # clear_cache drops tables, so the next init has to build them (and the triggers) again
+    db.clear_cache()
+    db.insert_reviews([_review("Sony", CANONICAL, "a")])
+    db.update_emotions_for_rows(pd.DataFrame({"id": [1], "emotion": ["positive"]}))
+    assert _counted(db, ["Sony"]) == {("Sony", "positive"): 1}
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+
+
+def test_migrate_baseline_schema(fresh_db):
+    db = fresh_db
+    # reviews.db as created by the first version of the app
+    conn = sqlite3.connect(db.DB_NAME)
+    conn.execute("""
+        CREATE TABLE reviews (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            brand TEXT, product TEXT, source TEXT, title TEXT, snippet TEXT, link TEXT, emotion TEXT, fetched_at TEXT
+        )
+    """)
+    conn.executemany("INSERT INTO reviews (brand, product, source, title, snippet, link, emotion, fetched_at) "
+                     "VALUES (?, ?, 'snippet', 't', ?, ?, ?, '2025-01-01 00:00:00')",
+                     [("Sony", "headphones", CANONICAL, "a", "positive"),
+                      ("Sony", "headphones", "Short one", "b", "negative"),
+                      ("Boat", "headphones", "Boat earbuds are loud but the case feels cheap and flimsy.", "c", None)])
+    conn.commit()
+    conn.close()
+
+    db.init_db()
+    db.init_db()  # idempotent
+    conn = db.get_conn()
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(reviews)")}
+    assert {"duplicate_of", "minhash", "scores"} <= columns
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == db.SCHEMA_VERSION
+    assert _counted(db, ["Sony", "Boat"]) == _grouped(db) == {("Sony", "positive"): 1, ("Sony", "negative"): 1}
+    assert db.count_reviews(["Sony", "Boat"], "headphones", unclassified_only=True) == 1
+    # Legacy rows were indexed for near-duplicate detection
+    dup = db.insert_reviews([_review("Sony", CANONICAL + " Read more", "d")])[0]
+    assert conn.execute("SELECT duplicate_of, emotion FROM reviews WHERE id=?", (dup,)).fetchone() == (1, "positive")
+
+
+def test_watermarks_fall_back_to_stored_rows_only_before_any_were_recorded(fresh_db):
+    db = fresh_db
+    db.init_db()
+    queries = ["q amazon", "q flipkart", "q"]
+    assert db.get_watermarks("Sony", "headphones", queries) == dict.fromkeys(queries)
+
+    db.insert_reviews([_review("Sony", CANONICAL, "a")])
+    assert db.get_watermarks("Sony", "headphones", queries) == dict.fromkeys(queries, "2026-01-01 00:00:00")
+
+    # A query missing next to recorded ones failed last time, so it must not look fresh
+    db.set_watermarks("Sony", "headphones", queries[:2], "2026-02-01 00:00:00")
+    assert db.get_watermarks("Sony", "headphones", queries) == {
+        "q amazon": "2026-02-01 00:00:00", "q flipkart": "2026-02-01 00:00:00", "q": None}
@@ -0,0 +1,90 @@
+# tests/test_export.py
+import gzip
+import io
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc
+import pyarrow.parquet
+import pytest
+
+import export
+
+CANONICAL = "These headphones have a warm, detailed sound and the battery easily lasts three days."
+
+
+def _review(brand, snippet, link):
+    return {"brand": brand, "product": "headphones", "source": "snippet", "title": "t", "snippet": snippet,
+            "link": link, "fetched_at": "2026-01-01 00:00:00"}
+
+
+@pytest.fixture
+def stored(fresh_db):
+    """Seven reviews, one of them a near-duplicate (duplicate_of set) and one still unclassified."""
+    db = fresh_db
+    db.init_db()
+    ids = db.insert_reviews([_review(b, f"{b} review number {i} with enough words to be hashed", f"{b}{i}")
+                             for b in ("Sony", "Boat") for i in range(3)])
+    ids += db.insert_reviews([_review("Sony", CANONICAL, "c"), _review("Sony", CANONICAL + " Read more", "d")])
+    db.update_emotions_for_rows(pd.DataFrame({"id": ids[:-1], "emotion": ["positive", "negative"] * 3 + ["neutral"]}))
+    return db
+
+
+def _read(data: bytes, fmt: str) -> pd.DataFrame:
+    if fmt == "csv":
+        return pd.read_csv(io.BytesIO(data), dtype={"id": "Int64", "duplicate_of": "Int64"})
+    if fmt == "csv.gz":
+        return _read(gzip.decompress(data), "csv")
+    if fmt == "parquet":
+        return pa.parquet.read_table(io.BytesIO(data)).to_pandas()
+    return pa.ipc.open_file(pa.BufferReader(data)).read_all().to_pandas()
+
+
+@pytest.mark.parametrize("fmt", export.EXPORT_FORMATS)
+def test_every_format_round_trips_the_stored_rows(stored, fmt):
+    out = io.BytesIO()
+    rows = export.write_export(out, ["Sony", "Boat"], "headphones", fmt, chunk_size=3)
+    frame = _read(out.getvalue(), fmt)
+
+    assert rows == len(frame) == 8
+    assert frame.columns.tolist() == export.EXPORT_COLUMNS
+    assert sorted(frame["link"]) == sorted(["Sony0", "Sony1", "Sony2", "Boat0", "Boat1", "Boat2", "c", "d"])
+    # Ids stay integers across chunks even though most duplicate_of values are NULL
+    assert sorted(frame["id"].tolist()) == list(range(1, 9))
+    assert frame["duplicate_of"].dropna().astype(int).tolist() == [7]
+
+
+def test_columns_pick_and_order_the_output(stored):
+    out = io.BytesIO()
+    export.write_export(out, ["Boat"], "headphones", "parquet", columns=["emotion", "brand"], chunk_size=2)
+    frame = _read(out.getvalue(), "parquet")
+    assert frame.columns.tolist() == ["emotion", "brand"]
+    assert frame["brand"].tolist() == ["Boat"] * 3
+
+
+def test_chunked_csv_has_one_header_and_integer_ids(stored):
+    out = io.BytesIO()
+    export.write_export(out, ["Sony", "Boat"], "headphones", "csv", columns=["id", "duplicate_of"], chunk_size=3)
+    lines = out.getvalue().decode("utf-8").splitlines()
+    assert lines[0] == "id,duplicate_of"
+    assert len(lines) == 1 + 8 and lines.count("id,duplicate_of") == 1
+    # A chunk whose duplicate_of is NULL must not turn the ids into floats
+    assert sorted(lines[1:]) == sorted([f"{i}," for i in range(1, 8)] + ["8,7"])
+
+
+def test_unknown_format_is_rejected(stored):
+    with pytest.raises(ValueError):
+        export.write_export(io.BytesIO(), ["Sony"], "headphones", "xlsx")
+
+
+def test_cli_picks_the_format_from_the_extension(stored, tmp_path):
+    path = tmp_path / "reviews.csv.gz"
+    assert export.main(["headphones", "Sony", "-o", str(path), "--columns", "brand", "link"]) == 0
+    frame = _read(path.read_bytes(), "csv.gz")
+    assert frame.columns.tolist() == ["brand", "link"] and len(frame) == 5
+
+
+def test_default_format_falls_back_to_gzipped_csv_without_pyarrow(monkeypatch):
+    assert export.default_format() == "parquet"
+    monkeypatch.setattr(export.importlib.util, "find_spec", lambda name: None)
+    assert export.default_format() == "csv.gz"
@@ -0,0 +1,64 @@
+# tests/test_http_cache.py
+import os
+import time
+
+import pytest
+
+import http_cache
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(http_cache, "CACHE_DIR", str(tmp_path / "http_cache"))
+    monkeypatch.setattr(http_cache, "_approx_size", None)
+    monkeypatch.setattr(http_cache, "BYPASS", False)
+    return http_cache
+
+
+def _age(cache, source, payload, seconds):
+    """Pretend the entry was written (and last read) `seconds` ago."""
+    path = cache._path(source, cache.cache_key(payload))
+    then = time.time() - seconds
+    os.utime(path, (then, then))
+
+
+def test_entries_expire_after_the_source_ttl(cache):
+    params = {"q": "headphones sony reviews", "num": 10}
+    cache.put_json("serpapi", params, {"organic_results": [{"title": "t"}]})
+    assert cache.get_json("serpapi", {"num": 10, "q": "headphones sony reviews"}) == {"organic_results": [{"title": "t"}]}
+
+    _age(cache, "serpapi", params, cache.TTLS["serpapi"] + 60)
+    assert cache.get_json("serpapi", params) is None
+    # Page TTLs are longer, and callers can pass their own
+    assert cache.get_json("serpapi", params, ttl=cache.TTLS["serpapi"] * 2) is not None
+    cache.put("page", "https://example.com/r/1", b"<html>")
+    _age(cache, "page", "https://example.com/r/1", cache.TTLS["serpapi"] + 60)
+    assert cache.get("page", "https://example.com/r/1") == b"<html>"
+
+
+def test_bypass_is_per_call(cache):
+    cache.put("page", "https://example.com/r/1", b"<html>")
+    before = cache.cache_stats()
+    assert cache.get("page", "https://example.com/r/1", bypass=True) is None
+    assert cache.get("page", "https://example.com/r/1") == b"<html>"
+    after = cache.cache_stats()
+    assert after["hits"] - before["hits"] == 1 and after["misses"] == before["misses"]
+
+
+def test_least_recently_read_entries_are_evicted(cache, monkeypatch):
+    monkeypatch.setattr(cache, "MAX_BYTES", 5000)
+    pages = {f"https://example.com/r/{i}": os.urandom(900) for i in range(5)}
+    for i, (link, body) in enumerate(pages.items()):
+        cache.put("page", link, body)
+        _age(cache, "page", link, 100 - i)
+    assert cache.get("page", "https://example.com/r/0") is not None  # read last, so kept
+
+    cache.put("page", "https://example.com/r/new", os.urandom(900))
+    kept = [link for link in [*pages, "https://example.com/r/new"] if cache.get("page", link) is not None]
+    assert "https://example.com/r/1" not in kept
+    assert {"https://example.com/r/0", "https://example.com/r/new"} <= set(kept)
+    assert cache._disk_usage() <= cache.MAX_BYTES * 0.9
+    assert cache.cache_stats()["evicted_files"] >= 1
+
+    cache.clear_http_cache()
+    assert cache._disk_usage() == 0 and cache.get("page", "https://example.com/r/0") is None
@@ -0,0 +1,48 @@
+# tests/test_inference_cache.py
+import itertools
+
+
+def _count(cache) -> int:
+    return cache._conn().execute("SELECT COUNT(*) FROM inference_cache").fetchone()[0]
+
+
+def test_lookup_ignores_whitespace_and_unicode_form(fresh_cache):
+    cache = fresh_cache
+    cache.store_labels("m", {"Great  sound,\nclear mids": "positive"}, {"Great  sound,\nclear mids": b"\x01\x02"})
+    hits = cache.get_cached_entries("m", ["Great sound, clear mids", "Ｇreat sound, clear mids", "other"])
+    assert list(hits.values()) == [("positive", b"\x01\x02")]
+    # Labels are kept per model
+    assert cache.get_cached_labels("other-model", ["Great sound, clear mids"]) == {}
+
+
+def test_eviction_drops_least_recently_used(fresh_cache, monkeypatch):
+    cache = fresh_cache
+    clock = itertools.count(1000)
+    monkeypatch.setattr(cache.time, "time", lambda: float(next(clock)))
+    monkeypatch.setattr(cache, "MAX_ENTRIES", 10)
+
+    for i in range(10):
+        cache.store_labels("m", {f"text {i}": "positive"})
+    # Reading entries counts as use, so text 0 and 1 are now the most recent
+    assert len(cache.get_cached_labels("m", ["text 0", "text 1"])) == 2
+    assert cache.cache_stats()["evictions"] == 0
+
+    cache.store_labels("m", {"text 10": "negative"})
+    # Over the limit: trimmed to 90% by dropping the oldest last_used first
+    by_hash = {cache.text_hash(f"text {i}"): i for i in range(11)}
+    kept = sorted(by_hash[h] for h in cache.get_cached_labels("m", [f"text {i}" for i in range(11)]))
+    assert kept == [0, 1, 4, 5, 6, 7, 8, 9, 10]
+    assert _count(cache) == 9
+    stats = cache.cache_stats()
+    assert stats["size"] == 9 and stats["evictions"] == 2
+
+
+def test_tracked_size_survives_replacing_entries(fresh_cache, monkeypatch):
+    cache = fresh_cache
+    monkeypatch.setattr(cache, "MAX_ENTRIES", 5)
+    for _ in range(4):
+        cache.store_labels("m", {f"text {i}": "neutral" for i in range(5)})
+    # Rewriting the same five entries never evicts anything
+    assert _count(cache) == 5 and cache.cache_stats()["size"] == 5
+    cache.clear_inference_cache()
+    assert _count(cache) == cache.cache_stats()["size"] == 0
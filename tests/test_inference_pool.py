@@ -0,0 +1,93 @@
+# tests/test_inference_pool.py
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import pytest
+
+import inference_pool
+
+
+class _Pool(ThreadPoolExecutor):
+    """In-process stand-in for the spawn pool; shards wait for `gate` so the test controls when they finish."""
+
+    created = []
+    gate = threading.Event()
+
+    def __init__(self, max_workers, mp_context=None, initializer=None, initargs=()):
+        super().__init__(max_workers=max_workers)
+        self.max_workers = max_workers
+        self.submitted = []  # shards finished when each shard was submitted
+        self.finished = 0
+        self._lock = threading.Lock()
+        initializer(*initargs)
+        _Pool.created.append(self)
+
+    def submit(self, fn, *args, **kwargs):
+        def run():
+            self.gate.wait(timeout=5)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self.finished += 1
+        with self._lock:
+            self.submitted.append(self.finished)
+        return super().submit(run)
+
+
+@pytest.fixture
+def pool(monkeypatch, fresh_cache):
+    from conftest import FakeModel
+    model = FakeModel()
+    _Pool.created = []
+    _Pool.gate = threading.Event()
+    monkeypatch.setattr(inference_pool, "ProcessPoolExecutor", _Pool)
+    monkeypatch.setattr(inference_pool, "_init_worker", lambda *args: setattr(inference_pool, "_pipe", model))
+    monkeypatch.setattr(inference_pool, "physical_cores", lambda: 8)
+    return _Pool
+
+
+def _chunks(sizes, gate=None):
+    start = 0
+    for n in sizes:
+        yield pd.DataFrame({"id": range(start, start + n),
+                            "snippet": [f"review {i} " + ("good" if i % 2 else "bad") for i in range(start, start + n)]})
+        start += n
+    if gate is not None:
+        gate.set()
+
+
+def test_pool_is_sized_from_the_backlog_not_the_first_chunk(pool):
+    # A small first chunk must not shrink the pool for everything after it
+    pool.gate.set()
+    out = pd.concat(inference_pool.iter_detect_parallel(_chunks([5, 200, 200]), workers=4, batch_size=8,
+                                                        use_cache=False, total=405))
+    assert len(pool.created) == 1 and pool.created[0].max_workers == 4
+    assert sorted(out["id"]) == list(range(405))
+    labels = out.set_index("id")["emotion"].sort_index()
+    assert labels.tolist() == ["positive" if i % 2 else "negative" for i in range(405)]
+
+
+def test_small_backlogs_get_fewer_workers(pool):
+    pool.gate.set()
+    list(inference_pool.iter_detect_parallel(_chunks([20]), workers=4, batch_size=8, use_cache=False, total=20))
+    assert pool.created[0].max_workers == 3
+
+
+def test_next_chunk_is_queued_before_the_current_one_drains(pool):
+    # Shards only run once the last chunk has been read, so every submit has to happen before any finishes
+    out = list(inference_pool.iter_detect_parallel(_chunks([40, 40], pool.gate), workers=4, batch_size=8,
+                                                   use_cache=False, shard_size=16))
+    submitted = pool.created[0].submitted
+    assert len(submitted) == 8 and set(submitted) == {0}
+    assert sum(len(df) for df in out) == 80
+
+
+def test_queue_stays_bounded(pool):
+    pool.gate.set()
+    list(inference_pool.iter_detect_parallel(_chunks([64] * 10), workers=2, batch_size=8, use_cache=False,
+                                             shard_size=16))
+    submitted = pool.created[0].submitted
+    # Never more than about two rounds of shards (plus one chunk's worth) ahead of the finished ones
+    assert all(i - finished <= 2 * 2 + 4 for i, finished in enumerate(submitted))
@@ -0,0 +1,80 @@
+# tests/test_near_dup.py
+import random
+
+import pandas as pd
+
+import near_dup
+from bench_fakes import make_review
+from rescoring import pack_scores
+
+REVIEW = "These headphones have a warm, detailed sound and the battery easily lasts three days."
+
+
+def _review(snippet, link, brand="Sony"):
+    return {"brand": brand, "product": "headphones", "source": "snippet", "title": "t", "snippet": snippet,
+            "link": link, "fetched_at": "2026-01-01 00:00:00"}
+
+
+def test_mirrored_copies_match_but_opposite_verdicts_do_not():
+    sig = near_dup.signature(REVIEW)
+    mirror = REVIEW + " Read more"
+    assert near_dup.similarity(sig, near_dup.signature(mirror)) >= near_dup.NEAR_DUP_THRESHOLD
+    assert near_dup.same_review(REVIEW, mirror)
+
+    a = "Great battery life, comfortable and the sound is clear. I would recommend this product to anyone."
+    b = "Great battery life, comfortable and the sound is clear. I would not recommend this product to anyone."
+    assert near_dup.similarity(near_dup.signature(a), near_dup.signature(b)) >= near_dup.NEAR_DUP_THRESHOLD
+    assert not near_dup.same_review(a, b)
+    assert near_dup.best_match(near_dup.signature(b), b, [(1, near_dup.to_blob(near_dup.signature(a)), a)]) is None
+
+
+def test_short_snippets_are_never_merged():
+    assert near_dup.signature("Good product, works fine.") is None
+
+
+def test_best_match_prefers_the_most_similar_then_oldest():
+    sig = near_dup.signature(REVIEW)
+    blob = near_dup.to_blob(sig)
+    other = REVIEW + " Sound is clear at 80% volume and the case is sturdy."
+    candidates = [(7, near_dup.to_blob(near_dup.signature(other)), other), (5, blob, REVIEW), (3, blob, REVIEW)]
+    assert near_dup.best_match(sig, REVIEW, candidates) == (3, 1.0)
+
+
+def test_duplicates_link_to_the_canonical_row_and_share_its_label(fresh_db):
+    db = fresh_db
+    db.init_db()
+    canonical = db.insert_reviews([_review(REVIEW, "a")])[0]
+    # Labelled before the copy arrives: the copy starts out with the same label and scores
+    scores = pack_scores({"negative": 0.1, "neutral": 0.2, "positive": 0.7})
+    db.update_emotions_for_rows(pd.DataFrame({"id": [canonical], "emotion": ["positive"], "scores": [scores]}))
+    dup, other_brand = db.insert_reviews([_review(REVIEW + " Read more", "b"), _review(REVIEW, "c", brand="Boat")])
+
+    rows = dict((r[0], r[1:]) for r in db.get_conn().execute(
+        "SELECT id, duplicate_of, emotion, scores FROM reviews"))
+    assert rows[dup] == (canonical, "positive", scores)
+    assert rows[other_brand] == (None, None, None)  # only compared within the same brand and product
+    assert db.fetch_emotion_counts(["Sony"], "headphones")["count"].tolist() == [1]
+    assert db.count_reviews(["Sony", "Boat"], "headphones", unclassified_only=True) == 1
+
+    # Relabelling the canonical row carries over to its duplicates
+    db.update_emotions_for_rows(pd.DataFrame({"id": [canonical], "emotion": ["neutral"]}))
+    assert db.get_conn().execute("SELECT emotion FROM reviews WHERE id=?", (dup,)).fetchone()[0] == "neutral"
+
+    # Dedup can be turned off per insert
+    plain = db.insert_reviews([_review(REVIEW, "d")], dedup_threshold=None)[0]
+    assert db.get_conn().execute("SELECT duplicate_of FROM reviews WHERE id=?", (plain,)).fetchone()[0] is None
+
+
+def test_band_index_finds_candidates_without_scanning(fresh_db):
+    db = fresh_db
+    db.init_db()
+    rng = random.Random(0)
+    texts = [make_review(rng, "Sony", "headphones", long=True) for _ in range(50)]
+    ids = db.insert_reviews([_review(text, str(i)) for i, text in enumerate(texts)])
+    conn = db.get_conn()
+    assert conn.execute("SELECT COUNT(DISTINCT id) FROM minhash_bands").fetchone()[0] == len(ids)
+
+    def candidates(text):
+        return [row[0] for row in db._candidates(conn, "Sony", "headphones", near_dup.signature(text))]
+    assert ids[7] in candidates(texts[7] + " Read more")
+    assert len(candidates(REVIEW)) < len(ids) // 2
@@ -0,0 +1,44 @@
+# tests/test_pipeline.py
+from pipeline import RunOptions, run_product
+from serpapi_client import brand_queries
+
+
+def _stages(db, job_id):
+    return {brand: stage for (_, brand), stage in db.get_job_progress(job_id).items()}
+
+
+def test_brands_with_failed_searches_stay_pending(fake_services, fresh_db):
+    search, _ = fake_services
+    failing = brand_queries("headphones", "Boat")[1]
+    search.fail.add(failing)
+
+    run_product("headphones", ["Sony", "Boat"], RunOptions(), job_id="nightly")
+    assert _stages(fresh_db, "nightly") == {"Sony": "classified"}
+    # What was found for Boat is stored and classified anyway
+    assert fresh_db.count_reviews(["Boat"], "headphones") == 6
+    assert fresh_db.count_reviews(["Sony", "Boat"], "headphones", unclassified_only=True) == 0
+
+    # Resuming the job only repeats the search that failed
+    search.fail.clear()
+    search.calls.clear()
+    run_product("headphones", ["Sony", "Boat"], RunOptions(), job_id="nightly")
+    assert search.calls == [failing]
+    assert _stages(fresh_db, "nightly") == {"Sony": "classified", "Boat": "classified"}
+    assert fresh_db.count_reviews(["Boat"], "headphones") == 9
+
+    search.calls.clear()
+    run_product("headphones", ["Sony", "Boat"], RunOptions(), job_id="nightly")
+    assert search.calls == []
+
+
+def test_streaming_run_leaves_failed_brands_pending(fake_services, fresh_db):
+    search, _ = fake_services
+    search.fail.update(brand_queries("headphones", "Sony"))
+
+    run_product("headphones", ["Sony", "Boat"], RunOptions(streaming=True), job_id="stream")
+    assert _stages(fresh_db, "stream") == {"Boat": "classified"}
+
+    search.fail.clear()
+    run_product("headphones", ["Sony", "Boat"], RunOptions(streaming=True), job_id="stream")
+    assert _stages(fresh_db, "stream") == {"Sony": "classified", "Boat": "classified"}
+    assert fresh_db.count_reviews(["Sony", "Boat"], "headphones", unclassified_only=True) == 0
@@ -0,0 +1,94 @@
+# tests/test_ratelimit.py
+import types
+
+import pytest
+
+import ratelimit
+
+
+class _Throttled(Exception):
+    def __init__(self, retry_after=None):
+        super().__init__("429 Too Many Requests")
+        headers = {"Retry-After": retry_after} if retry_after is not None else {}
+        self.response = types.SimpleNamespace(status_code=429, headers=headers)
+
+
+def _flaky(failures):
+    calls = []
+
+    def fn():
+        calls.append(1)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return "ok"
+    return fn, calls
+
+
+@pytest.fixture
+def provider():
+    ratelimit.configure("test", rate=1000.0, capacity=10, host_rate=None)
+    return "test"
+
+
+def test_call_with_retry_honours_retry_after(provider):
+    fn, calls = _flaky([_Throttled("0.05"), _Throttled("garbage")])
+    delays = []
+    result = ratelimit.call_with_retry(provider, fn, retries=3, base_delay=0.01,
+                                       on_retry=lambda attempt, e, delay: delays.append(delay))
+    assert result == "ok" and len(calls) == 3
+    assert delays[0] == pytest.approx(0.05)
+    assert 0 < delays[1] <= 0.02  # malformed header: exponential backoff instead
+    assert ratelimit.get_limiter(provider).throttles == 2
+
+
+def test_call_with_retry_gives_up_with_retry_error(provider):
+    fn, calls = _flaky([_Throttled("0")] * 5)
+    with pytest.raises(ratelimit.RetryError) as info:
+        ratelimit.call_with_retry(provider, fn, retries=2, base_delay=0.01)
+    assert len(calls) == 2 and isinstance(info.value.__cause__, _Throttled)
+
+
+def test_call_with_retry_other_errors(provider):
+    fn, calls = _flaky([ValueError("bad input")])
+    with pytest.raises(ValueError):
+        ratelimit.call_with_retry(provider, fn, retries=3, base_delay=0.01)
+    assert len(calls) == 1
+
+    fn, calls = _flaky([ConnectionError("reset")])
+    assert ratelimit.call_with_retry(provider, fn, retries=3, base_delay=0.01, retry_errors=True) == "ok"
+    assert len(calls) == 2
+
+
+def test_retry_after_parsing():
+    assert ratelimit.retry_after(_Throttled("2")) == 2.0
+    assert ratelimit.retry_after(_Throttled("garbage")) is None
+    assert ratelimit.retry_after(_Throttled("Wed, 21 Oct 2015 07:28:00 GMT")) == 0.0
+    assert ratelimit.retry_after(_Throttled()) is None
+    assert ratelimit.is_throttle(_Throttled()) and not ratelimit.is_throttle(ValueError("x"))
+
+
+def test_adaptive_bucket_halves_on_throttle_and_recovers():
+    bucket = ratelimit.AdaptiveBucket(rate=100.0, capacity=5, recover_after=10)
+    assert all(bucket.try_acquire() == 0.0 for _ in range(5))
+
+    bucket.on_throttle(0.05)
+    assert bucket.rate == 50.0
+    assert 0.0 < bucket.try_acquire() <= 0.05  # every caller waits out the pause
+    for _ in range(4):
+        bucket.on_throttle(0.0)
+    assert bucket.rate == bucket.min_rate == 100.0 / 16
+
+    for _ in range(20):
+        bucket.on_success()
+    assert bucket.rate == 100.0
+
+
+def test_host_quota_is_shared_between_limiters(tmp_path):
+    if ratelimit.fcntl is None:
+        pytest.skip("host quota needs fcntl")
+    first = ratelimit.HostQuota("shared", rate=1.0, capacity=2, directory=str(tmp_path))
+    second = ratelimit.HostQuota("shared", rate=1.0, capacity=2, directory=str(tmp_path))
+    assert first.try_acquire() == 0.0 and second.try_acquire() == 0.0
+    assert first.try_acquire() > 0.0
+    second.pause(30)
+    assert first.try_acquire() > 25
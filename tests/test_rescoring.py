@@ -0,0 +1,53 @@
+# tests/test_rescoring.py
+import pandas as pd
+
+import rescoring
+
+CANONICAL = "These headphones have a warm, detailed sound and the battery easily lasts three days."
+
+
+def _review(brand, snippet, link, product="headphones"):
+    return {"brand": brand, "product": product, "source": "snippet", "title": "t", "snippet": snippet,
+            "link": link, "fetched_at": "2026-01-01 00:00:00"}
+
+
+def _grouped(db) -> dict:
+    rows = db.get_conn().execute(
+        "SELECT brand, emotion, COUNT(*) FROM reviews "
+        "WHERE emotion IS NOT NULL AND duplicate_of IS NULL GROUP BY 1, 2").fetchall()
+    return {(b, e): n for b, e, n in rows}
+
+
+def _counted(db, brands) -> dict:
+    counts = db.fetch_emotion_counts(brands, "headphones")
+    return {(r.brand, r.emotion): r.count for r in counts.itertuples()}
+
+
+def test_relabel_keeps_counts_in_step(fresh_db):
+    db = fresh_db
+    db.init_db()
+    ids = db.insert_reviews([_review("Sony", f"Sony review {i} long enough to get a signature", str(i))
+                             for i in range(4)])
+    probs = [{"negative": 0.1, "neutral": 0.1, "positive": 0.8}, {"negative": 0.45, "neutral": 0.1, "positive": 0.45},
+             {"negative": 0.7, "neutral": 0.2, "positive": 0.1}, {"negative": 0.2, "neutral": 0.6, "positive": 0.2}]
+    db.update_emotions_for_rows(pd.DataFrame({
+        "id": ids, "emotion": ["positive", "positive", "negative", "neutral"],
+        "scores": [rescoring.pack_scores(p) for p in probs]}))
+
+    assert rescoring.relabel_stored(["Sony"], "headphones", neutral_band=0.2) == 1
+    assert _counted(db, ["Sony"]) == _grouped(db) == {("Sony", "positive"): 1, ("Sony", "negative"): 1,
+                                                       ("Sony", "neutral"): 2}
+
+
+def test_brand_summary_skips_near_duplicates(fresh_db):
+    db = fresh_db
+    db.init_db()
+    ids = db.insert_reviews([_review("Sony", CANONICAL, "c"), _review("Sony", CANONICAL + " Read more", "d"),
+                             _review("Sony", "Read more: " + CANONICAL, "e")])
+    assert db.canonical_ids(ids) == ids[:1]
+    scores = rescoring.pack_scores({"negative": 0.1, "neutral": 0.1, "positive": 0.8})
+    db.update_emotions_for_rows(pd.DataFrame({"id": ids[:1], "emotion": ["positive"], "scores": [scores]}))
+
+    summary = rescoring.brand_summary(["Sony"], "headphones", chunk_size=2).set_index("brand")
+    assert summary.loc["Sony", "reviews"] == summary.loc["Sony", "n_positive"] == 1
+    assert _counted(db, ["Sony"]) == {("Sony", "positive"): 1}
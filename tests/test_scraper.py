@@ -0,0 +1,81 @@
+# tests/test_scraper.py
+import re
+import threading
+
+import pytest
+
+import scraper
+from db import REVIEW_COLUMNS
+
+URL = "https://www.amazon.in/product-reviews/B0TEST"
+
+
+def _amazon_page(page: int, n: int) -> str:
+    blocks = "".join(
+        f'<div id="R{page}-{i}" class="a-section review aok-relative">'
+        f'<a class="review-title"><span>Title {page}.{i}</span></a>'
+        f'<span class="a-size-base review-text review-text-content"><span>Review {page}.{i} text</span></span></div>'
+        for i in range(n))
+    return f"<html><body><div class='reviews-list'>{blocks}</div><div class='review-summary'>ignored</div></body></html>"
+
+
+@pytest.fixture
+def pages(monkeypatch):
+    """_fetch_page stand-in serving `per_page[n]` reviews on page n (0 or missing: empty page)."""
+    per_page, requested = {}, []
+    lock = threading.Lock()
+
+    def fetch(url):
+        page = int(re.search(r"pageNumber=(\d+)", url).group(1))
+        with lock:
+            requested.append(page)
+        return _amazon_page(page, per_page.get(page, 0))
+
+    monkeypatch.setattr(scraper, "_fetch_page", fetch)
+    return per_page, requested
+
+
+def test_parsers_agree(monkeypatch):
+    html = _amazon_page(1, 3)
+    with_lxml = scraper.parse_review_page(html, "amazon")
+    monkeypatch.setattr(scraper, "lxml", None)
+    assert scraper.parse_review_page(html, "amazon") == with_lxml
+    assert with_lxml[0] == {"key": "R1-0", "title": "Title 1.0", "snippet": "Review 1.0 text"}
+    assert len(with_lxml) == 3  # "review-summary" is not a review block
+
+
+def test_stops_once_enough_reviews_are_collected(pages):
+    per_page, requested = pages
+    per_page.update({n: 10 for n in range(1, 30)})
+    rows = scraper.scrape_source("amazon", URL, "Sony", "headphones", max_reviews=15, prefetch=3)
+
+    assert len(rows) == 15
+    assert [r["snippet"] for r in rows[:2]] == ["Review 1.0 text", "Review 1.1 text"]
+    assert set(rows[0]) == set(REVIEW_COLUMNS)
+    assert rows[0]["link"] == URL + "?pageNumber=1#R1-0" and rows[0]["source"] == "amazon"
+    # Only the pages needed plus the prefetch window were ever requested
+    assert max(requested) <= 2 + 3 - 1
+
+
+def test_stops_at_the_first_empty_page(pages):
+    per_page, requested = pages
+    per_page.update({1: 10, 2: 4, 4: 10})
+    rows = scraper.scrape_source("amazon", URL, "Sony", "headphones", max_reviews=100, prefetch=2)
+    assert len(rows) == 14
+    assert max(requested) <= 3 + 2 - 1
+
+
+def test_cached_and_scraped_sources_have_the_same_columns(pages, fresh_db):
+    per_page, _ = pages
+    per_page.update({1: 5})
+    fresh_db.init_db()
+    sources = [{"platform": "Amazon", "url": URL, "brand": "Sony", "product": "headphones"}]
+
+    scraped = scraper.scrape_reviews(sources, max_reviews=10)
+    cached = scraper.scrape_reviews(sources, max_reviews=10)
+    assert list(scraped.columns) == list(cached.columns) == ["id", *REVIEW_COLUMNS]
+    assert len(scraped) == 5
+    assert cached.to_dict("records") == scraped.to_dict("records")
+
+    with pytest.raises(ValueError):
+        scraper.scrape_reviews([{**sources[0], "platform": "ebay"}])
@@ -0,0 +1,72 @@
+# tests/test_serpapi_client.py
+import sys
+import types
+
+import pytest
+
+import http_cache
+import ratelimit
+import serpapi_client
+
+NO_RESULTS = "Google hasn't returned any results for this query."
+
+
+@pytest.fixture
+def serp(tmp_path, monkeypatch):
+    """A fake `serpapi` package answering from a queue of canned payloads (or exceptions)."""
+    answers, calls = [], []
+
+    class GoogleSearch:
+        def __init__(self, params):
+            self.params = params
+
+        def get_dict(self):
+            calls.append(self.params["q"])
+            answer = answers.pop(0)
+            if isinstance(answer, Exception):
+                raise answer
+            return dict(answer)
+
+    monkeypatch.setitem(sys.modules, "serpapi", types.SimpleNamespace(GoogleSearch=GoogleSearch))
+    monkeypatch.setattr(serpapi_client, "SERPAPI_KEY", "test")
+    monkeypatch.setattr(http_cache, "CACHE_DIR", str(tmp_path / "http_cache"))
+    monkeypatch.setattr(http_cache, "_approx_size", None)
+    monkeypatch.setattr(ratelimit, "backoff", lambda *args, **kwargs: 0.01)
+    saved = dict(ratelimit.PROVIDERS["serpapi"])
+    ratelimit.configure("serpapi", rate=1000.0, capacity=10, host_rate=None)
+    yield answers, calls
+    ratelimit.configure("serpapi", **saved)
+
+
+def test_no_results_is_a_cached_empty_page(serp):
+    answers, calls = serp
+    answers.append({"search_metadata": {"status": "Success"}, "error": NO_RESULTS})
+    searched = {}
+    out = serpapi_client.get_reviews_for_brands("headphones", ["Obscura"], queries={"Obscura": ["q"]},
+                                                searched=searched)
+    assert out == {"Obscura": []}
+    assert searched == {("Obscura", "q"): True}  # the watermark advances
+    assert calls == ["q"]
+    # Served from the cache from now on
+    assert serpapi_client.serpapi_search("q") == {"search_metadata": {"status": "Success"}, "organic_results": []}
+    assert calls == ["q"]
+
+
+def test_other_error_payloads_are_not_retried(serp):
+    answers, calls = serp
+    answers.append({"error": "Invalid API key. Your API key should be here: https://serpapi.com/manage-api-key"})
+    assert serpapi_client.serpapi_search("q") == {}
+    assert calls == ["q"]
+    assert http_cache.get_json("serpapi", {"engine": "google", "q": "q", "hl": "en", "gl": "in", "num": 10}) is None
+
+
+def test_throttles_and_transport_errors_are_retried(serp):
+    answers, calls = serp
+    page = {"organic_results": [{"title": "t", "snippet": "s", "link": "https://example.com/1"}]}
+    answers.extend([{"error": "429 Too Many Requests"}, ConnectionError("connection reset"), page])
+    assert serpapi_client.serpapi_search("q") == page
+    assert calls == ["q"] * 3
+    assert ratelimit.get_limiter("serpapi").throttles == 1
+
+    answers.extend([ConnectionError("connection reset")] * 3)
+    assert serpapi_client.serpapi_search("other", retries=3) == {}
@@ -0,0 +1,38 @@
+# tests/test_streaming.py
+from pipeline import RunOptions
+from streaming import run_streaming
+
+
+def _rows(db):
+    return db.get_conn().execute("SELECT link, emotion FROM reviews ORDER BY id").fetchall()
+
+
+def test_rerun_does_not_fetch_insert_or_classify_again(fake_services, fresh_db):
+    search, model = fake_services
+    opts = RunOptions(batch_size=4)
+    first = run_streaming("headphones", ["Sony", "Boat"], opts)
+    assert first["fetched"] == first["written"] == 18 and first["incomplete"] == []
+    stored, labelled = _rows(fresh_db), len(model.texts)
+    assert all(emotion in ("positive", "negative") for _, emotion in stored)
+
+    search.calls.clear()
+    second = run_streaming("headphones", ["Sony", "Boat"], opts)
+    assert search.calls == []
+    assert second["fetched"] == second["classified"] == second["written"] == 0
+    assert _rows(fresh_db) == stored and len(model.texts) == labelled
+
+
+def test_rerun_picks_up_rows_stored_before_an_interruption(fake_services, fresh_db):
+    search, model = fake_services
+    opts = RunOptions(batch_size=4)
+    run_streaming("headphones", ["Sony"], opts)
+    # As if the previous run stopped after storing but before writing labels
+    fresh_db.get_conn().execute("UPDATE reviews SET emotion=NULL, scores=NULL WHERE id % 2 = 0")
+    fresh_db.get_conn().commit()
+
+    search.calls.clear()
+    stats = run_streaming("headphones", ["Sony"], opts)
+    assert search.calls == [] and stats["fetched"] == 0 and stats["written"] == 4
+    assert fresh_db.count_reviews(["Sony"], "headphones", unclassified_only=True) == 0
+    counts = fresh_db.fetch_emotion_counts(["Sony"], "headphones")
+    assert counts["count"].sum() == 9
@@ -1,13 +1,43 @@
 import altair as alt
 import streamlit as st
 
+def _emotion_counts(df):
+    """Accept raw review rows or pre-aggregated brand/emotion/count rows (db.fetch_emotion_counts)."""
+    if "count" in df.columns:
+        return df
+    return df.groupby(["brand","emotion"]).size().reset_index(name="count")
+
 def show_comparison_charts(df):
-    counts = df.groupby(["brand","emotion"]).size().reset_index(name="count")
+    counts = _emotion_counts(df)
     chart = alt.Chart(counts).mark_bar().encode(
         x="brand:N", y="count:Q", color="emotion:N", column="emotion:N"
     ).properties(width=120, height=200)
     st.altair_chart(chart)
 
-def export_csv(df):
-    csv = df.to_csv(index=False).encode("utf-8")
-    st.download_button("📥 Download CSV", csv, "review_emotions.csv", "text/csv")
+def export_csv(df=None, *, brands=None, product=None, columns=None, fmt=None):
+    """
+    Download button for a DataFrame, or (with brands and product) for the stored
+    rows, streamed chunk by chunk into a temporary file in fmt (csv, csv.gz,
+    parquet, arrow; export.default_format() if not given) with only the chosen
+    columns. Writing the file is bounded by the chunk size, but
+    st.download_button then holds the whole file in memory, so call this on
+    demand and prefer a compressed format; export.py is the memory-bounded
+    path for large exports.
+    """
+    if df is not None:
+        csv = df[columns or df.columns].to_csv(index=False).encode("utf-8")
+        st.download_button("📥 Download CSV", csv, "review_emotions.csv", "text/csv")
+        return
+    import os
+    import tempfile
+    from export import MIME_TYPES, default_format, write_export
+
+    fmt = fmt or default_format()
+    fd, path = tempfile.mkstemp(suffix="." + fmt)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            write_export(f, brands, product, fmt, columns)
+        with open(path, "rb") as f:
+            st.download_button(f"📥 Download {fmt.upper()}", f, f"review_emotions.{fmt}", MIME_TYPES[fmt])
+    finally:
+        os.remove(path)
@@ -1,10 +1,14 @@
 import altair as alt
 import streamlit as st
 
+def _count_field(df):
+    # Pre-aggregated frames (db.fetch_emotion_counts) carry a count column; raw rows are counted by Altair
+    return "sum(count)" if "count" in df.columns else "count()"
+
 def plot_emotion_distribution(df):
     chart = alt.Chart(df).mark_bar().encode(
         x="emotion",
-        y="count()",
+        y=_count_field(df),
         color="emotion"
     )
     st.altair_chart(chart, use_container_width=True)
@@ -12,7 +16,7 @@ def plot_emotion_distribution(df):
 def plot_brand_comparison(df):
     chart = alt.Chart(df).mark_bar().encode(
         x="brand",
-        y="count()",
+        y=_count_field(df),
         color="emotion"
     )
     st.altair_chart(chart, use_container_width=True)